@@ -21,27 +21,38 @@ export const EliteGamerScroller: React.FC = () => {
             try {
                 setLoading(true);
 
-                // Fetch high retention users - these are the TRUE elite gamers!
-                const retentionResponse = await fetch(`${API_BASE_URL}/api/analytics/high-retention-users`);
+                // Fetch the top 100 high retention users - these are the TRUE elite gamers!
+                const retentionResponse = await fetch(`${API_BASE_URL}/api/analytics/high-retention-users?limit=100`);
                 if (!retentionResponse.ok) throw new Error('Failed to fetch high retention users');
                 const retentionData = await retentionResponse.json();
 
-                // Fetch churn predictions
-                const churnResponse = await fetch(`${API_BASE_URL}/api/ml/predictions/churn`);
-                const churnData = await churnResponse.json();
-
                 console.log('🔍 SCROLLER DEBUG - High retention users:', retentionData);
                 console.log('🔍 SCROLLER DEBUG - Sample user:', retentionData?.data?.[0]);
 
                 // Extract the actual data array
                 const usersArray = retentionData?.data || [];
-                const predictions = churnData?.data?.[0]?.predictions || churnData?.predictions || [];
+
+                // Look up churn scores for just these wallets
+                const walletScores: Record<string, any> = {};
+                if (usersArray.length > 0) {
+                    const churnResponse = await fetch(`${API_BASE_URL}/api/ml/predictions/wallets`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ wallets: usersArray.map((user: any) => String(user.user)) })
+                    });
+                    const churnData = churnResponse.ok ? await churnResponse.json() : null;
+                    (churnData?.wallets || []).forEach((result: any) => {
+                        walletScores[result.wallet] = result;
+                    });
+                }
 
                 // Map high retention users to elite gamers
                 const eliteGamersList = usersArray
-                    .slice(0, 100) // Top 100 high retention users
                     .map((user: any) => {
-                        const prediction = predictions.find((p: any) => p.user_wallet === user.user);
+                        // Prefer the score for the user's own game, else their first scored game
+                        const projects = walletScores[user.user]?.projects || [];
+                        const project = projects.find((p: any) => p.project === user.game) || projects[0];
+                        const prediction = project?.scores?.ensemble || project?.scores?.champion;
 
                         // Handle API field names with spaces
                         const retentionRate = user['retention rate %'] || user.retention_rate_pct || 0;
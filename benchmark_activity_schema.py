@@ -0,0 +1,145 @@
+"""
+Benchmark the compact user activity schema (ActivityEncoder) against plain object columns
+
+Builds Dune-shaped activity pages (base58 wallets, 'YYYY-MM-DD 00:00:00.000 UTC'
+days, overlapping pages) and runs the refresh's ingestion both ways:
+    legacy      concat + MultiIndex dedup on strings, to_datetime, astype(str) copies
+    compact     ActivityEncoder: shared dictionaries, int64 dedup keys, int32 days,
+                downcast counts, categorical wallet/project
+then compares frame memory, ingestion time and peak RSS, a (wallet, project)
+groupby and create_training_dataset (whose output must be identical).
+
+Usage:
+    python benchmark_activity_schema.py
+    python benchmark_activity_schema.py --rows 2000000 --pages 7 --skip-features
+"""
+
+import argparse
+import gc
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+
+BASE58 = np.frombuffer(b'123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz', dtype=np.uint8)
+PROJECTS = np.array(['StepN', 'Aurory', 'Star Atlas', 'Genopets', 'Honeyland', 'MixMob'], dtype=object)
+
+
+def synthetic_pages(rows: int, pages: int, seed: int) -> list:
+    """Dune-shaped activity split into pages that share ~2% of their rows"""
+    rng = np.random.default_rng(seed)
+    wallets = rng.choice(BASE58, size=(max(1, rows // 25), 44)).view('S44').ravel().astype(str).astype(object)
+    days = pd.date_range('2025-08-01', periods=90, freq='D').strftime('%Y-%m-%d 00:00:00.000 UTC').to_numpy(dtype=object)
+
+    # Oversample, then keep `rows` distinct (day, wallet, project) rows
+    draws = int(rows * 1.2)
+    wallet = rng.integers(0, len(wallets), draws)
+    activity = pd.DataFrame({
+        'day': days[rng.integers(0, len(days), draws)],
+        'user_wallet': wallets[wallet],
+        'project': PROJECTS[wallet % len(PROJECTS)],
+        'number_of_transactions': rng.geometric(0.05, draws).astype(np.int64)
+    }).drop_duplicates(['day', 'user_wallet', 'project'], ignore_index=True).iloc[:rows]
+
+    bounds = np.linspace(0, len(activity), pages + 1).astype(int)
+    overlap = len(activity) // 50
+    return [activity.iloc[max(0, start - overlap):end].reset_index(drop=True) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def legacy_ingest(pages: list) -> pd.DataFrame:
+    """Merge + normalisation as the refresh did before the compact schema"""
+    kept, seen_keys = [], None
+    for df in pages:
+        keys = pd.MultiIndex.from_frame(df[['day', 'user_wallet', 'project']])
+        is_new = ~keys.duplicated()
+        if seen_keys is not None:
+            is_new &= ~keys.isin(seen_keys)
+        kept.append(df[is_new])
+        seen_keys = keys[is_new] if seen_keys is None else seen_keys.append(keys[is_new])
+    activity = pd.concat(kept, ignore_index=True)
+    activity['activity_date'] = pd.to_datetime(activity['day'])
+    activity['daily_transactions'] = activity['number_of_transactions']
+    activity['user_wallet'] = activity['user_wallet'].astype(str)
+    activity['project'] = activity['project'].astype(str)
+    activity['daily_transactions'] = pd.to_numeric(activity['daily_transactions'], errors='coerce').fillna(1)
+    return activity
+
+
+def compact_ingest(pages: list) -> pd.DataFrame:
+    encoder = main.ActivityEncoder()
+    encoded = []
+    for df in pages:
+        page = encoder.encode(df)
+        encoded.append(page[encoder.new_rows(page)])
+    return encoder.finish(encoded)
+
+
+def timed(fn, *args, repeats: int = 1):
+    """(result, median seconds, peak RSS growth MB of the first run)"""
+    gc.collect()
+    with main.PeakMemory() as memory:
+        start = time.perf_counter()
+        result = fn(*args)
+        times = [time.perf_counter() - start]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return result, float(np.median(times)), memory.peak_mb
+
+
+def group_signatures(activity: pd.DataFrame) -> pd.DataFrame:
+    grouped = activity.groupby(['user_wallet', 'project'], sort=True, observed=True)
+    return pd.DataFrame({
+        'rows': grouped.size(),
+        'last_activity': grouped['activity_date'].max(),
+        'transactions': grouped['daily_transactions'].sum()
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the compact activity schema")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--pages', type=int, default=7)
+    parser.add_argument('--repeats', type=int, default=3, help="runs per groupby timing (median is reported)")
+    parser.add_argument('--skip-features', action='store_true', help="skip create_training_dataset")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.rows, args.pages, args.seed)
+    print(f"{sum(len(page) for page in pages):,} rows in {len(pages)} pages")
+
+    results = {}
+    for name, ingest in [('legacy', legacy_ingest), ('compact', compact_ingest)]:
+        activity, ingest_s, ingest_mb = timed(ingest, pages)
+        _, groupby_s, _ = timed(group_signatures, activity, repeats=args.repeats)
+        row = {
+            'rows': len(activity),
+            'frame_mb': round(activity.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+            'ingest_s': round(ingest_s, 2),
+            'ingest_peak_mb': round(ingest_mb, 1),
+            'groupby_s': round(groupby_s, 3)
+        }
+        if not args.skip_features:
+            training_df, features_s, features_mb = timed(main.feature_service.create_training_dataset, activity)
+            row.update({'features_s': round(features_s, 2), 'features_peak_mb': round(features_mb, 1)})
+            results.setdefault('training', []).append(training_df)
+        results[name] = row
+        del activity
+        gc.collect()
+
+    if not args.skip_features:
+        legacy_df, compact_df = results.pop('training')
+        pd.testing.assert_frame_equal(legacy_df, compact_df)
+        print(f"✓ Identical training datasets ({len(compact_df)} rows)")
+
+    table = pd.DataFrame(results).T.astype({'rows': int})
+    print("=" * 60)
+    print(table.to_string())
+    print("-" * 60)
+    legacy, compact = results['legacy'], results['compact']
+    print(f"Memory: {legacy['frame_mb'] / compact['frame_mb']:.1f}x smaller, "
+          f"groupby: {legacy['groupby_s'] / compact['groupby_s']:.1f}x faster")
+    print("=" * 60)
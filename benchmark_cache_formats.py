@@ -0,0 +1,128 @@
+"""
+Benchmark the raw_data_cache file formats (CACHE_FORMAT)
+
+Writes every cached source with both CacheManager backends - pickled joblib and
+memory-mapped Arrow IPC - and compares on-disk size, full load latency, load
+latency of a column subset and the resident memory a load adds (measured in a
+fresh process per load, so earlier loads do not hide it).
+
+Sources (first found):
+    raw_data_cache      every frame cached by a running deployment (any format)
+    data/               the bundled Dune exports (CSV payloads in .joblib files)
+
+Usage:
+    python benchmark_cache_formats.py
+    python benchmark_cache_formats.py --repeats 10 --columns 2
+"""
+
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import pandas as pd
+
+import main
+
+BACKENDS = {'joblib': main.JoblibCacheBackend, 'arrow': main.ArrowCacheBackend}
+
+
+def cached_sources() -> dict:
+    keys = list(main.cache_manager.metadata)
+    frames = {key: main.cache_manager.get_cached_data(key) for key in keys}
+    return {key: df for key, df in frames.items() if df is not None and not df.empty}
+
+
+def bundled_sources() -> dict:
+    names = {query_id: key for key, query_id in main.config.dune_queries.items()}
+    frames = {}
+    for path in sorted(glob.glob(os.path.join('data', '*.joblib'))):
+        export = joblib.load(path)
+        name = names.get(export['query_id'], os.path.basename(path))
+        frames[name] = pd.read_csv(io.StringIO(export['data']))
+    return frames
+
+
+def timed_load(backend, path: str, columns, repeats: int) -> float:
+    """Median milliseconds per read"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.read(path, columns)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def load_rss(backend_name: str, path: str) -> float:
+    """MB of resident memory one read adds while the frame is alive (runs in a fresh process)"""
+    backend = BACKENDS[backend_name]()
+    # One-off costs of the first read (allocator pools, lazy imports) are not per-load costs
+    warmup = f"{path}.warmup{backend.extension}"
+    backend.write(warmup, pd.DataFrame({'a': [1]}))
+    backend.read(warmup)
+    os.remove(warmup)
+    with main.PeakMemory() as memory:
+        df = backend.read(path)
+        # Touch every column, as serving a response would
+        df.memory_usage(deep=True)
+    return memory.peak_mb
+
+
+def benchmark(name: str, df: pd.DataFrame, directory: str, args, pool) -> list:
+    columns = list(df.columns[:args.columns])
+    rows = []
+    for backend_name, backend_class in BACKENDS.items():
+        backend = backend_class()
+        path = os.path.join(directory, f"{name}{backend.extension}")
+        try:
+            backend.write(path, df)
+        except (TypeError, ValueError, NotImplementedError) as e:
+            rows.append({'source': name, 'format': backend_name, 'error': str(e)[:60]})
+            continue
+        backend.read(path)  # warm the page cache: both formats are measured from memory
+        rows.append({
+            'source': name,
+            'format': backend_name,
+            'rows': len(df),
+            'disk_mb': round(os.path.getsize(path) / 1024 ** 2, 2),
+            'load_ms': round(timed_load(backend, path, None, args.repeats), 2),
+            f'load_{len(columns)}_cols_ms': round(timed_load(backend, path, columns, args.repeats), 2),
+            'rss_mb': round(pool.submit(load_rss, backend_name, path).result(), 1)
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark joblib vs Arrow cache files")
+    parser.add_argument('--repeats', type=int, default=5, help="loads per measurement (median is reported)")
+    parser.add_argument('--columns', type=int, default=2, help="columns in the column-selective load")
+    args = parser.parse_args()
+
+    if not main.PYARROW_AVAILABLE:
+        raise SystemExit("✗ pyarrow is not installed")
+
+    source, frames = 'raw_data_cache', cached_sources()
+    if not frames:
+        source, frames = 'data/', bundled_sources()
+    print(f"Benchmarking {len(frames)} sources from {source}")
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory, \
+            ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as pool:
+        for name, df in frames.items():
+            results.extend(benchmark(name, df, directory, args, pool))
+
+    table = pd.DataFrame(results)
+    print("=" * 60)
+    print(table.to_string(index=False))
+    print("-" * 60)
+    numeric = table.drop(columns=['source', 'rows', 'error'], errors='ignore')
+    print(numeric.groupby('format', sort=False).sum().round(2).to_string())
+    print("=" * 60)
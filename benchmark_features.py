@@ -0,0 +1,88 @@
+"""
+Benchmark FeatureService.create_training_dataset against the per-(user_wallet, project)
+create_user_features loop it replaced, at several activity sizes
+
+The activity is the one check_feature_equivalence.py expands from data_csv/ (or
+--activity), replicated under new wallet names up to each size. The loop costs the
+same per group at any size, so above --baseline-max-rows it is timed on a random
+sample of groups of that size and scaled by the group count (marked estimated).
+
+Usage:
+    python benchmark_features.py
+    python benchmark_features.py --sizes 200000 1000000 5000000 --baseline-max-rows 1000000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+import main
+from check_feature_equivalence import baseline_training_dataset, bundled_activity, load_activity, normalize
+
+
+def scale_to(activity: pd.DataFrame, rows: int, seed: int) -> pd.DataFrame:
+    """Whole wallet histories, replicated under new wallet names, adding up to about `rows` rows"""
+    copies = -(-rows // len(activity))
+    scaled = pd.concat(
+        [activity.assign(user_wallet=activity['user_wallet'] + f'_{i}') for i in range(copies)],
+        ignore_index=True
+    )
+    sizes = scaled.groupby('user_wallet').size().sample(frac=1, random_state=seed)
+    wallets = sizes.index[sizes.cumsum() <= rows]
+    return scaled[scaled['user_wallet'].isin(wallets)].reset_index(drop=True)
+
+
+def sample_groups(activity: pd.DataFrame, rows: int, seed: int) -> tuple:
+    """(random subset of (user_wallet, project) groups with about `rows` rows, fraction of groups kept)"""
+    sizes = activity.groupby(['user_wallet', 'project']).size().sample(frac=1, random_state=seed)
+    kept = sizes[sizes.cumsum() <= rows]
+    keys = pd.MultiIndex.from_frame(activity[['user_wallet', 'project']])
+    return activity[keys.isin(kept.index)], len(kept) / len(sizes)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized vs per-group training features")
+    parser.add_argument('--activity', help="Dune user daily activity export (.csv or .joblib)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200_000, 1_000_000, 5_000_000])
+    parser.add_argument('--baseline-max-rows', type=int, default=250_000,
+                        help="time the loop on a group sample above this many rows")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    activity = normalize(load_activity(args.activity) if args.activity else bundled_activity(args.seed))
+    service = main.FeatureService()
+
+    results = []
+    for size in args.sizes:
+        scaled = scale_to(activity, size, args.seed)
+        training_df, vectorized_seconds = timed(service.create_training_dataset, scaled)
+
+        if len(scaled) > args.baseline_max_rows:
+            sample, fraction = sample_groups(scaled, args.baseline_max_rows, args.seed)
+            _, sample_seconds = timed(baseline_training_dataset, service, sample)
+            baseline_seconds, estimated = sample_seconds / fraction, True
+        else:
+            _, baseline_seconds = timed(baseline_training_dataset, service, scaled)
+            estimated = False
+
+        results.append({
+            'rows': len(scaled),
+            'groups': scaled.groupby(['user_wallet', 'project']).ngroups,
+            'training_rows': len(training_df),
+            'loop_s': round(baseline_seconds, 1),
+            'estimated': estimated,
+            'vectorized_s': round(vectorized_seconds, 2),
+            'speedup': f"{baseline_seconds / vectorized_seconds:.0f}x"
+        })
+        print(results[-1])
+
+    print("=" * 60)
+    print(pd.DataFrame(results).to_string(index=False))
+    print("=" * 60)
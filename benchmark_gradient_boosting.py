@@ -0,0 +1,145 @@
+"""
+Benchmark the gradient boosting engines used for the 'gradient_boosting' candidate
+
+Compares the exact-split GradientBoostingClassifier with the histogram-based
+HistGradientBoostingClassifier (GRADIENT_BOOSTING_ENGINE) on fit time, predict
+time, serialized artefact size and ROC-AUC, using the same split/SMOTE/scaling
+as MLModelManager.
+
+Activity source (first found):
+    --activity FILE     Dune user daily activity export (.csv or .joblib)
+    raw_data_cache      the cached user activity pages of a running deployment
+    synthetic           generated activity with --users wallets
+
+Usage:
+    python benchmark_gradient_boosting.py
+    python benchmark_gradient_boosting.py --activity activity.csv --scales 1 10
+"""
+
+import argparse
+import io
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+import main
+
+PROJECTS = ['StepN', 'Aurory', 'Star Atlas', 'Genopets', 'Honeyland', 'MixMob']
+
+
+def load_activity(path: str) -> pd.DataFrame:
+    if path.endswith('.joblib'):
+        return joblib.load(path)
+    return pd.read_csv(path)
+
+
+def cached_activity() -> pd.DataFrame:
+    pages = [main.cache_manager.get_cached_data(f'user_activity_{page}') for page in main.config.user_activity_pages]
+    pages = [page for page in pages if page is not None and not page.empty]
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+
+
+def synthetic_activity(users: int, seed: int) -> pd.DataFrame:
+    """Daily activity with per-wallet engagement levels, so churn is learnable"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2025-08-01', tz='UTC')
+    engagement = rng.beta(2, 3, users)
+    active_days = rng.integers(5, 60, users)
+    frames = []
+    for wallet in range(users):
+        n = int(np.clip(active_days[wallet] * engagement[wallet] * 1.5, 5, 75))
+        span = int(rng.integers(n, 76))
+        days = np.sort(rng.choice(span, size=min(n, span), replace=False)) + (75 - span if rng.random() < engagement[wallet] else 0)
+        frames.append(pd.DataFrame({
+            'day': start + pd.to_timedelta(days, unit='D'),
+            'user_wallet': f'wallet{wallet}',
+            'project': PROJECTS[wallet % len(PROJECTS)],
+            'number_of_transactions': rng.poisson(1 + 30 * engagement[wallet], len(days)) + 1
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def normalize(activity: pd.DataFrame) -> pd.DataFrame:
+    """Same column normalisation as the refresh pipeline"""
+    activity = activity.copy()
+    activity['activity_date'] = pd.to_datetime(activity['day'] if 'day' in activity.columns else activity['activity_date'])
+    if 'daily_transactions' not in activity.columns:
+        activity['daily_transactions'] = activity.get('number_of_transactions', 1)
+    activity['user_wallet'] = activity['user_wallet'].astype(str)
+    activity['project'] = activity['project'].astype(str)
+    activity['daily_transactions'] = pd.to_numeric(activity['daily_transactions'], errors='coerce').fillna(1)
+    return activity
+
+
+def scale_activity(activity: pd.DataFrame, factor: int, seed: int) -> pd.DataFrame:
+    """Replicate every wallet `factor` times with jittered transaction counts"""
+    if factor <= 1:
+        return activity
+    rng = np.random.default_rng(seed)
+    copies = []
+    for i in range(factor):
+        copy = activity.copy()
+        copy['user_wallet'] = copy['user_wallet'] + f'_{i}'
+        jitter = rng.uniform(0.7, 1.3, len(copy))
+        copy['daily_transactions'] = np.maximum(1, np.round(copy['daily_transactions'] * jitter))
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def benchmark(training_df: pd.DataFrame) -> list:
+    X_train, y_train, X_test, y_test = main.ml_manager.prepare_training_data(training_df)[:4]
+    rows = []
+    for engine in ['exact', 'hist']:
+        model = main.MLModelManager.build_gradient_boosting(engine)
+
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        proba = model.predict_proba(X_test)[:, 1]
+        predict_seconds = time.perf_counter() - start
+
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+
+        rows.append({
+            'engine': engine,
+            'train_rows': len(X_train),
+            'fit_s': round(fit_seconds, 2),
+            'predict_ms': round(predict_seconds * 1000, 1),
+            'artefact_kb': round(buffer.tell() / 1024, 1),
+            'roc_auc': round(roc_auc_score(y_test, proba), 4),
+            'iterations': getattr(model, 'n_iter_', getattr(model, 'n_estimators_', None))
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark exact vs histogram gradient boosting")
+    parser.add_argument('--activity', help="Dune user daily activity export (.csv or .joblib)")
+    parser.add_argument('--users', type=int, default=3000, help="wallets for synthetic activity")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.activity:
+        source, activity = args.activity, load_activity(args.activity)
+    else:
+        source, activity = 'raw_data_cache', cached_activity()
+        if activity.empty:
+            source, activity = 'synthetic', synthetic_activity(args.users, args.seed)
+    activity = normalize(activity)
+
+    results = []
+    for factor in args.scales:
+        training_df = main.feature_service.create_training_dataset(scale_activity(activity, factor, args.seed))
+        for row in benchmark(training_df):
+            results.append({'data': f'{source} x{factor}', **row})
+
+    print("=" * 60)
+    print(pd.DataFrame(results).to_string(index=False))
+    print("=" * 60)
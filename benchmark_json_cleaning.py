@@ -0,0 +1,73 @@
+"""
+Micro-benchmark clean_dataframe_for_json / records_for_json against the original
+per-cell cleaning, over every bundled data_csv export
+
+Each dataset is timed as read from the CSV and with its date columns parsed (how
+the cache holds Dune exports), plus the user daily activity expanded from the
+exports by check_feature_equivalence.py. Reported per dataset (median ms):
+    clean       the cleaning pass alone (original vs vectorized)
+    response    cleaning + to_dict('records') + encoding, i.e. the whole body:
+                original + JSONResponse vs vectorized + dumps_json
+    records     records_for_json + dumps_json
+
+Usage:
+    python benchmark_json_cleaning.py
+    python benchmark_json_cleaning.py --repeats 10
+"""
+
+import argparse
+import statistics
+import time
+
+import pandas as pd
+
+import main
+from check_feature_equivalence import bundled_activity
+from check_json_equivalence import baseline_clean_dataframe_for_json, bundled_frames, response_body
+
+
+def timed_ms(fn, df: pd.DataFrame, repeats: int) -> float:
+    """Median milliseconds per call"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def benchmark(name: str, df: pd.DataFrame, repeats: int) -> dict:
+    clean_before = timed_ms(baseline_clean_dataframe_for_json, df, repeats)
+    clean_after = timed_ms(main.clean_dataframe_for_json, df, repeats)
+    response_before = timed_ms(lambda d: response_body(baseline_clean_dataframe_for_json(d).to_dict('records')), df, repeats)
+    response_after = timed_ms(lambda d: main.dumps_json(main.clean_dataframe_for_json(d).to_dict('records')), df, repeats)
+    records = timed_ms(lambda d: main.dumps_json(main.records_for_json(d)), df, repeats)
+    return {
+        'dataset': name,
+        'rows': len(df),
+        'clean_before_ms': round(clean_before, 2),
+        'clean_after_ms': round(clean_after, 2),
+        'clean_speedup': f"{clean_before / clean_after:.1f}x",
+        'response_before_ms': round(response_before, 1),
+        'response_after_ms': round(response_after, 1),
+        'response_speedup': f"{response_before / response_after:.1f}x",
+        'records_ms': round(records, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized vs per-cell JSON cleaning")
+    parser.add_argument('--repeats', type=int, default=5, help="calls per measurement (median is reported)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    frames = bundled_frames()
+    activity = bundled_activity(args.seed)
+    frames['user_daily_activity (expanded)'] = activity
+    frames['user_daily_activity (expanded, dates parsed)'] = activity.assign(day=pd.to_datetime(activity['day']))
+
+    results = [benchmark(name, df, args.repeats) for name, df in frames.items()]
+
+    print("=" * 60)
+    print(pd.DataFrame(results).to_string(index=False))
+    print("=" * 60)
@@ -0,0 +1,137 @@
+"""
+Regression benchmark for FeatureService.create_prediction_features on the 200k-row
+user activity dataset
+
+The activity is the one check_feature_equivalence.py expands from data_csv/ (or
+--activity), replicated under new wallet names up to --rows. Reports:
+    loop        the per-(user_wallet, project) loop create_prediction_features
+                used before the shared kernel (two sorts and a datetime.now() per group)
+    vectorized  create_prediction_features, one batched kernel pass
+and checks that serving features match training by construction: every training
+row of create_training_dataset equals the prediction features of the same group
+taken as of its training cutoff (create_prediction_features_batch, one batch per group).
+Exits non-zero on a mismatch, or if the vectorized pass is slower than --max-seconds
+or less than --min-speedup times faster than the loop.
+
+Usage:
+    python benchmark_prediction_features.py
+    python benchmark_prediction_features.py --rows 200000 --max-seconds 2 --min-speedup 50
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import main
+from benchmark_features import scale_to, timed
+from check_feature_equivalence import bundled_activity, load_activity, normalize
+
+
+def baseline_prediction_features(daily_activity_df: pd.DataFrame) -> pd.DataFrame:
+    """The groupby loop create_prediction_features used before the shared kernel"""
+    prediction_data = []
+    for (user, project), group in daily_activity_df.groupby(['user_wallet', 'project']):
+        if len(group) >= 5:
+            user_data = group.sort_values('activity_date')
+            latest_date = user_data['activity_date'].max()
+
+            features = {}
+
+            last_7 = user_data[user_data['activity_date'] >= (latest_date - pd.Timedelta(days=7))]
+            features['active_days_last_7'] = last_7['activity_date'].nunique()
+            features['transactions_last_7'] = last_7.get('daily_transactions', pd.Series([0])).sum()
+
+            features['total_active_days'] = user_data['activity_date'].nunique()
+            features['total_transactions'] = user_data.get('daily_transactions', pd.Series([0])).sum()
+            features['avg_transactions_per_day'] = (
+                features['total_transactions'] / features['total_active_days']
+                if features['total_active_days'] > 0 else 0
+            )
+
+            latest_activity = user_data['activity_date'].max()
+            if latest_activity.tzinfo is None:
+                current_time = datetime.now()
+            else:
+                current_time = datetime.now(timezone.utc).replace(tzinfo=None)
+                latest_activity = latest_activity.replace(tzinfo=None)
+
+            features['days_since_last_activity'] = (current_time - latest_activity).days
+
+            first_week = user_data.head(7)
+            last_week = user_data.tail(7)
+            features['week1_transactions'] = first_week.get('daily_transactions', pd.Series([0])).sum()
+            features['week_last_transactions'] = last_week.get('daily_transactions', pd.Series([0])).sum()
+
+            if features['week1_transactions'] > 0:
+                features['early_to_late_momentum'] = (
+                    features['week_last_transactions'] / features['week1_transactions']
+                )
+            else:
+                features['early_to_late_momentum'] = 0
+
+            user_data_sorted = user_data.sort_values('activity_date')
+            user_data_sorted['days_gap'] = user_data_sorted['activity_date'].diff().dt.days
+            std_gap = user_data_sorted['days_gap'].std()
+            features['consistency_score'] = 1 / (std_gap + 1) if std_gap > 0 else 1
+
+            features['user_wallet'] = user
+            features['project'] = project
+            prediction_data.append(features)
+
+    return pd.DataFrame(prediction_data)
+
+
+def serving_matches_training(service: main.FeatureService, activity: pd.DataFrame) -> tuple:
+    """(training rows compared, mismatching rows): prediction features at each group's training cutoff"""
+    training_df = service.create_training_dataset(activity)
+
+    tagged = activity.assign(group=activity['user_wallet'] + '|' + activity['project'])
+    # Same cutoff as create_training_dataset: 15 days before the group's last activity
+    cutoffs = tagged.groupby('group')['activity_date'].max() - pd.Timedelta(days=15)
+    serving = service.create_prediction_features_batch(tagged, 'group', as_of=cutoffs)
+
+    keys = ['user_wallet', 'project']
+    expected = training_df.set_index(keys)[service.feature_columns].sort_index()
+    actual = serving.set_index(keys)[service.feature_columns].reindex(expected.index)
+    close = (actual - expected).abs() <= 1e-9 * expected.abs().clip(lower=1)
+    return len(expected), int((~close.all(axis=1)).sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regression benchmark for create_prediction_features")
+    parser.add_argument('--activity', help="Dune user daily activity export (.csv or .joblib)")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--max-seconds', type=float, default=5.0,
+                        help="slowest acceptable vectorized pass")
+    parser.add_argument('--min-speedup', type=float, default=20.0,
+                        help="smallest acceptable speedup over the loop")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    activity = normalize(load_activity(args.activity) if args.activity else bundled_activity(args.seed))
+    activity = scale_to(activity, args.rows, args.seed)
+    service = main.FeatureService()
+    print(f"{len(activity)} activity rows, {activity.groupby(['user_wallet', 'project']).ngroups} groups")
+
+    baseline_df, baseline_seconds = timed(baseline_prediction_features, activity)
+    prediction_df, vectorized_seconds = timed(service.create_prediction_features, activity)
+    compared, mismatches = serving_matches_training(service, activity)
+    speedup = baseline_seconds / vectorized_seconds
+
+    print("=" * 60)
+    print(pd.DataFrame([
+        {'pass': 'loop', 'rows_out': len(baseline_df), 'seconds': round(baseline_seconds, 2)},
+        {'pass': 'vectorized', 'rows_out': len(prediction_df), 'seconds': round(vectorized_seconds, 2)}
+    ]).to_string(index=False))
+    print("=" * 60)
+
+    results = [
+        (mismatches == 0, f"serving features match training on {compared - mismatches}/{compared} groups"),
+        (vectorized_seconds <= args.max_seconds, f"vectorized {vectorized_seconds:.2f}s (limit {args.max_seconds:.2f}s)"),
+        (speedup >= args.min_speedup, f"{speedup:.0f}x faster than the loop (minimum {args.min_speedup:.0f}x)")
+    ]
+    for ok, detail in results:
+        print(f"{'✓' if ok else '✗'} {detail}")
+    sys.exit(0 if all(ok for ok, _ in results) else 1)
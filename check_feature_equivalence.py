@@ -0,0 +1,141 @@
+"""
+Check that the vectorized FeatureService.create_training_dataset produces the same
+training rows as the per-(user_wallet, project) create_user_features loop it replaced
+
+The bundled Dune exports (data_csv/) have no per-wallet activity, so the activity is
+expanded from them: every (day, project) row of daily_gaming_activity becomes
+number_of_gamers wallets drawn from the project's number_of_unique_users
+(gaming_activity_total), sharing the day's number_of_transactions.
+
+Activity source (first found):
+    --activity FILE     Dune user daily activity export (.csv or .joblib)
+    data_csv/           activity expanded from the bundled exports
+Both transaction dtypes (int, float) are checked; exits non-zero on any difference.
+
+Usage:
+    python check_feature_equivalence.py
+    python check_feature_equivalence.py --activity activity.csv
+"""
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import main
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_csv')
+
+
+def bundled_exports() -> dict:
+    """The data_csv/ exports as DataFrames keyed by cache key"""
+    names = {query_id: key for key, query_id in main.config.dune_queries.items()}
+    frames = {}
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, '*.csv'))):
+        export = pd.read_csv(path)
+        name = names.get(int(export['query_id'][0]), os.path.basename(path))
+        frames[name] = pd.read_csv(io.StringIO(export['data'][0]))
+    return frames
+
+
+def bundled_activity(seed: int) -> pd.DataFrame:
+    """Per-wallet daily activity consistent with the bundled per-project daily totals"""
+    exports = bundled_exports()
+    daily = exports['daily_gaming_activity']
+    wallets = exports['gaming_activity_total'].set_index('project')['number_of_unique_users']
+    rng = np.random.default_rng(seed)
+    frames = []
+    for row in daily.itertuples(index=False):
+        pool = int(max(wallets.get(row.project, row.number_of_gamers), row.number_of_gamers))
+        gamers = int(row.number_of_gamers)
+        if gamers <= 0:
+            continue
+        ids = rng.choice(pool, size=gamers, replace=False)
+        mean = max(row.number_of_transactions / gamers, 1)
+        frames.append(pd.DataFrame({
+            'day': row.day,
+            'user_wallet': [f"{row.project}:{i}" for i in ids],
+            'project': row.project,
+            'number_of_transactions': rng.poisson(mean - 1, gamers) + 1
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_activity(path: str) -> pd.DataFrame:
+    if path.endswith('.joblib'):
+        return joblib.load(path)
+    return pd.read_csv(path)
+
+
+def normalize(activity: pd.DataFrame) -> pd.DataFrame:
+    """Same column normalisation as the refresh pipeline"""
+    activity = activity.copy()
+    activity['activity_date'] = pd.to_datetime(activity['day'] if 'day' in activity.columns else activity['activity_date'])
+    if 'daily_transactions' not in activity.columns:
+        activity['daily_transactions'] = activity.get('number_of_transactions', 1)
+    activity['user_wallet'] = activity['user_wallet'].astype(str)
+    activity['project'] = activity['project'].astype(str)
+    activity['daily_transactions'] = pd.to_numeric(activity['daily_transactions'], errors='coerce').fillna(1)
+    return activity
+
+
+def baseline_training_dataset(service: main.FeatureService, daily_activity_df: pd.DataFrame) -> pd.DataFrame:
+    """The groupby loop create_training_dataset used before it was vectorized"""
+    training_data = []
+    for (user, project), group in daily_activity_df.groupby(['user_wallet', 'project']):
+        if len(group) >= 5:
+            features = service.create_user_features(group, lookback_days=45)
+            if features:
+                features['user_wallet'] = user
+                features['project'] = project
+                training_data.append(features)
+    return pd.DataFrame(training_data)
+
+
+def compare(activity: pd.DataFrame) -> tuple:
+    """(baseline seconds, vectorized seconds, rows); raises AssertionError on a difference"""
+    service = main.FeatureService()
+    start = time.perf_counter()
+    expected = baseline_training_dataset(service, activity)
+    baseline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = service.create_training_dataset(activity)
+    vectorized_seconds = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-12)
+    return baseline_seconds, vectorized_seconds, len(actual)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check vectorized training features against create_user_features")
+    parser.add_argument('--activity', help="Dune user daily activity export (.csv or .joblib)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.activity:
+        source, activity = args.activity, load_activity(args.activity)
+    else:
+        source, activity = 'data_csv', bundled_activity(args.seed)
+    activity = normalize(activity)
+    print(f"Checking {len(activity)} activity rows from {source}")
+
+    failed = False
+    for dtype in ['int64', 'float64']:
+        activity['daily_transactions'] = activity['daily_transactions'].astype(dtype)
+        try:
+            baseline_seconds, vectorized_seconds, rows = compare(activity)
+        except AssertionError as e:
+            failed = True
+            print(f"✗ {dtype} transactions: outputs differ\n{e}")
+            continue
+        print(f"✓ {dtype} transactions: {rows} identical training rows "
+              f"(loop {baseline_seconds:.2f}s, vectorized {vectorized_seconds:.2f}s)")
+
+    sys.exit(1 if failed else 0)
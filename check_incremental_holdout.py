@@ -0,0 +1,131 @@
+"""
+Check that model scores stay honest across one incremental training round
+
+The activity is the one check_feature_equivalence.py expands from data_csv/ (or
+--activity); --reserve of its wallets are set aside and never reach training. The
+candidates, plus an unpruned decision tree ('memorizer': scores the rows it was
+fitted on almost perfectly, so any of them in a holdout shows), are fully fitted on
+the rest minus its last --new-days days and published, then updated
+(MLModelManager.update_candidates) once those days arrive, against an empty
+snapshot store in a temporary directory:
+    split       the published snapshot keeps its holdout split; the update's holdout
+                holds only pairs of that holdout or pairs first seen in the update,
+                never a pair a model was fitted on
+    <model>     the updated model's holdout ROC-AUC is at most --tolerance above its
+                ROC-AUC on the reserved wallets (same features, never seen): a
+                holdout leaking fitted rows scores fitted models higher, the
+                carried-over memorizer far higher
+    forest      random_forest is refitted, without sklearn's class_weight/warm_start warning
+Exits non-zero on failure.
+
+Usage:
+    python check_incremental_holdout.py
+    python check_incremental_holdout.py --rows 400000 --new-days 7 --tolerance 0.04
+"""
+
+import argparse
+import atexit
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.tree import DecisionTreeClassifier
+
+os.environ.setdefault('TRAINING_WORKERS', '1')
+WORKDIR = tempfile.mkdtemp(prefix='incremental-holdout-')
+atexit.register(shutil.rmtree, WORKDIR, True)
+os.chdir(WORKDIR)
+import main  # noqa: E402  (snapshots/ are published in the temporary directory)
+
+logging.disable(logging.WARNING)
+
+KEYS = ['user_wallet', 'project']
+
+
+def pairs(df: pd.DataFrame) -> pd.MultiIndex:
+    return pd.MultiIndex.from_frame(df[KEYS])
+
+
+def roc_auc(result: dict, scaler, df: pd.DataFrame) -> float:
+    X = scaler.transform(df[main.ml_manager.feature_columns].fillna(0))
+    return roc_auc_score(df['will_churn'], result['model'].predict_proba(X)[:, 1])
+
+
+def check(name: str, passed: bool, detail: str) -> bool:
+    print(f"{'✓' if passed else '✗'} {name}: {detail}")
+    return passed
+
+
+if __name__ == "__main__":
+    from benchmark_features import scale_to
+    from check_feature_equivalence import bundled_activity, load_activity, normalize
+
+    parser = argparse.ArgumentParser(description="Check holdout scores across an incremental training round")
+    parser.add_argument('--activity', help="Dune user daily activity export (.csv or .joblib)")
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--new-days', type=int, default=7, help="days of activity the update adds")
+    parser.add_argument('--reserve', type=float, default=0.2, help="share of wallets never trained on")
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help="largest ROC-AUC excess of the holdout over the reserved wallets")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    activity = normalize(load_activity(args.activity) if args.activity else bundled_activity(args.seed))
+    activity = scale_to(activity, args.rows, args.seed)
+    wallets = activity['user_wallet'].unique()
+    reserved_wallets = np.random.default_rng(args.seed).choice(wallets, int(len(wallets) * args.reserve), replace=False)
+    reserved = activity['user_wallet'].isin(reserved_wallets)
+    seen = activity[~reserved]
+    cutoff = activity['activity_date'].max() - pd.Timedelta(days=args.new_days)
+    features, ml = main.feature_service, main.ml_manager
+    main.snapshot_store.start()
+    ml.model_configs['memorizer'] = {'model': DecisionTreeClassifier(random_state=args.seed), 'priority': 1}
+
+    training_df, feature_cache, _ = features.update_training_dataset(seen[seen['activity_date'] <= cutoff])
+    ml.train_and_evaluate_all(training_df)
+    published = main.snapshot_store.load(main.snapshot_store.current.generation)
+
+    training_df, _, delta_df = features.update_training_dataset(seen, feature_cache)
+    reserved_df = features.create_training_dataset(activity[reserved])
+    print(f"{len(training_df)} training rows, {len(delta_df)} changed after {args.new_days} new days, "
+          f"{len(reserved_df)} reserved rows")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        results, scaler, split = ml.update_candidates(
+            delta_df, training_df, published.all_models, published.scaler, published.split
+        )
+    checks = []
+
+    fitted = pairs(published.split[~published.split['holdout']])
+    first_seen = ~pairs(split).isin(pairs(published.split))
+    holdout = pairs(training_df).isin(pairs(split[split['holdout']]))
+    leaked = int(pairs(training_df[holdout]).isin(fitted).sum())
+    kept = split.iloc[:len(published.split)]['holdout'].equals(published.split['holdout'])
+    checks.append(check(
+        'split', kept and leaked == 0,
+        f"{int(holdout.sum())} holdout pairs ({int(split.loc[first_seen, 'holdout'].sum())} first seen), "
+        f"{leaked} of them fitted on before"
+    ))
+
+    for result in results:
+        unseen = roc_auc(result, scaler, reserved_df)
+        checks.append(check(
+            result['name'], result['roc_auc'] - unseen <= args.tolerance,
+            f"{result['training']}: holdout ROC-AUC {result['roc_auc']:.3f}, reserved wallets {unseen:.3f} "
+            f"({result['roc_auc'] - unseen:+.3f})"
+        ))
+
+    class_weight_warnings = [w for w in caught if 'class_weight' in str(w.message)]
+    forest = next((r for r in results if r['name'] == 'random_forest'), {})
+    checks.append(check(
+        'forest', forest.get('training') == 'full' and not class_weight_warnings,
+        f"random_forest {forest.get('training')}, {len(class_weight_warnings)} class_weight warning(s)"
+    ))
+
+    sys.exit(0 if all(checks) else 1)
@@ -0,0 +1,150 @@
+"""
+Property test: the JSON the analytics endpoints serve is byte-identical to what the
+original clean_dataframe_for_json + FastAPI JSONResponse path produced
+
+For every frame, the baseline bytes (original cleaning, to_dict('records'),
+jsonable_encoder, JSONResponse) are compared with
+    clean_dataframe_for_json(df).to_dict('records') and records_for_json(df)
+encoded by FastAPI's JSONResponse (the cleaning alone) and by dumps_json (what is
+served). orjson writes exponents as 1e16 where json writes 1e+16, so random floats
+for the dumps_json comparison stay within 1e-4 <= |x| < 1e16, which both encoders
+print positionally; the exponent range is covered by the JSONResponse comparison.
+The original cleaning left NaN in float64 columns, which JSONResponse rejects (those
+requests failed); the baseline maps them to null, as its docstring promised.
+
+Frames checked:
+    data_csv/           every bundled export, as read and with its date columns parsed
+    random              --trials frames of random columns: floats with NaN/inf, ints,
+                        bools, datetimes with NaT, strings with None/NaN, mixed object
+                        cells (dicts, bytes, Decimal, numpy scalars, pd.NA), nullable ints
+Exits non-zero on the first difference.
+
+Usage:
+    python check_json_equivalence.py
+    python check_json_equivalence.py --trials 5000 --seed 7
+"""
+
+import argparse
+import math
+import sys
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import main
+from check_feature_equivalence import bundled_exports
+
+
+def baseline_clean_dataframe_for_json(df: pd.DataFrame) -> pd.DataFrame:
+    """clean_dataframe_for_json before it was vectorized"""
+    if df.empty:
+        return df
+
+    df = df.replace([np.inf, -np.inf], None)
+    df = df.where(pd.notna(df), None)
+
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].astype(str)
+        elif df[col].dtype == 'object':
+            df[col] = df[col].apply(lambda x: str(x) if pd.notna(x) and not isinstance(x, (str, int, float, bool, type(None))) else x)
+
+    return df
+
+
+def response_body(records) -> bytes:
+    return JSONResponse(jsonable_encoder(records)).body
+
+
+def baseline_body(df: pd.DataFrame) -> bytes:
+    records = baseline_clean_dataframe_for_json(df).to_dict('records')
+    records = [
+        {name: None if isinstance(value, float) and not math.isfinite(value) else value for name, value in record.items()}
+        for record in records
+    ]
+    return response_body(records)
+
+
+def bundled_frames() -> dict:
+    frames = {}
+    for name, df in bundled_exports().items():
+        frames[name] = df
+        parsed = df.copy()
+        for column in parsed.columns:
+            if parsed[column].dtype == object and parsed[column].astype(str).str.endswith(' UTC').all():
+                parsed[column] = pd.to_datetime(parsed[column])
+        frames[f"{name} (dates parsed)"] = parsed
+    return frames
+
+
+MIXED_CELLS = [
+    None, np.nan, np.inf, -np.inf, 'x', '', 'é', 1, 2.5, True, np.int64(3), np.float64(1.25),
+    pd.NaT, pd.Timestamp('2025-01-01'), Decimal('0.1'), {'a': 1}, b'b', pd.NA
+]
+
+
+def random_frame(rng: np.random.Generator, positional_floats: bool) -> pd.DataFrame:
+    rows = int(rng.integers(1, 40))
+    exponents = (-4, 16) if positional_floats else (-300, 300)
+    columns = {}
+    for j in range(int(rng.integers(1, 7))):
+        kind = int(rng.integers(0, 8))
+        if kind == 0:
+            values = rng.uniform(1, 10, rows) * 10.0 ** rng.integers(*exponents, rows) * rng.choice([-1, 1], rows)
+            special = rng.random(rows)
+            values[special < 0.1] = np.nan
+            values[(special >= 0.1) & (special < 0.15)] = np.inf
+            values[(special >= 0.15) & (special < 0.2)] = -np.inf
+            columns[f'c{j}'] = values
+        elif kind == 1:
+            columns[f'c{j}'] = rng.integers(-10**12, 10**12, rows)
+        elif kind == 2:
+            columns[f'c{j}'] = rng.random(rows) > 0.5
+        elif kind == 3:
+            dates = pd.to_datetime(rng.integers(1.6e18, 1.7e18, rows))
+            columns[f'c{j}'] = pd.Series(dates).where(rng.random(rows) > 0.2)
+        elif kind == 4:
+            columns[f'c{j}'] = pd.Series(pd.to_datetime(rng.integers(1.6e18, 1.7e18, rows), utc=True))
+        elif kind == 5:
+            columns[f'c{j}'] = pd.Series([['a', 'bb', 'wallet', None, np.nan][rng.integers(0, 5)] for _ in range(rows)], dtype=object)
+        elif kind == 6:
+            columns[f'c{j}'] = pd.Series([MIXED_CELLS[rng.integers(0, len(MIXED_CELLS))] for _ in range(rows)], dtype=object)
+        else:
+            columns[f'c{j}'] = pd.array(rng.integers(0, 4, rows), dtype='Int64')
+    return pd.DataFrame(columns)
+
+
+def check(name: str, df: pd.DataFrame, served: bool = True):
+    """Raises AssertionError naming the path whose bytes differ from the baseline"""
+    expected = baseline_body(df)
+    candidates = {
+        'clean_dataframe_for_json': main.clean_dataframe_for_json(df).to_dict('records'),
+        'records_for_json': main.records_for_json(df)
+    }
+    for path, records in candidates.items():
+        assert response_body(records) == expected, f"{name}: {path} + JSONResponse differs"
+        if served:
+            assert main.dumps_json(records) == expected, f"{name}: {path} + dumps_json differs"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check JSON output against the original cleaning path")
+    parser.add_argument('--trials', type=int, default=1000, help="random frames per float range")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    try:
+        for name, df in bundled_frames().items():
+            check(name, df)
+        print("✓ data_csv exports")
+        for trial in range(args.trials):
+            check(f"trial {trial}", random_frame(rng, positional_floats=True))
+            check(f"trial {trial} (any exponent)", random_frame(rng, positional_floats=False), served=False)
+        print(f"✓ {2 * args.trials} random frames")
+    except AssertionError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
@@ -0,0 +1,178 @@
+"""
+Check CacheManager.fetch_user_daily_activity_paginated against a fake DuneClient
+with injected per-page latency
+
+Every user activity page gets its own latency (--latencies, seconds; page order)
+and overlaps its neighbour by --overlap rows. Runs against an empty
+raw_data_cache in a temporary directory:
+    concurrent  all pages at once: wall-clock close to the slowest page, well
+                under the sum; overlapping rows removed once per duplicate
+    sequential  PAGE_FETCH_CONCURRENCY=1 for comparison: close to the sum
+    retry       one page fails its first attempt: retried, merge complete
+    partial     one page fails every attempt: reported in failed_pages, the
+                others still merged
+    order       overlapping rows carry different values per page and later pages
+                arrive first: the earlier page's row survives, as in the
+                sequential merge (concat in page order, first duplicate kept)
+Exits non-zero on failure.
+
+Usage:
+    python check_page_fetch.py
+    python check_page_fetch.py --latencies 0.5 1 1.5 2 0.5 1 3 --rows 20000
+"""
+
+import argparse
+import asyncio
+import atexit
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# One download thread per page, so the pages can overlap completely
+os.environ.setdefault('FETCH_WORKERS', '8')
+os.environ.setdefault('FETCH_RETRY_BACKOFF', '0.05')
+WORKDIR = tempfile.mkdtemp(prefix='page-fetch-')
+atexit.register(shutil.rmtree, WORKDIR, True)
+os.chdir(WORKDIR)
+import main  # noqa: E402  (creates raw_data_cache/ in the temporary directory)
+
+logging.disable(logging.ERROR)
+
+
+class FakeDuneClient:
+    """DuneClient stand-in serving canned pages after a per-query latency"""
+
+    def __init__(self, pages: dict, latencies: dict, failures: dict = None):
+        self.pages = pages
+        self.latencies = latencies
+        self.failures = dict(failures or {})  # query_id -> attempts that raise
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get_latest_result_dataframe(self, query):
+        query_id = query.query_id
+        with self._lock:
+            self.calls[query_id] += 1
+            failing = self.failures.get(query_id, 0) > 0
+            if failing:
+                self.failures[query_id] -= 1
+        time.sleep(self.latencies[query_id])
+        if failing:
+            raise RuntimeError(f"query {query_id} unavailable")
+        return self.pages[query_id].copy()
+
+    def get_latest_result(self, query_id):
+        raise RuntimeError(f"query {query_id} unavailable")
+
+
+def make_pages(rows: int, overlap: int, seed: int) -> dict:
+    """Dune-shaped pages keyed by query id; page i repeats the last `overlap` rows of page i - 1"""
+    rng = np.random.default_rng(seed)
+    query_ids = list(main.config.user_activity_pages.values())
+    total = rows * len(query_ids)
+    activity = pd.DataFrame({
+        'day': (pd.Timestamp('2025-08-01') + pd.to_timedelta(np.arange(total) % 90, unit='D')).strftime('%Y-%m-%d 00:00:00.000 UTC'),
+        'user_wallet': [f"wallet{i}" for i in np.arange(total) // 90],
+        'project': rng.choice(['StepN', 'Aurory', 'Star Atlas', 'Genopets'], total),
+        'number_of_transactions': rng.integers(1, 200, total)
+    })
+    pages = {}
+    for i, query_id in enumerate(query_ids):
+        start = max(0, i * rows - overlap)
+        pages[query_id] = activity.iloc[start:(i + 1) * rows].reset_index(drop=True)
+    return pages
+
+
+def run(client: FakeDuneClient, concurrency: int) -> tuple:
+    """(merged frame, page fetch report, wall-clock seconds) on an empty cache"""
+    main.cache_manager.dune_client = client
+    main.cache_manager.dune_clients = [client]
+    main.cache_manager.memory_cache.clear()
+    main.cache_manager.metadata.clear()
+    for name in os.listdir(main.cache_manager.cache_dir):
+        os.remove(os.path.join(main.cache_manager.cache_dir, name))
+    main.config.page_fetch_concurrency = concurrency
+
+    start = time.perf_counter()
+    merged = asyncio.run(main.cache_manager.fetch_user_daily_activity_paginated())
+    return merged, main.cache_manager.last_page_fetch_report, time.perf_counter() - start
+
+
+def check(name: str, passed: bool, detail: str) -> bool:
+    print(f"{'✓' if passed else '✗'} {name}: {detail}")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check concurrent user activity page fetching")
+    parser.add_argument('--latencies', type=float, nargs='+', default=[0.4, 0.8, 1.2, 1.6, 0.4, 0.8, 2.0])
+    parser.add_argument('--rows', type=int, default=10000, help="rows per page")
+    parser.add_argument('--overlap', type=int, default=100, help="rows each page repeats from the previous one")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    query_ids = list(main.config.user_activity_pages.values())
+    if len(args.latencies) != len(query_ids):
+        raise SystemExit(f"✗ --latencies needs {len(query_ids)} values, one per page")
+    latencies = dict(zip(query_ids, args.latencies))
+    pages = make_pages(args.rows, args.overlap, args.seed)
+    unique_rows = args.rows * len(query_ids)
+    slowest, total = max(args.latencies), sum(args.latencies)
+    results = []
+
+    merged, report, elapsed = run(FakeDuneClient(pages, latencies), len(query_ids))
+    results.append(check(
+        'concurrent',
+        elapsed < slowest + 0.25 * (total - slowest) and len(merged) == unique_rows
+        and report['duplicates_removed'] == args.overlap * (len(query_ids) - 1),
+        f"{elapsed:.2f}s (slowest page {slowest:.2f}s, sum {total:.2f}s), {len(merged)} rows, "
+        f"{report['duplicates_removed']} duplicates removed"
+    ))
+
+    merged, report, elapsed = run(FakeDuneClient(pages, latencies), 1)
+    results.append(check(
+        'sequential', elapsed >= total and len(merged) == unique_rows,
+        f"{elapsed:.2f}s (sum {total:.2f}s), {len(merged)} rows"
+    ))
+
+    flaky = query_ids[0]
+    client = FakeDuneClient(pages, latencies, failures={flaky: 1})
+    merged, report, elapsed = run(client, len(query_ids))
+    results.append(check(
+        'retry', client.calls[flaky] == 2 and not report['failed_pages'] and len(merged) == unique_rows,
+        f"{client.calls[flaky]} attempts for the failing page, {len(merged)} rows in {elapsed:.2f}s"
+    ))
+
+    broken = query_ids[-1]
+    client = FakeDuneClient(pages, latencies, failures={broken: main.config.fetch_max_retries})
+    merged, report, elapsed = run(client, len(query_ids))
+    broken_page = next(name for name, query_id in main.config.user_activity_pages.items() if query_id == broken)
+    results.append(check(
+        'partial', report['failed_pages'] == [broken_page] and len(merged) == unique_rows - args.rows,
+        f"failed pages {report['failed_pages']}, {report['pages_fetched']} pages merged, {len(merged)} rows"
+    ))
+
+    # Overlap rows of page i differ from page i - 1's copy; pages finish last-to-first
+    conflicting = {
+        query_id: page.assign(number_of_transactions=page['number_of_transactions'] + 1000 * i)
+        for i, (query_id, page) in enumerate(pages.items())
+    }
+    reversed_latencies = dict(zip(query_ids, sorted(args.latencies, reverse=True)))
+    merged, report, elapsed = run(FakeDuneClient(conflicting, reversed_latencies), len(query_ids))
+    expected = pd.concat(
+        [conflicting[query_id] for query_id in query_ids], ignore_index=True
+    ).drop_duplicates(['day', 'user_wallet', 'project'])
+    results.append(check(
+        'order', merged.reset_index(drop=True).equals(expected.reset_index(drop=True)),
+        f"{len(merged)} rows, earlier page's duplicate kept with pages finishing last-to-first"
+    ))
+
+    sys.exit(0 if all(results) else 1)
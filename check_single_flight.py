@@ -0,0 +1,128 @@
+"""
+Check that concurrent cache misses for one Dune source cost one upstream download
+
+Runs the app in-process (httpx ASGITransport) against an empty raw_data_cache in a
+temporary directory, with a stub DuneClient whose downloads take --latency seconds:
+    cold        --requests concurrent GETs of an analytics endpoint: one download,
+                every response 200 with the same data
+    failing     the same against a stub that raises: one download, every request
+                gets the same (empty) answer instead of retrying upstream
+    direct      --requests concurrent CacheManager.fetch_dune_raw calls: one download
+No request may be left in CacheManager._in_flight afterwards. Exits non-zero on failure.
+
+Usage:
+    python check_single_flight.py
+    python check_single_flight.py --requests 500 --latency 1
+"""
+
+import argparse
+import atexit
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import pandas as pd
+
+WORKDIR = tempfile.mkdtemp(prefix='single-flight-')
+atexit.register(shutil.rmtree, WORKDIR, True)
+os.chdir(WORKDIR)
+import main  # noqa: E402  (creates raw_data_cache/ in the temporary directory)
+
+logging.disable(logging.ERROR)  # the failing case logs one error per waiter
+
+ENDPOINT = '/api/analytics/gaming-activity-total'
+
+
+class SlowDuneClient:
+    """DuneClient stand-in: counts downloads, each taking `latency` seconds"""
+
+    def __init__(self, latency: float, fail: bool = False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_latest_result_dataframe(self, query):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        return pd.DataFrame({
+            'project': ['Star Atlas', 'StepN', 'Aurory'],
+            'number_of_game_transactions': [66262037.0, 407242.0, 8018.0],
+            'number_of_unique_users': [6906, 42220, 1032]
+        })
+
+    def get_latest_result(self, query_id):
+        raise RuntimeError("upstream unavailable")
+
+
+def reset(client: SlowDuneClient):
+    """Empty every cache tier and route downloads to client"""
+    main.cache_manager.dune_client = client
+    main.cache_manager.dune_clients = [client]
+    main.cache_manager.memory_cache.clear()
+    main.cache_manager.metadata.clear()
+    for name in os.listdir(main.cache_manager.cache_dir):
+        os.remove(os.path.join(main.cache_manager.cache_dir, name))
+    main.response_cache.clear()
+
+
+async def get_concurrently(path: str, requests: int) -> list:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test', timeout=None) as client:
+        return await asyncio.gather(*[client.get(path) for _ in range(requests)])
+
+
+async def fetch_concurrently(query_key: str, requests: int) -> list:
+    return await asyncio.gather(*[main.cache_manager.fetch_dune_raw(query_key) for _ in range(requests)])
+
+
+def check(name: str, client: SlowDuneClient, ok: bool, detail: str):
+    in_flight = len(main.cache_manager._in_flight)
+    passed = ok and client.calls == 1 and in_flight == 0
+    print(f"{'✓' if passed else '✗'} {name}: {client.calls} upstream call(s), {detail}, {in_flight} left in flight")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check single-flight Dune downloads under concurrent misses")
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds per stub download")
+    args = parser.parse_args()
+
+    results = []
+
+    client = SlowDuneClient(args.latency)
+    reset(client)
+    start = time.perf_counter()
+    responses = asyncio.run(get_concurrently(ENDPOINT, args.requests))
+    bodies = {json.dumps(response.json()['data']) for response in responses if response.status_code == 200}
+    statuses = sorted({response.status_code for response in responses})
+    results.append(check(
+        'cold', client, statuses == [200] and len(bodies) == 1,
+        f"statuses {statuses}, {len(bodies)} distinct payloads in {time.perf_counter() - start:.2f}s"
+    ))
+
+    client = SlowDuneClient(args.latency, fail=True)
+    reset(client)
+    responses = asyncio.run(get_concurrently(ENDPOINT, args.requests))
+    bodies = {json.dumps(response.json().get('data')) for response in responses}
+    statuses = sorted({response.status_code for response in responses})
+    results.append(check('failing', client, len(bodies) == 1, f"statuses {statuses}, {len(bodies)} distinct payloads"))
+
+    client = SlowDuneClient(args.latency)
+    reset(client)
+    frames = asyncio.run(fetch_concurrently('gaming_activity_total', args.requests))
+    rows = sorted({len(df) for df in frames})
+    results.append(check('direct', client, rows == [3], f"rows per caller {rows}"))
+
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,150 @@
+"""
+Peak resident memory of one /api/analytics/user-daily-activity request per response mode
+
+Each measurement runs in a fresh process with the merged activity already in the
+memory cache, drives the app directly over ASGI and discards the body as it is
+sent (as a client reading the socket would), and reports how far RSS rose:
+    original    the handler before streaming: clean_dataframe_for_json(df),
+                to_dict('records') and one JSONResponse
+    json        ?format=json, rendering the pre-serialized document (cold cache)
+    ndjson      ?format=ndjson
+    json-stream ?format=json-stream
+The activity is the one check_feature_equivalence.py expands from data_csv/,
+scaled to each --sizes row count and cached as the user activity pages (--parse-days
+caches `day` as datetimes, so every batch goes through the datetime formatting).
+Fails if a streaming mode peaks above --max-ratio of the original, or grows by
+more than 25% (plus 5 MB) between the smallest and largest size.
+
+Usage:
+    python check_stream_memory.py
+    python check_stream_memory.py --sizes 100000 400000 --batch-rows 2000 --parse-days
+"""
+
+import argparse
+import asyncio
+import atexit
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+# Measurement processes are given the cache of the size being measured (spawn
+# starts them in the original directory)
+if 'STREAM_MEMORY_DIR' in os.environ:
+    os.chdir(os.environ['STREAM_MEMORY_DIR'])
+else:
+    WORKDIR = tempfile.mkdtemp(prefix='stream-memory-')
+    atexit.register(shutil.rmtree, WORKDIR, True)
+    os.chdir(WORKDIR)
+import main  # noqa: E402
+
+PATH = '/api/analytics/user-daily-activity'
+MODES = ['original', 'json', 'ndjson', 'json-stream']
+STREAMING = ['ndjson', 'json-stream']
+
+
+async def consume(path: str, query_string: str) -> int:
+    """Send one GET through the app, dropping body chunks as they arrive; returns body bytes"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query_string.encode(), 'headers': [(b'host', b'test')],
+        'client': ('127.0.0.1', 1), 'server': ('test', 80)
+    }
+    requested = False
+    body_bytes = 0
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        nonlocal body_bytes
+        if message['type'] == 'http.response.start' and message['status'] != 200:
+            raise RuntimeError(f"{path}?{query_string} answered {message['status']}")
+        if message['type'] == 'http.response.body':
+            body_bytes += len(message.get('body', b''))
+
+    await main.app(scope, receive, send)
+    return body_bytes
+
+
+def measure(mode: str) -> tuple:
+    """(MB of resident memory the request added, body MB) - runs in a fresh process"""
+    async def run():
+        df = await main.cache_manager.get_user_daily_activity()
+        with main.PeakMemory() as memory:
+            if mode == 'original':
+                records = main.clean_dataframe_for_json(df).to_dict('records')
+                body_bytes = len(JSONResponse({'data': records}).body)
+                del records
+            else:
+                body_bytes = await consume(PATH, f'format={mode}')
+        return memory.peak_mb, body_bytes / 1024 ** 2
+    return asyncio.run(run())
+
+
+def cache_pages(activity: pd.DataFrame):
+    """Cache activity as the user activity pages in the current directory"""
+    os.makedirs(main.cache_manager.cache_dir, exist_ok=True)
+    pages = list(main.config.user_activity_pages)
+    for i, page in enumerate(pages):
+        main.cache_manager.cache_data(f'user_activity_{page}', activity.iloc[i::len(pages)].reset_index(drop=True))
+
+
+if __name__ == "__main__":
+    from benchmark_features import scale_to
+    from check_feature_equivalence import bundled_activity
+
+    parser = argparse.ArgumentParser(description="Peak RSS per user-daily-activity response mode")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 200_000])
+    parser.add_argument('--batch-rows', type=int, default=main.config.stream_batch_rows,
+                        help="STREAM_BATCH_ROWS for the streaming modes")
+    parser.add_argument('--max-ratio', type=float, default=0.5,
+                        help="largest allowed streaming/original peak ratio")
+    parser.add_argument('--parse-days', action='store_true', help="cache `day` as datetimes instead of Dune strings")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    os.environ['STREAM_BATCH_ROWS'] = str(args.batch_rows)
+
+    activity = bundled_activity(args.seed)
+    if args.parse_days:
+        activity['day'] = pd.to_datetime(activity['day'])
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for size in args.sizes:
+        directory = os.path.join(WORKDIR, str(size))
+        os.makedirs(directory)
+        os.chdir(directory)
+        os.environ['STREAM_MEMORY_DIR'] = directory
+        cache_pages(scale_to(activity, size, args.seed))
+        for mode in MODES:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                peak_mb, body_mb = pool.submit(measure, mode).result()
+            results.append({'rows': size, 'mode': mode, 'peak_rss_mb': round(peak_mb, 1), 'body_mb': round(body_mb, 1)})
+            print(results[-1])
+
+    table = pd.DataFrame(results)
+    print("=" * 60)
+    print(table.pivot(index='mode', columns='rows', values='peak_rss_mb').loc[MODES].to_string())
+    print("=" * 60)
+
+    peaks = table.set_index(['mode', 'rows'])['peak_rss_mb']
+    smallest, largest = min(args.sizes), max(args.sizes)
+    failed = False
+    for mode in STREAMING:
+        ratio = peaks[mode, largest] / max(peaks['original', largest], 1e-9)
+        bounded = peaks[mode, largest] <= 1.25 * peaks[mode, smallest] + 5
+        ok = ratio <= args.max_ratio and bounded
+        failed = failed or not ok
+        print(f"{'✓' if ok else '✗'} {mode}: {ratio:.0%} of the original peak at {largest} rows, "
+              f"{peaks[mode, smallest]:.1f} MB at {smallest} rows -> {peaks[mode, largest]:.1f} MB at {largest} rows")
+    sys.exit(1 if failed else 0)
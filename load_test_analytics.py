@@ -0,0 +1,203 @@
+"""
+Requests/sec before and after the pre-serialized analytics responses
+
+Serves one cache two ways, each from its own uvicorn process:
+    before      the original handlers (baseline_app below): every request cleans
+                the frame with the per-cell clean_dataframe_for_json, calls
+                to_dict('records') and lets FastAPI encode the dict
+    after       main:app - the body rendered once per cache generation and served
+                as bytes, with ETag/304
+and load-tests the 5k-row high_retention_users and the 200k-row user_daily_activity
+endpoints on both (plus conditional requests on 'after'), reporting throughput
+and p50/p99 latency.
+
+The cache is built in a temporary directory from the bundled data_csv exports;
+user activity is the one check_feature_equivalence.py expands from them, scaled to
+--activity-rows and cached as the paginated pages.
+
+Usage:
+    python load_test_analytics.py
+    python load_test_analytics.py --concurrency 16 --requests 1000 40 --activity-rows 200000
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+
+import main
+from check_json_equivalence import baseline_clean_dataframe_for_json
+
+ENDPOINTS = {
+    'high_retention_users': '/api/analytics/high-retention-users',
+    'user_daily_activity': '/api/analytics/user-daily-activity'
+}
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ==================== ORIGINAL HANDLERS ====================
+
+baseline_app = FastAPI()
+
+
+@baseline_app.get(ENDPOINTS['high_retention_users'])
+async def baseline_high_retention_users():
+    df = await main.cache_manager.fetch_dune_raw('high_retention_users')
+    df = baseline_clean_dataframe_for_json(df)
+    metadata = main.cache_manager.get_metadata_for_key(
+        'high_retention_users',
+        'Dune Analytics',
+        main.config.dune_queries['high_retention_users']
+    )
+    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+
+
+@baseline_app.get(ENDPOINTS['user_daily_activity'])
+async def baseline_user_daily_activity():
+    df = await main.cache_manager.fetch_user_daily_activity_paginated()
+    df = baseline_clean_dataframe_for_json(df)
+    now = datetime.now()
+    metadata = main.DataMetadata(
+        source='Dune Analytics (Paginated)',
+        query_id=None,
+        last_updated=now.isoformat(),
+        cache_age_hours=0,
+        is_fresh=True,
+        next_refresh=(now + timedelta(hours=168)).isoformat(),
+        row_count=len(df)
+    )
+    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+
+# ==================== LOAD TEST ====================
+
+
+def build_cache(directory: str, activity_rows: int, seed: int):
+    """Cache the bundled exports and the expanded user activity pages under directory"""
+    from benchmark_features import scale_to
+    from check_feature_equivalence import bundled_activity, bundled_exports
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        cache = main.CacheManager()
+        for name, df in bundled_exports().items():
+            cache.cache_data(name, df)
+        activity = scale_to(bundled_activity(seed), activity_rows, seed)
+        pages = list(main.config.user_activity_pages)
+        for i, page in enumerate(pages):
+            cache.cache_data(f'user_activity_{page}', activity.iloc[i::len(pages)].reset_index(drop=True))
+    finally:
+        os.chdir(cwd)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: str, directory: str) -> str:
+    """Run app with uvicorn in directory; returns its base URL once it answers"""
+    port = free_port()
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([REPO_DIR, os.environ.get('PYTHONPATH', '')])}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app, '--port', str(port), '--log-level', 'warning'],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    atexit.register(process.terminate)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"✗ {app} exited with {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.5)
+    raise SystemExit(f"✗ {app} did not start")
+
+
+async def load(url: str, requests: int, concurrency: int, conditional: bool) -> dict:
+    """Throughput and latency of `requests` GETs of url, `concurrency` at a time"""
+    timeout = aiohttp.ClientTimeout(total=600)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # Warm up: fills the memory cache (and the response cache on 'after')
+        async with session.get(url) as response:
+            body = await response.read()
+            if response.status != 200:
+                raise SystemExit(f"✗ {url} answered {response.status}")
+            headers = {'If-None-Match': response.headers['ETag']} if conditional else {}
+
+        latencies, statuses = [], []
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                async with session.get(url, headers=headers) as response:
+                    await response.read()
+                    statuses.append(response.status)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    expected = 304 if conditional else 200
+    return {
+        'body_mb': round(len(body) / 1024 ** 2, 2),
+        'req_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+        'errors': sum(status != expected for status in statuses)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test analytics endpoints before/after pre-serialization")
+    parser.add_argument('--requests', type=int, nargs=2, default=[400, 20], metavar=('SMALL', 'LARGE'),
+                        help="requests for high_retention_users and for user_daily_activity")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--activity-rows', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='analytics-load-')
+    atexit.register(shutil.rmtree, directory, True)
+    build_cache(directory, args.activity_rows, args.seed)
+    servers = {
+        'before': start_server('load_test_analytics:baseline_app', directory),
+        'after': start_server('main:app', directory)
+    }
+
+    results = []
+    for (name, path), requests in zip(ENDPOINTS.items(), args.requests):
+        runs = [('before', False), ('after', False), ('after', True)]
+        for server, conditional in runs:
+            stats = asyncio.run(load(servers[server] + path, requests, args.concurrency, conditional))
+            label = f"{server} (If-None-Match)" if conditional else server
+            results.append({'endpoint': name, 'server': label, **stats})
+            print(results[-1])
+
+    table = pd.DataFrame(results)
+    print("=" * 60)
+    print(table.to_string(index=False))
+    print("-" * 60)
+    rates = table.set_index(['endpoint', 'server'])['req_s']
+    for name in ENDPOINTS:
+        print(f"{name}: {rates[name, 'after'] / rates[name, 'before']:.1f}x req/s "
+              f"({rates[name, 'after (If-None-Match)'] / rates[name, 'before']:.0f}x with If-None-Match)")
+    print("=" * 60)
+    sys.exit(1 if table['errors'].any() else 0)
@@ -0,0 +1,128 @@
+"""
+Load test for POST /api/ml/score against a local uvicorn
+
+Start the API first:
+    uvicorn main:app --port 8000
+
+Then run:
+    python load_test_score.py --url http://localhost:8000 --concurrency 32 --requests 2000
+
+Every request scores a few synthetic wallets from raw daily activity. Reports
+throughput and p50/p99 latency, and exits non-zero if the p50/p99 targets of
+the server (SCORE_P50_TARGET_MS / SCORE_P99_TARGET_MS) are missed.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+import numpy as np
+
+PROJECTS = ['StepN', 'Aurory', 'Star Atlas', 'Genopets']
+
+
+def make_payload(rng: random.Random, wallets: int, days: int, method: str) -> dict:
+    """Synthetic daily activity for a few wallets (enough rows to be scoreable)"""
+    end = datetime(2025, 11, 1)
+    activity = []
+    for _ in range(wallets):
+        wallet = ''.join(rng.choices('abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ123456789', k=44))
+        project = rng.choice(PROJECTS)
+        for offset in sorted(rng.sample(range(60), days)):
+            day = end - timedelta(days=offset)
+            activity.append({
+                'user_wallet': wallet,
+                'project': project,
+                'day': day.strftime('%Y-%m-%d 00:00:00.000 UTC'),
+                'number_of_transactions': rng.randint(1, 40)
+            })
+    return {'method': method, 'activity': activity}
+
+
+async def worker(session, url, payloads, counter, latencies, errors):
+    while True:
+        index = counter['next']
+        if index >= len(payloads):
+            return
+        counter['next'] += 1
+
+        start = time.perf_counter()
+        try:
+            async with session.post(f"{url}/api/ml/score", json=payloads[index]) as response:
+                await response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(args) -> int:
+    rng = random.Random(args.seed)
+    payloads = [make_payload(rng, args.wallets, args.days, args.method) for _ in range(args.requests)]
+
+    latencies, errors = [], []
+    counter = {'next': 0}
+    timeout = aiohttp.ClientTimeout(total=60)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # Warm up (first request loads pandas paths, thread pools, ...)
+        async with session.post(f"{args.url}/api/ml/score", json=payloads[0]) as response:
+            if response.status != 200:
+                print(f"✗ Warm-up request failed ({response.status}): {await response.text()}")
+                return 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            worker(session, args.url, payloads, counter, latencies, errors)
+            for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+        async with session.get(f"{args.url}/api/ml/score/stats") as response:
+            server_stats = await response.json()
+
+    if not latencies:
+        print(f"✗ No successful requests ({len(errors)} errors)")
+        return 1
+
+    p50 = float(np.percentile(latencies, 50))
+    p99 = float(np.percentile(latencies, 99))
+    p50_target = args.p50_target or server_stats['p50_target_ms']
+    p99_target = args.p99_target or server_stats['p99_target_ms']
+
+    print("=" * 60)
+    print(f"Requests:     {len(latencies)} ok, {len(errors)} errors")
+    print(f"Concurrency:  {args.concurrency}")
+    print(f"Throughput:   {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency p50:  {p50:.1f} ms (target {p50_target:.0f} ms)")
+    print(f"Latency p99:  {p99:.1f} ms (target {p99_target:.0f} ms)")
+    print(f"Server batches: {server_stats['batches']} (avg {server_stats['avg_requests_per_batch']} requests per batch)")
+    print("=" * 60)
+
+    if errors or p50 > p50_target or p99 > p99_target:
+        print("✗ Latency targets missed" if not errors else f"✗ {len(errors)} requests failed")
+        return 1
+    print("✓ Within latency targets")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test POST /api/ml/score")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--wallets', type=int, default=3, help="wallets per request")
+    parser.add_argument('--days', type=int, default=20, help="active days per wallet")
+    parser.add_argument('--method', default='ensemble', choices=['champion', 'ensemble'])
+    parser.add_argument('--p50-target', type=float, default=None, help="override the server's p50 target (ms)")
+    parser.add_argument('--p99-target', type=float, default=None, help="override the server's p99 target (ms)")
+    parser.add_argument('--seed', type=int, default=7)
+    sys.exit(asyncio.run(run(parser.parse_args())))
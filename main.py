@@ -8,9 +8,10 @@ Features:
 - GitHub Actions integration
 """
 
-from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi import FastAPI, HTTPException, Request, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 import pandas as pd
 import numpy as np
 import os
@@ -18,45 +19,129 @@ import time
 import hashlib
 import joblib
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Awaitable
 import logging
 from dune_client.client import DuneClient
 from dotenv import load_dotenv
 import asyncio
-from pydantic import BaseModel
-from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import copy
+import functools
+import pickle
+import inspect
+import marshal
+import shutil
+import uuid
 import json
+import base64
+from collections import OrderedDict, deque
+from email.utils import formatdate, parsedate_to_datetime
 
 # ML imports
 from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, HistGradientBoostingClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import roc_auc_score, accuracy_score, precision_score, recall_score
 from sklearn.model_selection import train_test_split
+from sklearn.base import clone
 from imblearn.over_sampling import SMOTE
 
+def _clean_mixed_object_column(col: pd.Series) -> pd.Series:
+    """Per-cell cleaning for object columns that hold more than plain strings"""
+    col = col.replace([np.inf, -np.inf], None)
+    col = col.where(pd.notna(col), None)
+    col = col.apply(lambda x: str(x) if pd.notna(x) and not isinstance(x, (str, int, float, bool, type(None))) else x)
+    # apply infers float64 when no str is left, turning the None back into NaN
+    return col.astype(object).where(pd.notna(col), None)
+
+def _format_datetime_column(col: pd.Series) -> pd.Series:
+    """astype(str) for a datetime column, formatting each distinct timestamp once"""
+    codes, uniques = pd.factorize(col)
+    labels = np.append(pd.Series(uniques).astype(str).to_numpy(dtype=object), 'NaT')
+    return pd.Series(labels[codes], index=col.index, name=col.name)
+
 def clean_dataframe_for_json(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Comprehensive cleaning for JSON serialization:
+    Comprehensive cleaning for JSON serialization, decided per column by dtype:
     - Replace NaN, Infinity, -Infinity with None
     - Convert datetime columns to ISO strings
-    - Handle nested structures
+    - Handle nested structures (only object columns that are really mixed)
     """
     if df.empty:
         return df
     
-    df = df.replace([np.inf, -np.inf], None)
-    df = df.where(pd.notna(df), None)
+    df = df.copy(deep=False)
+    nonfinite_floats = []
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        dtype = col.dtype
+        
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            df.isetitem(i, _format_datetime_column(col))
+        elif pd.api.types.is_float_dtype(dtype) and isinstance(dtype, np.dtype):
+            if not np.isfinite(col.to_numpy()).all():
+                nonfinite_floats.append(i)
+        elif pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+            continue
+        elif pd.api.types.is_bool_dtype(dtype) and isinstance(dtype, np.dtype):
+            continue
+        elif dtype == 'object':
+            kind = pd.api.types.infer_dtype(col, skipna=True)
+            if kind in ('string', 'empty'):
+                df.isetitem(i, col.where(col.notna(), None))
+            else:
+                df.isetitem(i, _clean_mixed_object_column(col))
+        else:
+            # Extension dtypes (nullable ints, categoricals, ...)
+            col = col.replace([np.inf, -np.inf], None)
+            df.isetitem(i, col.where(pd.notna(col), None))
     
-    for col in df.columns:
-        if pd.api.types.is_datetime64_any_dtype(df[col]):
-            df[col] = df[col].astype(str)
-        elif df[col].dtype == 'object':
-            
-            df[col] = df[col].apply(lambda x: str(x) if pd.notna(x) and not isinstance(x, (str, int, float, bool, type(None))) else x)
+    # Mask all float columns holding NaN/inf in one block operation
+    if nonfinite_floats:
+        floats = df.iloc[:, nonfinite_floats]
+        masked = floats.astype(object).where(np.isfinite(floats.to_numpy()), None)
+        for j, i in enumerate(nonfinite_floats):
+            df.isetitem(i, masked.iloc[:, j])
     
     return df
 
+def records_for_json(df: pd.DataFrame) -> List[Dict]:
+    """
+    to_dict('records') with the cleaning of clean_dataframe_for_json applied per
+    value - cheaper for the handful of rows returned by point lookups
+    """
+    records = df.to_dict('records')
+    # Cleaned per column, as to_dict would box numpy scalars before the per-value pass sees them
+    formatted = {}
+    for name in df.columns:
+        dtype = df[name].dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            formatted[name] = _format_datetime_column(df[name]).tolist()
+        elif dtype == 'object' and pd.api.types.infer_dtype(df[name], skipna=True) not in ('string', 'empty'):
+            formatted[name] = [
+                value.item() if isinstance(value, np.generic) else value
+                for value in _clean_mixed_object_column(df[name])
+            ]
+    for i, record in enumerate(records):
+        for name, value in record.items():
+            if name in formatted:
+                record[name] = formatted[name][i]
+            elif value is None or isinstance(value, (str, bool, int)):
+                continue
+            elif isinstance(value, float):
+                if not np.isfinite(value):
+                    record[name] = None
+            elif pd.api.types.is_scalar(value) and pd.isna(value):
+                record[name] = None
+            else:
+                record[name] = str(value)
+    return records
+
 def safe_float(value: Any) -> Optional[float]:
     """Convert float to JSON-safe value (None if NaN or Inf)"""
     if isinstance(value, (int, float)):
@@ -72,11 +157,36 @@ except ImportError:
     XGBOOST_AVAILABLE = False
     
 try:
-    from lightgbm import LGBMClassifier
+    from lightgbm import LGBMClassifier, Booster as LGBMBooster, early_stopping as lgb_early_stopping
     LIGHTGBM_AVAILABLE = True
 except ImportError:
     LIGHTGBM_AVAILABLE = False
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+def dumps_json(obj: Any) -> bytes:
+    """Serialize to compact JSON bytes (orjson when installed)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str, separators=(',', ':')).encode()
+
 load_dotenv()
 
 logging.basicConfig(
@@ -123,10 +233,93 @@ class Config:
             'page_7': int(os.getenv('QUERY_ID_USER_ACTIVITY_PAGE_7', 6636418)),   # 180k-210k
         }
         
+        # Dedicated thread pool for blocking Dune downloads
+        self.fetch_workers = int(os.getenv('FETCH_WORKERS', 6))
+        
+        # Process pool for CPU-heavy refresh stages (feature engineering, training)
+        self.refresh_process_workers = int(os.getenv('REFRESH_PROCESS_WORKERS', 2))
+        
+        # Candidate model training: concurrent fits sharing a budget of TRAINING_CORES cores
+        # (TRAINING_WORKERS 0 = one process per model up to TRAINING_CORES, 1 = sequential)
+        self.training_workers = int(os.getenv('TRAINING_WORKERS', 0))
+        self.training_cores = int(os.getenv('TRAINING_CORES', os.cpu_count() or 1))
+        
+        # 'hist' (HistGradientBoostingClassifier) or 'exact' (GradientBoostingClassifier)
+        self.gradient_boosting_engine = os.getenv('GRADIENT_BOOSTING_ENGINE', 'hist')
+        self.gradient_boosting_max_iter = int(os.getenv('GRADIENT_BOOSTING_MAX_ITER', 300))
+        
+        # Early stopping for the XGBoost/LightGBM candidates: up to BOOSTING_MAX_ROUNDS trees, stopped
+        # after BOOSTING_EARLY_STOPPING_ROUNDS rounds without improvement on a validation split of
+        # BOOSTING_VALIDATION_FRACTION of the training set (0 = fixed 100 trees, no validation split)
+        self.boosting_validation_fraction = float(os.getenv('BOOSTING_VALIDATION_FRACTION', 0.15))
+        self.boosting_max_rounds = int(os.getenv('BOOSTING_MAX_ROUNDS', 500))
+        self.boosting_early_stopping_rounds = int(os.getenv('BOOSTING_EARLY_STOPPING_ROUNDS', 20))
+        
+        # Incremental retraining (TRAINING_MODE=incremental; 'full' always retrains from scratch):
+        # reuse cached features of users without new activity and add INCREMENTAL_ROUNDS trees to
+        # RF/XGBoost/LightGBM fitted on the changed users only. Retrains from scratch anyway when more
+        # than INCREMENTAL_MAX_DELTA of the rows changed, a feature's PSI against the previous
+        # training set exceeds INCREMENTAL_DRIFT_PSI, or after INCREMENTAL_MAX_UPDATES updates in a row
+        self.training_mode = os.getenv('TRAINING_MODE', 'incremental')
+        self.incremental_rounds = int(os.getenv('INCREMENTAL_ROUNDS', 20))
+        self.incremental_max_delta = float(os.getenv('INCREMENTAL_MAX_DELTA', 0.5))
+        self.incremental_drift_psi = float(os.getenv('INCREMENTAL_DRIFT_PSI', 0.2))
+        self.incremental_max_updates = int(os.getenv('INCREMENTAL_MAX_UPDATES', 8))
+        
+        # Hyperparameters written by tune_models.py, applied over the defaults in MLModelManager
+        self.tuned_params_path = os.getenv('TUNED_PARAMS_PATH', 'tuned_params.json')
+        
+        # Engineered training/prediction frames, keyed by a content hash of the merged activity
+        # and the feature code version (FEATURE_STORE_KEEP artefacts of each kind are kept)
+        self.feature_store_dir = os.getenv('FEATURE_STORE_DIR', 'feature_store')
+        self.feature_store_keep = int(os.getenv('FEATURE_STORE_KEEP', 3))
+        
+        # Refresh output (scaler, models, predictions) is published as one generation under
+        # SNAPSHOT_DIR; SNAPSHOT_KEEP generations are kept (plus any a request still reads)
+        self.snapshot_dir = os.getenv('SNAPSHOT_DIR', 'snapshots')
+        self.snapshot_keep = int(os.getenv('SNAPSHOT_KEEP', 3))
+        
+        # Concurrent page fetching (user activity pages)
+        self.page_fetch_concurrency = int(os.getenv('PAGE_FETCH_CONCURRENCY', 4))
+        self.fetch_max_retries = int(os.getenv('FETCH_MAX_RETRIES', 3))
+        self.fetch_retry_backoff = float(os.getenv('FETCH_RETRY_BACKOFF', 2.0)) # seconds, doubles per retry
+        # Concurrent cache misses for one key share a single download; each caller waits at most this long
+        self.fetch_wait_timeout = float(os.getenv('FETCH_WAIT_TIMEOUT', 600)) # seconds
+        
         self.cache_duration = int(os.getenv('CACHE_DURATION', 604800)) # 7 days
+        # Per-source TTLs in seconds, keyed by cache key or key prefix (longest match wins), e.g.
+        # {"user_activity_": 86400, "gaming_activity_total": 3600}; other keys use CACHE_DURATION
+        self.cache_ttls = self._parse_cache_ttls(os.getenv('CACHE_TTLS', '{}'))
+        # Stale-while-revalidate: up to CACHE_MAX_STALE seconds past its TTL an entry is served at once
+        # while a background download refreshes it; older entries block on the download (0 = always block)
+        self.cache_max_stale = float(os.getenv('CACHE_MAX_STALE', 604800)) # 7 days
+        # Entries up to CACHE_STALE_IF_ERROR seconds past their TTL are served when that download fails
+        self.cache_stale_if_error = float(os.getenv('CACHE_STALE_IF_ERROR', 2592000)) # 30 days
+        
+        # raw_data_cache file format: 'arrow' (Arrow IPC, memory-mapped reads; needs pyarrow) or 'joblib'.
+        # Files in the other format are migrated once at startup
+        self.cache_format = os.getenv('CACHE_FORMAT', 'arrow')
+        self.memory_cache_max_mb = int(os.getenv('MEMORY_CACHE_MAX_MB', 256))
+        self.stream_batch_rows = int(os.getenv('STREAM_BATCH_ROWS', 5000))
         self.min_training_samples = int(os.getenv('MIN_TRAINING_SAMPLES', 100))
         self.prediction_window_days = int(os.getenv('PREDICTION_WINDOW_DAYS', 14))
+        
+        # Online scoring (/api/ml/score): micro-batching and latency targets
+        self.score_batch_max_rows = int(os.getenv('SCORE_BATCH_MAX_ROWS', 4096))
+        self.score_batch_wait_ms = float(os.getenv('SCORE_BATCH_WAIT_MS', 5))
+        self.score_p50_target_ms = float(os.getenv('SCORE_P50_TARGET_MS', 50))
+        self.score_p99_target_ms = float(os.getenv('SCORE_P99_TARGET_MS', 250))
         self.api_secret = os.getenv('FASTAPI_SECRET', '')
+    
+    @staticmethod
+    def _parse_cache_ttls(value: str) -> Dict[str, float]:
+        """CACHE_TTLS as {key prefix: seconds}; a malformed value is logged and ignored"""
+        try:
+            ttls = json.loads(value)
+            return {str(key): float(ttl) for key, ttl in ttls.items()}
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"⚠️ Invalid CACHE_TTLS {value!r} ({e}). Using CACHE_DURATION for every key...")
+            return {}
 
 config = Config()
 
@@ -138,11 +331,205 @@ class DataMetadata(BaseModel):
     last_updated: str
     cache_age_hours: float
     is_fresh: bool
+    is_stale: bool = False  # past its TTL, still served (being revalidated or upstream failing)
+    revalidating: bool = False
     next_refresh: str
     row_count: int
 
+class WalletBatchRequest(BaseModel):
+    wallets: List[str] = Field(..., min_length=1, max_length=1000)
+
+class ActivityRow(BaseModel):
+    user_wallet: str
+    project: str
+    day: str
+    number_of_transactions: float = 1
+
+class FeatureRow(BaseModel):
+    user_wallet: str
+    project: str
+    features: Dict[str, float]
+
+class ScoreRequest(BaseModel):
+    method: str = Field(default='ensemble', pattern='^(champion|ensemble)$')
+    activity: Optional[List[ActivityRow]] = Field(default=None, max_length=100000)
+    features: Optional[List[FeatureRow]] = Field(default=None, max_length=10000)
+    as_of: Optional[str] = None
+
 # ==================== CACHE MANAGER ====================
 
+class JoblibCacheBackend:
+    """Pickled DataFrames - every read unpickles every column"""
+    
+    name = 'joblib'
+    extension = '.joblib'
+    
+    def write(self, path: str, df: pd.DataFrame):
+        joblib.dump(df, path)
+    
+    def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        df = joblib.load(path)
+        return df[columns] if columns is not None else df
+
+class ArrowCacheBackend:
+    """
+    Arrow IPC files (Feather v2, uncompressed) carrying the frame's schema, index
+    and attrs. Reads go through a memory map, so only the selected columns are
+    touched and numeric columns without nulls are zero-copy, read-only views of
+    the file. Files must be replaced, never rewritten in place, while mapped
+    """
+    
+    name = 'arrow'
+    extension = '.arrow'
+    
+    def write(self, path: str, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=None)
+        if df.attrs:
+            metadata = dict(table.schema.metadata or {})
+            metadata[b'pandas_attrs'] = pickle.dumps(df.attrs)
+            table = table.replace_schema_metadata(metadata)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    
+    def read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        df = table.to_pandas(split_blocks=True)
+        attrs = (table.schema.metadata or {}).get(b'pandas_attrs')
+        if attrs:
+            df.attrs = pickle.loads(attrs)
+        return df
+
+def make_cache_backend(name: str):
+    if name == 'arrow':
+        if PYARROW_AVAILABLE:
+            return ArrowCacheBackend()
+        logger.warning("⚠️ CACHE_FORMAT=arrow needs pyarrow. Using joblib...")
+    elif name != 'joblib':
+        logger.warning(f"⚠️ Unknown CACHE_FORMAT '{name}'. Using joblib...")
+    return JoblibCacheBackend()
+
+class MemoryCache:
+    """
+    Process-level LRU of decoded DataFrames in front of the cache files
+    Entries are keyed by cache key and tagged with the file mtime (or cache
+    generation) they were built from, so newer files invalidate them automatically.
+    Objects derived from a frame (indexes) live on its entry and go with it
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (mtime, df, nbytes, derived objects)
+        self._lock = threading.Lock()
+    
+    def get(self, key: str, mtime: Any) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key: str, mtime: Any, df: pd.DataFrame):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (mtime, df, nbytes, {})
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def derived(self, key: str, df: pd.DataFrame, name: str, build: Callable[[pd.DataFrame], Any]) -> Any:
+        """
+        build(df), kept on key's entry while df is the frame cached there, so it is
+        evicted and invalidated together with the frame; built afresh (not kept)
+        when df is not in the cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            derived = entry[3] if entry is not None and entry[1] is df else None
+            if derived is not None and name in derived:
+                return derived[name]
+        value = build(df)
+        if derived is not None:
+            with self._lock:
+                value = derived.setdefault(name, value)
+        return value
+    
+    def invalidate(self, key: str):
+        with self._lock:
+            self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions
+            }
+
+class ResponseCache:
+    """
+    Pre-serialised JSON 'data' arrays for analytics endpoints, rendered once
+    per cache generation (the mtimes of the cache files behind a response)
+    """
+    
+    def __init__(self):
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str, generation: Optional[str]) -> Optional[Dict]:
+        if generation is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry['generation'] != generation:
+            return None
+        return entry
+    
+    def put(self, key: str, generation: Optional[str], data: bytes, row_count: int, last_modified: Optional[float]) -> Dict:
+        entry = {
+            'generation': generation,
+            'data': data,
+            'row_count': row_count,
+            'etag': f'W/"{hashlib.md5(f"{key}:{generation}".encode()).hexdigest()}"' if generation else None,
+            'last_modified': formatdate(last_modified, usegmt=True) if last_modified else None
+        }
+        if generation is not None:
+            with self._lock:
+                self._entries[key] = entry
+        return entry
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 class CacheManager:
     def __init__(self):
         self.cache_dir = "raw_data_cache"
@@ -157,8 +544,24 @@ class CacheManager:
             self.dune_client = DuneClient(current_key)
             logger.info(f"Initialized with API key #{self.current_key_index + 1}")
         
+        # One client per key so parallel fetches spread across all keys
+        self.dune_clients = [DuneClient(key) for key in config.dune_api_keys]
+        self.fetch_executor = ThreadPoolExecutor(
+            max_workers=max(1, config.fetch_workers),
+            thread_name_prefix='dune-fetch'
+        )
+        
+        # Single-flight downloads: cache key -> task every concurrent miss awaits
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        
         self.metadata_file = os.path.join(self.cache_dir, "cache_metadata.json")
         self.metadata = self._load_metadata()
+        
+        # Frames the active backend cannot encode (e.g. mixed-type object columns) fall back to joblib
+        self.backend = make_cache_backend(config.cache_format)
+        self.fallback_backend = JoblibCacheBackend()
+        self.last_page_fetch_report = {}
+        self.memory_cache = MemoryCache(config.memory_cache_max_mb * 1024 * 1024)
     
     def _load_metadata(self) -> Dict:
         if os.path.exists(self.metadata_file):
@@ -210,23 +613,135 @@ class CacheManager:
         
         logger.info(f"🔄 Rotated to API key #{self.current_key_index + 1}/{len(config.dune_api_keys)}")
     
+    def _client_for(self, slot: int) -> Optional[DuneClient]:
+        """Pick a Dune client for the given work slot, starting from the current key"""
+        if not self.dune_clients:
+            return getattr(self, 'dune_client', None)
+        return self.dune_clients[(self.current_key_index + slot) % len(self.dune_clients)]
+    
     def _save_metadata(self):
+        # Temp file + rename: a concurrent reader or a crash never sees half a file
+        tmp_path = f"{self.metadata_file}.tmp-{uuid.uuid4().hex[:8]}"
         try:
-            with open(self.metadata_file, 'w') as f:
+            with open(tmp_path, 'w') as f:
                 json.dump(self.metadata, f, indent=2)
+            os.replace(tmp_path, self.metadata_file)
         except Exception as e:
             logger.error(f"Failed to save metadata: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
     
     def _get_cache_path(self, key: str) -> str:
+        """File holding key: the active backend's, or a joblib fallback file if only that exists"""
         safe_key = hashlib.md5(key.encode()).hexdigest()
-        return os.path.join(self.cache_dir, f"{safe_key}.joblib")
+        path = os.path.join(self.cache_dir, f"{safe_key}{self.backend.extension}")
+        if self.backend.extension != self.fallback_backend.extension and not os.path.exists(path):
+            fallback_path = os.path.join(self.cache_dir, f"{safe_key}{self.fallback_backend.extension}")
+            if os.path.exists(fallback_path):
+                return fallback_path
+        return path
+    
+    def _backend_for(self, path: str):
+        return self.backend if path.endswith(self.backend.extension) else self.fallback_backend
+    
+    def migrate_cache_files(self):
+        """
+        One-time conversion of cache files written in another format to the active
+        backend (keeps each file's mtime, so cache ages and generations are unchanged)
+        Run at app startup, not on import
+        """
+        marker = os.path.join(self.cache_dir, "cache_format.json")
+        try:
+            with open(marker, 'r') as f:
+                if json.load(f).get('format') == self.backend.name:
+                    return
+        except (OSError, ValueError):
+            pass
+        
+        readers = {JoblibCacheBackend.extension: JoblibCacheBackend()}
+        if PYARROW_AVAILABLE:
+            readers[ArrowCacheBackend.extension] = ArrowCacheBackend()
+        migrated, kept = 0, 0
+        for name in os.listdir(self.cache_dir):
+            stem, extension = os.path.splitext(name)
+            if extension == self.backend.extension or extension not in readers:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            target = os.path.join(self.cache_dir, f"{stem}{self.backend.extension}")
+            try:
+                df = readers[extension].read(path)
+                if not isinstance(df, pd.DataFrame):
+                    continue
+                mtime_ns = os.stat(path).st_mtime_ns
+                self._write_file(target, df, self.backend)
+                os.utime(target, ns=(mtime_ns, mtime_ns))
+                os.remove(path)
+                migrated += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Kept {name} as {extension} ({e})")
+                kept += 1
+        
+        try:
+            with open(marker, 'w') as f:
+                json.dump({'format': self.backend.name, 'migrated_at': datetime.now().isoformat()}, f, indent=2)
+        except OSError as e:
+            logger.error(f"Failed to save cache format marker: {e}")
+        if migrated or kept:
+            logger.info(f"✓ Migrated {migrated} cache files to {self.backend.name} ({kept} kept)")
+    
+    def _write_file(self, path: str, df: pd.DataFrame, backend):
+        """Write through a temp file + rename: readers (and memory maps) never see a partial file"""
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            backend.write(tmp_path, df)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def ttl_for(self, key: str) -> float:
+        """Seconds a cached key stays fresh: the longest matching CACHE_TTLS prefix, else CACHE_DURATION"""
+        matches = [prefix for prefix in config.cache_ttls if key.startswith(prefix)]
+        return config.cache_ttls[max(matches, key=len)] if matches else config.cache_duration
+    
+    def _staleness(self, key: str) -> Optional[float]:
+        """Seconds the cached key is past its TTL (negative while fresh, None if not cached)"""
+        try:
+            mtime = os.path.getmtime(self._get_cache_path(key))
+        except OSError:
+            return None
+        return time.time() - mtime - self.ttl_for(key)
     
     def _is_cache_valid(self, key: str) -> bool:
-        filepath = self._get_cache_path(key)
-        if not os.path.exists(filepath):
-            return False
-        file_age = time.time() - os.path.getmtime(filepath)
-        return file_age < config.cache_duration
+        staleness = self._staleness(key)
+        return staleness is not None and staleness < 0
+    
+    def is_stale(self, key: str) -> bool:
+        """Past its TTL but within config.cache_max_stale: served while revalidating"""
+        staleness = self._staleness(key)
+        return staleness is not None and 0 <= staleness < config.cache_max_stale
+    
+    def get_generation(self, keys: List[str], max_stale: float = 0) -> Optional[str]:
+        """
+        Identify the current contents of the given cache keys (None if any is missing/expired)
+        - max_stale: also accept entries up to this many seconds past their TTL
+        """
+        mtimes = []
+        for key in keys:
+            try:
+                mtime = os.path.getmtime(self._get_cache_path(key))
+            except OSError:
+                return None
+            if time.time() - mtime >= self.ttl_for(key) + max_stale:
+                return None
+            mtimes.append(repr(mtime))
+        return '|'.join(mtimes)
+    
+    def last_modified(self, keys: List[str]) -> Optional[float]:
+        try:
+            return max(os.path.getmtime(self._get_cache_path(key)) for key in keys)
+        except (OSError, ValueError):
+            return None
     
     def _get_cache_age(self, key: str) -> float:
         filepath = self._get_cache_path(key)
@@ -235,19 +750,48 @@ class CacheManager:
         file_age = time.time() - os.path.getmtime(filepath)
         return file_age / 3600
     
-    def get_cached_data(self, key: str) -> Optional[pd.DataFrame]:
-        if self._is_cache_valid(key):
-            filepath = self._get_cache_path(key)
-            try:
-                return joblib.load(filepath)
-            except Exception as e:
-                logger.warning(f"Cache read error for {key}: {e}")
-        return None
+    def get_cached_data(self, key: str, columns: Optional[List[str]] = None, max_stale: float = 0) -> Optional[pd.DataFrame]:
+        """
+        Return the cached frame for key if still valid, from memory when possible
+        The returned frame is shared with the memory cache - do not mutate it
+        - columns: only these columns; read straight from the file (not memory cached)
+          unless the whole frame is already in memory
+        - max_stale: also return a frame up to this many seconds past the key's TTL
+        """
+        filepath = self._get_cache_path(key)
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
+            return None
+        if time.time() - mtime >= self.ttl_for(key) + max_stale:
+            return None
+        
+        df = self.memory_cache.get(key, mtime)
+        if df is not None:
+            if columns is None:
+                return df
+            missing = [column for column in columns if column not in df.columns]
+            if missing:
+                # Same outcome as a file read of missing columns: a miss, not a KeyError
+                logger.warning(f"Cache read error for {key}: columns {missing} not cached")
+                return None
+            return df[columns]
+        
+        try:
+            df = self._backend_for(filepath).read(filepath, columns)
+        except Exception as e:
+            logger.warning(f"Cache read error for {key}: {e}")
+            return None
+        if columns is None:
+            self.memory_cache.put(key, mtime, df)
+        return df
     
     def cache_data(self, key: str, data: pd.DataFrame):
         filepath = self._get_cache_path(key)
         try:
-            joblib.dump(data, filepath)
+            self.memory_cache.invalidate(key)
+            filepath = self._write_cache_file(key, data)
+            self.memory_cache.put(key, os.path.getmtime(filepath), data)
             self.metadata[key] = {
                 'last_updated': datetime.now().isoformat(),
                 'row_count': len(data)
@@ -257,68 +801,227 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Cache write error for {key}: {e}")
     
-    async def fetch_dune_raw(self, query_key: str) -> pd.DataFrame:
-        """Fetch data from Dune - automatic pagination handled by Dune client"""
-        cached = self.get_cached_data(query_key)
+    def _write_cache_file(self, key: str, data: pd.DataFrame) -> str:
+        """Write with the active backend, falling back to joblib for frames it cannot encode"""
+        safe_key = hashlib.md5(key.encode()).hexdigest()
+        path = os.path.join(self.cache_dir, f"{safe_key}{self.backend.extension}")
+        stale_path = os.path.join(self.cache_dir, f"{safe_key}{self.fallback_backend.extension}")
+        try:
+            self._write_file(path, data, self.backend)
+        except (TypeError, ValueError, NotImplementedError) as e:
+            if self.backend.extension == self.fallback_backend.extension:
+                raise
+            logger.warning(f"⚠️ {key} not {self.backend.name}-encodable ({e}), cached as joblib")
+            path, stale_path = stale_path, path
+            self._write_file(path, data, self.fallback_backend)
+        if stale_path != path and os.path.exists(stale_path):
+            os.remove(stale_path)
+        return path
+    
+    async def _download_query(self, query_key: str, query_id: int, client: Optional[DuneClient] = None) -> pd.DataFrame:
+        """Download one query result from Dune on the fetch executor (raises on failure)"""
+        dune_client = client or self.dune_client
+        
+        def fetch_with_auto_pagination():
+            from dune_client.query import QueryBase
+            
+            logger.info(f"Fetching query {query_id} with automatic pagination...")
+            
+            try:
+                # Option 1: Use get_latest_result_dataframe - handles pagination automatically!
+                df = dune_client.get_latest_result_dataframe(
+                    query=QueryBase(query_id=query_id)
+                )
+                
+                logger.info(f"✓ Successfully fetched {len(df)} rows for {query_key}")
+                return df
+                
+            except Exception as e:
+                logger.error(f"Failed to fetch with automatic pagination: {e}")
+                
+                # Fallback: Try the old method for compatibility
+                logger.info("Trying fallback method...")
+                result = dune_client.get_latest_result(query_id)
+                df = pd.DataFrame(result.result.rows)
+                logger.info(f"✓ Fetched {len(df)} rows using fallback method")
+                return df
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.fetch_executor, fetch_with_auto_pagination)
+    
+    def _start_flight(self, key: str, fetch: Callable[[], Awaitable[pd.DataFrame]]) -> asyncio.Task:
+        """The running fetch task for key, started with fetch() if there is none"""
+        task = self._in_flight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            
+            def forget(done: asyncio.Task):
+                if self._in_flight.get(key) is done:
+                    del self._in_flight[key]
+                if not done.cancelled():
+                    done.exception()  # retrieved even if every waiter timed out
+            task.add_done_callback(forget)
+        else:
+            logger.info(f"Joining in-flight fetch for {key}")
+        return task
+    
+    def _is_in_flight(self, key: str) -> bool:
+        task = self._in_flight.get(key)
+        return task is not None and task.get_loop() is asyncio.get_running_loop()
+    
+    async def _single_flight(self, key: str, fetch: Callable[[], Awaitable[pd.DataFrame]]) -> pd.DataFrame:
+        """
+        Run fetch() for key unless a fetch for key is already running, in which case
+        wait for that one: concurrent cache misses cost one download and one cache write
+        - every waiter gets the same frame, or the same exception
+        - a waiter gives up after config.fetch_wait_timeout (asyncio.TimeoutError);
+          the shared download keeps running for the others
+        """
+        task = self._start_flight(key, fetch)
+        return await asyncio.wait_for(asyncio.shield(task), timeout=config.fetch_wait_timeout)
+    
+    def _revalidate(self, key: str, fetch: Callable[[], Awaitable[pd.DataFrame]]):
+        """Refresh a stale key in the background - one download however many readers see it stale"""
+        if self._is_in_flight(key):
+            return
+        logger.info(f"🔄 Serving stale {key}, revalidating in background")
+        
+        def report(done: asyncio.Task):
+            if not done.cancelled() and done.exception() is not None:
+                logger.warning(f"⚠️ Background revalidation of {key} failed: {done.exception()}")
+        self._start_flight(key, fetch).add_done_callback(report)
+    
+    async def _cached_or_fetch(self, key: str, fetch: Callable[[], Awaitable[pd.DataFrame]], block_on_stale: bool = False) -> pd.DataFrame:
+        """
+        Serve key from the cache, downloading it with fetch() (single-flight) when needed
+        - fresh: the cached frame
+        - stale (up to config.cache_max_stale past its TTL): the cached frame at once, refreshed
+          in the background; block_on_stale waits for the download instead (refresh pipeline)
+        - older or missing: wait for the download; if it fails, a frame up to
+          config.cache_stale_if_error past its TTL is served instead of raising
+        """
+        cached = self.get_cached_data(key)
         if cached is not None:
-            logger.info(f"Using cached data for {query_key}")
+            logger.info(f"Using cached data for {key}")
             return cached
         
+        if not block_on_stale and config.cache_max_stale > 0:
+            stale = self.get_cached_data(key, max_stale=config.cache_max_stale)
+            if stale is not None:
+                self._revalidate(key, fetch)
+                return stale
+        
+        try:
+            return await self._single_flight(key, fetch)
+        except Exception as e:
+            stale = self.get_cached_data(key, max_stale=config.cache_stale_if_error)
+            if stale is None:
+                raise
+            logger.warning(f"⚠️ Fetch failed for {key} ({e or type(e).__name__}), serving stale data ({self._get_cache_age(key):.1f}h old)")
+            return stale
+    
+    async def _download_source(self, query_key: str, query_id: int, client: Optional[DuneClient] = None) -> pd.DataFrame:
+        """Download one Dune source and cache it (raises on failure)"""
         if not hasattr(self, 'dune_client'):
-            logger.warning("Dune client not initialized")
-            return pd.DataFrame()
+            raise RuntimeError("Dune client not initialized")
+        logger.info(f"Fetching fresh data for {query_key}...")
+        df = await self._download_query(query_key, query_id, client)
+        self.cache_data(query_key, df)
+        return df
+    
+    async def fetch_dune_raw(self, query_key: str, query_id: Optional[int] = None, client: Optional[DuneClient] = None,
+                             block_on_stale: bool = False) -> pd.DataFrame:
+        """Fetch data from Dune - automatic pagination handled by Dune client"""
+        if query_id is None:
+            query_id = config.dune_queries[query_key]
         
         try:
-            logger.info(f"Fetching fresh data for {query_key}...")
-            
-            def fetch_with_auto_pagination():
-                from dune_client.query import QueryBase
-                
-                query_id = config.dune_queries[query_key]
-                logger.info(f"Fetching query {query_id} with automatic pagination...")
-                
-                try:
-                    # Option 1: Use get_latest_result_dataframe - handles pagination automatically!
-                    df = self.dune_client.get_latest_result_dataframe(
-                        query=QueryBase(query_id=query_id)
-                    )
-                    
-                    logger.info(f"✓ Successfully fetched {len(df)} rows for {query_key}")
-                    return df
-                    
-                except Exception as e:
-                    logger.error(f"Failed to fetch with automatic pagination: {e}")
-                    
-                    # Fallback: Try the old method for compatibility
-                    logger.info("Trying fallback method...")
-                    result = self.dune_client.get_latest_result(query_id)
-                    df = pd.DataFrame(result.result.rows)
-                    logger.info(f"✓ Fetched {len(df)} rows using fallback method")
-                    return df
-            
-            loop = asyncio.get_event_loop()
-            df = await loop.run_in_executor(None, fetch_with_auto_pagination)
-            
-            self.cache_data(query_key, df)
-            return df
-            
+            return await self._cached_or_fetch(
+                query_key, lambda: self._download_source(query_key, query_id, client), block_on_stale
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out after {config.fetch_wait_timeout:g}s waiting for {query_key}")
+            return pd.DataFrame()
         except Exception as e:
             logger.error(f"Failed to fetch {query_key}: {e}")
             return pd.DataFrame()
     
+    def revalidate_stale(self, keys: List[str]):
+        """
+        Start background refreshes for the stale keys among these (Dune sources and user
+        activity pages), for read paths that skip fetch_* on a memory/response cache hit
+        """
+        semaphore = None
+        for slot, key in enumerate(keys):
+            if not self.is_stale(key) or self._is_in_flight(key):
+                continue
+            page_name = key[len('user_activity_'):] if key.startswith('user_activity_') else None
+            client = self._client_for(slot)
+            if key in config.dune_queries:
+                fetch = functools.partial(self._download_source, key, config.dune_queries[key], client)
+            elif page_name in config.user_activity_pages:
+                semaphore = semaphore or asyncio.Semaphore(max(1, config.page_fetch_concurrency))
+                fetch = functools.partial(self._download_page, page_name, config.user_activity_pages[page_name], semaphore, client)
+            else:
+                continue
+            self._revalidate(key, fetch)
+    
+    async def fetch_all_sources(self, query_keys: List[str], block_on_stale: bool = False) -> tuple:
+        """
+        Fetch several Dune sources concurrently, one API key per source in turn
+        Returns (results by key, per-source timing report) - a source whose download
+        failed (with no stale copy to fall back on) gets an empty frame and status 'failed'
+        """
+        async def run_source(slot: int, query_key: str):
+            source_start = time.time()
+            client = self._client_for(slot)
+            # Not fetch_dune_raw: it turns failures into empty frames, which would report as 'empty'
+            fetch = functools.partial(self._download_source, query_key, config.dune_queries[query_key], client)
+            try:
+                df = await self._cached_or_fetch(query_key, fetch, block_on_stale)
+                error = None
+            except asyncio.TimeoutError:
+                df, error = pd.DataFrame(), f"timed out after {config.fetch_wait_timeout:g}s"
+            except Exception as e:
+                df, error = pd.DataFrame(), str(e) or type(e).__name__
+            
+            timing = {
+                'rows': len(df),
+                'seconds': round(time.time() - source_start, 2),
+                'api_key': (self.current_key_index + slot) % len(self.dune_clients) + 1 if self.dune_clients else None,
+                'status': 'failed' if error else ('ok' if not df.empty else 'empty')
+            }
+            if error:
+                timing['error'] = error
+            return query_key, df, timing
+        
+        outcomes = await asyncio.gather(*[
+            run_source(slot, query_key) for slot, query_key in enumerate(query_keys)
+        ])
+        
+        results = {query_key: df for query_key, df, _ in outcomes}
+        report = {query_key: timing for query_key, _, timing in outcomes}
+        return results, report
+    
     def get_metadata_for_key(self, key: str, source: str, query_id: Optional[int] = None) -> DataMetadata:
-        cache_age = self._get_cache_age(key)
+        return self.get_metadata_for_keys([key], source, query_id)
+    
+    def get_metadata_for_keys(self, keys: List[str], source: str, query_id: Optional[int] = None) -> DataMetadata:
+        """Metadata for a source cached under one or more keys - the key closest to (or furthest past) its TTL decides"""
+        ages = {key: self._get_cache_age(key) for key in keys}
+        remaining = {key: self.ttl_for(key) / 3600 - ages[key] for key in keys}
+        key = min(keys, key=remaining.get)
+        cache_age = ages[key]
         last_updated = self.metadata.get(key, {}).get('last_updated', 'Unknown')
-        row_count = self.metadata.get(key, {}).get('row_count', 0)
+        row_count = sum(self.metadata.get(k, {}).get('row_count', 0) for k in keys)
         
         if cache_age == float('inf'):
             next_refresh = 'Not cached yet'
             is_fresh = False
         else:
-            cache_duration_hours = config.cache_duration / 3600
-            is_fresh = cache_age < cache_duration_hours
-            hours_until_refresh = cache_duration_hours - cache_age
-            next_refresh_time = datetime.now() + timedelta(hours=hours_until_refresh)
+            is_fresh = remaining[key] > 0
+            next_refresh_time = datetime.now() + timedelta(hours=remaining[key])
             next_refresh = next_refresh_time.isoformat()
         
         return DataMetadata(
@@ -327,69 +1030,163 @@ class CacheManager:
             last_updated=last_updated,
             cache_age_hours=round(cache_age, 2) if cache_age != float('inf') else 0,
             is_fresh=is_fresh,
+            is_stale=cache_age != float('inf') and not is_fresh,
+            revalidating=any(k in self._in_flight for k in keys),
             next_refresh=next_refresh,
             row_count=row_count
         )
     
-    async def fetch_user_daily_activity_paginated(self) -> pd.DataFrame:
+    async def _download_page(self, page_name: str, query_id: int, semaphore: asyncio.Semaphore, client: Optional[DuneClient] = None) -> pd.DataFrame:
+        """Download one user activity page and cache it, retrying with exponential backoff"""
+        if not hasattr(self, 'dune_client'):
+            raise RuntimeError("Dune client not initialized")
+        
+        cache_key = f'user_activity_{page_name}'
+        async with semaphore:
+            for attempt in range(1, config.fetch_max_retries + 1):
+                try:
+                    logger.info(f"📄 Fetching {page_name} (Query {query_id}), attempt {attempt}...")
+                    df = await self._download_query(cache_key, query_id, client)
+                    self.cache_data(cache_key, df)
+                    return df
+                except Exception as e:
+                    if attempt == config.fetch_max_retries:
+                        raise
+                    delay = config.fetch_retry_backoff * (2 ** (attempt - 1))
+                    logger.warning(f"  ⚠️ {page_name} attempt {attempt} failed: {e}. Retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+    
+    async def _fetch_page_with_retry(self, page_name: str, query_id: int, semaphore: asyncio.Semaphore, client: Optional[DuneClient] = None,
+                                     block_on_stale: bool = False) -> pd.DataFrame:
+        """Fetch one user activity page (cache first, stale-while-revalidate), retrying with exponential backoff"""
+        # Concurrent merges (read endpoints, refresh) share one download per page
+        return await self._cached_or_fetch(
+            f'user_activity_{page_name}',
+            lambda: self._download_page(page_name, query_id, semaphore, client),
+            block_on_stale
+        )
+    
+    async def get_user_daily_activity(self) -> pd.DataFrame:
+        """
+        Merged user activity for read endpoints, kept in the memory cache until
+        any page changes. The returned frame is shared - do not mutate it
+        """
+        page_keys = [f'user_activity_{page}' for page in config.user_activity_pages]
+        generation = self.get_generation(page_keys, config.cache_max_stale)
+        if generation is not None:
+            merged = self.memory_cache.get('user_activity_merged', generation)
+            if merged is not None:
+                self.revalidate_stale(page_keys)
+                return merged
+        
+        merged = await self.fetch_user_daily_activity_paginated()
+        generation = self.get_generation(page_keys, config.cache_max_stale)
+        if generation is not None and not merged.empty:
+            self.memory_cache.put('user_activity_merged', generation, merged)
+        return merged
+    
+    async def fetch_user_daily_activity_paginated(self, compact: bool = False, block_on_stale: bool = False) -> pd.DataFrame:
         """
-        Fetch user daily activity from 6 paginated queries and merge them
-        Returns combined dataframe with all ~155k rows
+        Fetch user daily activity from the paginated queries concurrently and merge them
+        - at most config.page_fetch_concurrency pages are downloaded at once
+        - pages are deduplicated on (day, user_wallet, project) on ActivityEncoder
+          codes, in page order: a page is merged once every earlier page has arrived,
+          so the earlier page's row wins whatever order the downloads finish in
+        - compact: return the ActivityEncoder frame (refresh pipeline) instead of the
+          Dune columns (read endpoints)
+        - block_on_stale: wait for stale pages to download instead of serving them (refresh pipeline)
+        - per-page outcome is kept in self.last_page_fetch_report
         """
         logger.info("=" * 60)
-        logger.info("FETCHING USER ACTIVITY (PAGINATED)")
+        logger.info("FETCHING USER ACTIVITY (PAGINATED, CONCURRENT)")
         logger.info("=" * 60)
         
-        all_pages = []
-        total_rows = 0
+        pages = config.user_activity_pages
+        page_order = list(pages.keys())
+        semaphore = asyncio.Semaphore(max(1, config.page_fetch_concurrency))
+        start_time = time.time()
         
-        for page_name, query_id in config.user_activity_pages.items():
+        async def run_page(slot: int, page_name: str, query_id: int):
+            page_start = time.time()
             try:
-                cache_key = f'user_activity_{page_name}'
-                logger.info(f"📄 Fetching {page_name} (Query {query_id})...")
-                
-                # Create a temporary config entry for this page
-                original_queries = config.dune_queries.copy()
-                config.dune_queries[cache_key] = query_id
-                
-                # Fetch using existing method (with caching)
-                df = await self.fetch_dune_raw(cache_key)
-                
-                # Restore original queries
-                config.dune_queries = original_queries
-                
-                if not df.empty:
-                    all_pages.append(df)
-                    total_rows += len(df)
-                    logger.info(f"  ✓ {page_name}: {len(df):,} rows (Total: {total_rows:,})")
-                else:
-                    logger.warning(f"  ⚠️ {page_name}: No data returned")
-                    
+                df = await self._fetch_page_with_retry(page_name, query_id, semaphore, self._client_for(slot), block_on_stale)
+                return page_name, df, None, time.time() - page_start
             except Exception as e:
-                logger.error(f"  ✗ {page_name} failed: {e}")
-                # Continue fetching other pages even if one fails
-                continue
+                return page_name, None, e, time.time() - page_start
+        
+        tasks = [
+            asyncio.ensure_future(run_page(slot, name, qid))
+            for slot, (name, qid) in enumerate(pages.items())
+        ]
+        
+        dedup_columns = ['day', 'user_wallet', 'project']
+        encoder = ActivityEncoder()
+        kept_pages = {}
+        total_rows = 0
+        duplicates_removed = 0
+        report = {'pages': {}, 'failed_pages': []}
+        
+        def merge_page(page_name: str, df: Optional[pd.DataFrame], error: Optional[Exception], elapsed: float):
+            nonlocal total_rows, duplicates_removed
+            if error is not None:
+                logger.error(f"  ✗ {page_name} failed: {error}")
+                report['pages'][page_name] = {'status': 'failed', 'error': str(error), 'seconds': round(elapsed, 2)}
+                report['failed_pages'].append(page_name)
+                return
+            
+            if df.empty:
+                logger.warning(f"  ⚠️ {page_name}: No data returned")
+                report['pages'][page_name] = {'status': 'empty', 'rows': 0, 'seconds': round(elapsed, 2)}
+                return
+            
+            # Streaming dedup: drop rows already seen in this page or in earlier pages
+            if all(col in df.columns for col in dedup_columns):
+                encoded = encoder.encode(df)
+                is_new = encoder.new_rows(encoded)
+                duplicates_removed += int((~is_new).sum())
+                df = encoded[is_new] if compact else df[is_new]
+            elif compact:
+                logger.error(f"  ✗ {page_name}: missing columns {[c for c in dedup_columns if c not in df.columns]}")
+                report['pages'][page_name] = {'status': 'failed', 'error': 'missing columns', 'seconds': round(elapsed, 2)}
+                report['failed_pages'].append(page_name)
+                return
+            
+            kept_pages[page_name] = df
+            total_rows += len(df)
+            report['pages'][page_name] = {'status': 'ok', 'rows': len(df), 'seconds': round(elapsed, 2)}
+            logger.info(f"  ✓ {page_name}: {len(df):,} rows in {elapsed:.1f}s (Total: {total_rows:,})")
+        
+        arrived = {}
+        next_page = 0
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            arrived[result[0]] = result
+            # Merge in page order as soon as every earlier page is in
+            while next_page < len(page_order) and page_order[next_page] in arrived:
+                merge_page(*arrived.pop(page_order[next_page]))
+                next_page += 1
+        
+        report['elapsed_seconds'] = round(time.time() - start_time, 2)
+        report['pages_fetched'] = len(kept_pages)
+        report['duplicates_removed'] = duplicates_removed
+        self.last_page_fetch_report = report
         
-        if not all_pages:
+        if not kept_pages:
             logger.error("❌ Failed to fetch ANY pages!")
             return pd.DataFrame()
         
-        # Merge all pages
-        logger.info("🔄 Merging all pages...")
-        merged_df = pd.concat(all_pages, ignore_index=True)
+        # Keep page order in the merged frame regardless of arrival order
+        ordered_pages = [kept_pages[name] for name in page_order if name in kept_pages]
+        merged_df = encoder.finish(ordered_pages) if compact else pd.concat(ordered_pages, ignore_index=True)
         
-        # Check for duplicates
-        before_dedup = len(merged_df)
-        merged_df = merged_df.drop_duplicates(subset=['day', 'user_wallet', 'project'])
-        after_dedup = len(merged_df)
-        
-        duplicates_removed = before_dedup - after_dedup
         if duplicates_removed > 0:
             logger.warning(f"⚠️ Removed {duplicates_removed:,} duplicate rows")
         
         logger.info("=" * 60)
-        logger.info(f"✓ MERGE COMPLETE")
-        logger.info(f"  Pages fetched: {len(all_pages)}/7")
+        logger.info(f"✓ MERGE COMPLETE in {report['elapsed_seconds']:.1f}s")
+        logger.info(f"  Pages fetched: {len(kept_pages)}/{len(pages)}")
+        if report['failed_pages']:
+            logger.warning(f"  Failed pages: {', '.join(report['failed_pages'])}")
         logger.info(f"  Total rows: {len(merged_df):,}")
         logger.info(f"  Duplicates removed: {duplicates_removed:,}")
         logger.info("=" * 60)
@@ -398,6 +1195,112 @@ class CacheManager:
 
 # ==================== FEATURE ENGINEERING ====================
 
+class ActivityEncoder:
+    """
+    Compact schema for user daily activity on its way from Dune pages to features
+    - user_wallet / project: integer codes into dictionaries shared by every page
+      the encoder sees, so merge and dedup compare integers; finish() turns them
+      into categoricals with sorted categories (groups keep the string order)
+    - activity_date: int32 day number (days since 1970-01-01, UTC)
+    - daily_transactions: smallest integer type that holds the counts (float if fractional)
+    """
+
+    key_columns = ['user_wallet', 'project']
+    transaction_columns = ['daily_transactions', 'number_of_transactions', 'transaction_count', 'txn_count']
+
+    def __init__(self):
+        self.dictionaries = {column: pd.Index([], dtype=object) for column in self.key_columns}
+        self._seen_keys: Optional[pd.Index] = None
+
+    @staticmethod
+    def is_compact(df: pd.DataFrame) -> bool:
+        return (
+            all(column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype) for column in ActivityEncoder.key_columns)
+            and 'activity_date' in df.columns and pd.api.types.is_integer_dtype(df['activity_date'])
+        )
+
+    @staticmethod
+    def day_numbers(dates: pd.Series) -> np.ndarray:
+        """int32 days since 1970-01-01 of datetimes (or date strings); naive values are taken as UTC"""
+        codes, uniques = pd.factorize(dates, use_na_sentinel=False)
+        parsed = pd.to_datetime(pd.Series(uniques), utc=True, format='mixed', errors='coerce')
+        days = parsed.dt.as_unit('ns').astype('int64').to_numpy() // 86_400_000_000_000
+        days[parsed.isna().to_numpy()] = np.iinfo(np.int32).min
+        return days.astype(np.int32)[codes]
+
+    @staticmethod
+    def to_timestamp(day: int) -> pd.Timestamp:
+        return pd.Timestamp(int(day), unit='D', tz='UTC')
+
+    def _codes(self, column: str, values: pd.Series) -> np.ndarray:
+        """Codes of values in the column's shared dictionary (new values are appended)"""
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        # Same labels as astype(str) on the full column, at the cost of the distinct values only
+        labels, uniques = pd.factorize(pd.Index(uniques).astype(str))
+        dictionary = self.dictionaries[column]
+        positions = dictionary.get_indexer(uniques)
+        new = positions < 0
+        if new.any():
+            positions[new] = np.arange(len(dictionary), len(dictionary) + new.sum())
+            self.dictionaries[column] = dictionary.append(pd.Index(uniques[new], dtype=object))
+        return positions.astype(np.int32)[labels[codes]]
+
+    def encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Coded frame of one activity page, row for row (needs user_wallet, project and
+        'day' or 'activity_date'; transactions default to 1)
+        """
+        date_column = 'day' if 'day' in df.columns else 'activity_date'
+        days = self.day_numbers(df[date_column])
+
+        transaction_column = next((c for c in self.transaction_columns if c in df.columns), None)
+        if transaction_column is None:
+            transactions = pd.Series(1, index=df.index, dtype=np.uint8)
+        else:
+            transactions = pd.to_numeric(df[transaction_column], errors='coerce').fillna(1)
+            transactions = pd.to_numeric(transactions, downcast='unsigned' if (transactions >= 0).all() else 'integer')
+
+        return pd.DataFrame({
+            'activity_date': days,
+            'user_wallet': self._codes('user_wallet', df['user_wallet']),
+            'project': self._codes('project', df['project']),
+            'daily_transactions': transactions.to_numpy()
+        })
+
+    def new_rows(self, encoded: pd.DataFrame) -> np.ndarray:
+        """
+        Mask of rows whose (activity_date, user_wallet, project) was not seen before,
+        in this frame or an earlier one passed here
+        """
+        # One int64 per key: wallet code | project code | day (days are unique within ±89 years)
+        keys = pd.Index(
+            (encoded['user_wallet'].to_numpy(np.int64) << 32)
+            | (encoded['project'].to_numpy(np.int64) << 16)
+            | (encoded['activity_date'].to_numpy(np.int64) & 0xFFFF)
+        )
+        is_new = ~keys.duplicated()
+        if self._seen_keys is not None:
+            is_new &= ~keys.isin(self._seen_keys)
+        new_keys = keys[is_new]
+        self._seen_keys = new_keys if self._seen_keys is None else self._seen_keys.append(new_keys)
+        return is_new
+
+    def finish(self, encoded_frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Concatenate coded frames into the compact activity frame (rows with unparseable dates dropped)"""
+        df = pd.concat(encoded_frames, ignore_index=True)
+        df = df[df['activity_date'] != np.iinfo(np.int32).min].reset_index(drop=True)
+        for column in self.key_columns:
+            dictionary = self.dictionaries[column]
+            order = dictionary.argsort()
+            remap = np.empty(len(order), dtype=np.int32)
+            remap[order] = np.arange(len(order), dtype=np.int32)
+            df[column] = pd.Categorical.from_codes(remap[df[column].to_numpy()], categories=dictionary[order])
+        return df[['activity_date', 'user_wallet', 'project', 'daily_transactions']]
+
+    def compact(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Compact frame of one normalised activity frame (no dedup)"""
+        return self.finish([self.encode(df)])
+
 class FeatureService:
     def __init__(self):
         self.feature_columns = [
@@ -412,6 +1315,10 @@ class FeatureService:
             'week1_transactions',
             'week_last_transactions'
         ]
+        
+        # Training rows (+ activity signatures) of the live models, for incremental refreshes
+        self.training_cache: Optional[pd.DataFrame] = None
+        self.signature_columns = ['activity_rows', 'last_activity', 'activity_transactions']
     
     def create_user_features(self, user_data: pd.DataFrame, lookback_days: int = 45) -> Optional[Dict]:
         if len(user_data) == 0:
@@ -495,21 +1402,157 @@ class FeatureService:
             logger.error(f"Error creating features: {e}")
             return None
     
-    def create_training_dataset(self, daily_activity_df: pd.DataFrame) -> pd.DataFrame:
-        training_data = []
-        
-        # Get all user-game combinations
-        for (user, project), group in daily_activity_df.groupby(['user_wallet', 'project']):
-            # Only include users with enough history (at least 10 days of data)
-            if len(group) >= 5:
-                features = self.create_user_features(group, lookback_days=45)
-                if features:
-                    features['user_wallet'] = user
-                    features['project'] = project
-                    training_data.append(features)
-        
-        df = pd.DataFrame(training_data)
-        
+    def _prepare_activity(self, daily_activity_df: pd.DataFrame, group_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Reduce activity to the columns the feature kernel needs, tag every row
+        with an integer group id (sorted by group_columns) and sort by
+        group id and date so every group is one contiguous block
+        """
+        group_columns = group_columns or ['user_wallet', 'project']
+        frame = daily_activity_df[group_columns + ['activity_date']].copy()
+        if 'daily_transactions' in daily_activity_df.columns:
+            frame['daily_transactions'] = daily_activity_df['daily_transactions']
+        else:
+            frame['daily_transactions'] = 0
+
+        frame['group_id'] = frame.groupby(group_columns, sort=True, observed=True).ngroup()
+        frame = frame[frame['group_id'] >= 0]
+        frame = frame.sort_values(['group_id', 'activity_date'], kind='mergesort')
+
+        # Same minimum history rule as the per-user path (at least 5 rows)
+        group_size = frame.groupby('group_id')['group_id'].transform('size')
+        return frame[group_size >= 5]
+
+    def _feature_kernel(self, frame: pd.DataFrame, as_of: pd.Series) -> pd.DataFrame:
+        """
+        Compute feature_columns for every group at once. Shared by training
+        (as_of = per-group cutoff) and inference (as_of = snapshot date), so
+        both see identical feature definitions
+        - frame: output of _prepare_activity
+        - as_of: per-row reference date; only rows on or before it are used
+        Dates are datetimes or int32 day numbers (ActivityEncoder); both run on an
+        integer time axis, so whole-day arithmetic matches Timedelta .days
+        Returns one row per group id, plus 'n_rows' (rows inside the window)
+        """
+        times, day = self._time_axis(frame['activity_date'])
+        as_of_times, _ = self._time_axis(as_of)
+        in_window = (times <= as_of_times) & frame['activity_date'].notna().to_numpy()
+        window = frame[in_window]
+
+        group_id = window['group_id']
+        dates = pd.Series(times[in_window], index=window.index)
+        as_of = pd.Series(as_of_times[in_window], index=window.index)
+        tx = self._transactions(window['daily_transactions'])
+        grouped = dates.groupby(group_id, sort=True)
+
+        first_of_day = ~window.duplicated(['group_id', 'activity_date'])
+        last_7 = dates >= (as_of - 7 * day)
+        week1 = dates <= (grouped.transform('min') + 7 * day)
+
+        # Gaps between consecutive rows of the same group (NaN at group starts)
+        same_group = group_id.eq(group_id.shift())
+        days_gap = pd.Series(np.diff(dates.to_numpy(), prepend=0) // day, index=window.index).where(same_group)
+
+        features = pd.DataFrame({
+            'n_rows': grouped.size(),
+            'active_days_last_7': (first_of_day & last_7).groupby(group_id).sum(),
+            'transactions_last_7': tx.where(last_7, 0).groupby(group_id).sum(),
+            'total_active_days': first_of_day.groupby(group_id).sum(),
+            'total_transactions': tx.groupby(group_id).sum(),
+        })
+        features['avg_transactions_per_day'] = (
+            features['total_transactions'] / features['total_active_days']
+        ).where(features['total_active_days'] > 0, 0)
+
+        features['week1_transactions'] = tx.where(week1, 0).groupby(group_id).sum()
+        features['week_last_transactions'] = features['transactions_last_7']
+        features['early_to_late_momentum'] = (
+            features['week_last_transactions'] / features['week1_transactions']
+        ).where(features['week1_transactions'] > 0, 0)
+
+        std_gap = days_gap.groupby(group_id).std()
+        features['consistency_score'] = (1 / (std_gap + 1)).where(std_gap > 0, 1)
+
+        features['days_since_last_activity'] = (as_of.groupby(group_id).first() - grouped.max()) // day
+
+        return features
+
+    @staticmethod
+    def _time_axis(dates: pd.Series) -> tuple:
+        """(int64 times, ticks per day): day numbers as they are, datetimes as UTC nanoseconds"""
+        if pd.api.types.is_integer_dtype(dates):
+            return dates.to_numpy(dtype=np.int64), 1
+        return dates.dt.as_unit('ns').astype('int64').to_numpy(), 86_400_000_000_000
+
+    @staticmethod
+    def _days(dates: pd.Series, days: int):
+        """An offset of days in the units of dates"""
+        return days if pd.api.types.is_integer_dtype(dates) else pd.Timedelta(days=days)
+
+    @staticmethod
+    def _transactions(values: pd.Series) -> pd.Series:
+        """Downcast counts widened for sums (groupby keeps uint8/uint16 and would overflow)"""
+        return values.astype(np.int64) if pd.api.types.is_integer_dtype(values) else values
+
+    def _group_keys(self, frame: pd.DataFrame, group_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """user_wallet/project (or the given group columns) for every group id, categoricals decoded"""
+        keys = frame.groupby('group_id')[group_columns or ['user_wallet', 'project']].first()
+        return keys.astype({
+            column: object for column in keys.columns if isinstance(keys[column].dtype, pd.CategoricalDtype)
+        })
+
+    def _resolve_as_of(self, dates: pd.Series, as_of: Optional[datetime] = None):
+        """Default/normalise the inference reference date to the timezone (or day numbers) of the data"""
+        if as_of is None:
+            return dates.max()
+
+        if pd.api.types.is_integer_dtype(dates):
+            return int(ActivityEncoder.day_numbers(pd.Series([as_of]))[0])
+
+        as_of = pd.Timestamp(as_of)
+        data_tz = dates.dt.tz
+        if data_tz is not None and as_of.tzinfo is None:
+            as_of = as_of.tz_localize(data_tz)
+        elif data_tz is None and as_of.tzinfo is not None:
+            as_of = as_of.tz_convert('UTC').tz_localize(None)
+        return as_of
+
+    def create_training_dataset(self, daily_activity_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Build one training row per (user_wallet, project) with grouped/window
+        operations over the whole frame (same output as create_user_features)
+        """
+        lookback_days = 45
+        frame = self._prepare_activity(daily_activity_df)
+
+        # Per-group cutoff: features use data up to cutoff, label uses the next 14 days
+        dates = frame['activity_date']
+        cutoff = (
+            frame.groupby('group_id')['activity_date'].transform('max')
+            - self._days(dates, 60 - lookback_days)
+        )
+        features = self._feature_kernel(frame, cutoff)
+
+        # Need at least some training data
+        features = features[features['n_rows'] >= 5]
+
+        in_target = (
+            (dates > cutoff) &
+            (dates <= cutoff + self._days(dates, 14))
+        )
+        active_in_target = in_target.groupby(frame['group_id']).any()
+        features['will_churn'] = (~active_in_target.reindex(features.index)).astype(int)
+
+        features = features.join(self._group_keys(frame))
+
+        output_columns = [
+            'active_days_last_7', 'transactions_last_7', 'total_active_days',
+            'total_transactions', 'avg_transactions_per_day', 'week1_transactions',
+            'week_last_transactions', 'early_to_late_momentum', 'consistency_score',
+            'days_since_last_activity', 'will_churn', 'user_wallet', 'project'
+        ]
+        df = features[output_columns].reset_index(drop=True) if not features.empty else pd.DataFrame()
+
         if not df.empty:
             # Log class distribution
             class_dist = df['will_churn'].value_counts()
@@ -527,84 +1570,523 @@ class FeatureService:
                 logger.warning("Consider adjusting the lookback_days or prediction window.")
         
         return df
+
+    def update_training_dataset(self, daily_activity_df: pd.DataFrame, feature_cache: Optional[pd.DataFrame] = None) -> tuple:
+        """
+        Training set that only recomputes (user_wallet, project) groups whose activity
+        changed since feature_cache was built (a group's row depends on its own activity only)
+        - feature_cache: cache returned by the previous call (None = compute every group)
+        Returns (training_df, new feature cache, delta_df) - delta_df holds the recomputed rows
+        """
+        keys = ['user_wallet', 'project']
+        grouped = daily_activity_df.groupby(keys, sort=True, observed=True)
+        signatures = pd.DataFrame({
+            'activity_rows': grouped.size(),
+            'last_activity': grouped['activity_date'].max(),
+            'activity_transactions': self._transactions(grouped['daily_transactions'].sum())
+        })[self.signature_columns]
+        # Cached rows are keyed by the decoded strings
+        signatures.index = signatures.index.set_levels([level.astype(object) for level in signatures.index.levels])
+
+        if feature_cache is not None and not feature_cache.empty:
+            previous = feature_cache[signatures.columns].reindex(signatures.index)
+            unchanged = (previous == signatures).all(axis=1)
+        else:
+            unchanged = pd.Series(False, index=signatures.index)
+
+        changed_rows = ~unchanged.to_numpy()[grouped.ngroup().to_numpy()]
+        delta_df = (
+            self.create_training_dataset(daily_activity_df[changed_rows])
+            if changed_rows.any() else pd.DataFrame()
+        )
+
+        kept = (
+            feature_cache[feature_cache.index.isin(signatures.index[unchanged])]
+            if feature_cache is not None and not feature_cache.empty else None
+        )
+        fresh = delta_df.set_index(keys).join(signatures) if not delta_df.empty else None
+        parts = [part for part in (kept, fresh) if part is not None and not part.empty]
+        cache = pd.concat(parts).sort_index() if parts else pd.DataFrame()
+
+        training_df = self.training_frame(cache)
+        logger.info(
+            f"✓ Training dataset: {len(training_df)} samples, {len(delta_df)} recomputed "
+            f"({int(unchanged.sum())} unchanged groups reused)"
+        )
+        return training_df, cache, delta_df
+
+    def training_frame(self, feature_cache: pd.DataFrame) -> pd.DataFrame:
+        """Training rows of a feature cache (same layout as create_training_dataset)"""
+        if feature_cache is None or feature_cache.empty:
+            return pd.DataFrame()
+        keys = list(feature_cache.index.names)
+        training_df = feature_cache.drop(columns=self.signature_columns).reset_index()
+        return training_df[[c for c in training_df.columns if c not in keys] + keys]
+
+    def changed_training_rows(self, feature_cache: pd.DataFrame, reference: Optional[pd.DataFrame]) -> pd.DataFrame:
+        """Training rows of feature_cache whose activity signature differs from reference (all without one)"""
+        if reference is None or reference.empty or feature_cache.empty:
+            return self.training_frame(feature_cache)
+        previous = reference[self.signature_columns].reindex(feature_cache.index)
+        unchanged = (previous == feature_cache[self.signature_columns]).all(axis=1)
+        return self.training_frame(feature_cache[~unchanged])
+
+    def create_prediction_features(self, daily_activity_df: pd.DataFrame, as_of: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Build one prediction row per (user_wallet, project) in a single batched
+        pass through the same kernel used for training
+        - as_of: reference date for the 7-day windows and days_since_last_activity
+          (defaults to the latest activity date in the data)
+        """
+        frame = self._prepare_activity(daily_activity_df)
+        if frame.empty:
+            logger.info("Created prediction dataset with 0 samples")
+            return pd.DataFrame()
+
+        as_of = self._resolve_as_of(frame['activity_date'], as_of)
+        features = self._feature_kernel(frame, pd.Series(as_of, index=frame.index))
+        features = features.join(self._group_keys(frame))
+
+        df = features[self.feature_columns + ['user_wallet', 'project']].reset_index(drop=True)
+        as_of_date = ActivityEncoder.to_timestamp(as_of) if isinstance(as_of, (int, np.integer)) else as_of
+        logger.info(f"Created prediction dataset with {len(df)} samples (as of {as_of_date.date()})")
+        return df
+    
+    def create_prediction_features_batch(self, daily_activity_df: pd.DataFrame, batch_column: str, as_of: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        Prediction features for several independent activity sets in one kernel
+        pass (used to micro-batch online scoring requests)
+        - batch_column: tags the set each row belongs to; kept in the output
+        - as_of: reference date per batch key (defaults to each set's latest date)
+        Dates must share one timezone across sets
+        """
+        group_columns = ['user_wallet', 'project', batch_column]
+        frame = self._prepare_activity(daily_activity_df, group_columns)
+        if frame.empty:
+            return pd.DataFrame(columns=self.feature_columns + group_columns)
+
+        row_as_of = frame.groupby(batch_column)['activity_date'].transform('max')
+        if as_of is not None and not as_of.empty:
+            row_as_of = frame[batch_column].map(as_of).fillna(row_as_of)
+        features = self._feature_kernel(frame, row_as_of)
+        features = features.join(self._group_keys(frame, group_columns))
+
+        return features[self.feature_columns + group_columns].reset_index(drop=True)
+
+class FeatureStore:
+    """
+    Engineered feature frames persisted as columnar artefacts (a directory with one
+    joblib file per column and a manifest), so readers load only the columns they need.
+    Keyed by activity_key(): a content hash of the merged user activity plus the
+    version of the feature code, so an artefact is never reused across either
+    """
+    
+    activity_columns = ['user_wallet', 'project', 'activity_date', 'daily_transactions']
+    # Everything the features are computed with: FeatureService and the date/category
+    # encoding it reads (ActivityEncoder.day_numbers / to_timestamp)
+    feature_code = (ActivityEncoder, FeatureService)
+    
+    def __init__(self):
+        self.store_dir = config.feature_store_dir
+        self.feature_version = self._feature_code_version()
+    
+    @classmethod
+    def _feature_code_version(cls) -> str:
+        digest = hashlib.sha256()
+        for feature_class in cls.feature_code:
+            try:
+                digest.update(inspect.getsource(feature_class).encode())
+            except (OSError, TypeError):
+                for member in vars(feature_class).values():
+                    member = getattr(member, '__func__', member)  # static/class methods
+                    if hasattr(member, '__code__'):
+                        digest.update(marshal.dumps(member.__code__))
+        return digest.hexdigest()[:12]
+    
+    def activity_key(self, daily_activity_df: pd.DataFrame) -> str:
+        """Content hash of the activity rows the features are built from (independent of row order)"""
+        row_hashes = pd.util.hash_pandas_object(daily_activity_df[self.activity_columns], index=False).to_numpy()
+        digest = hashlib.sha256(np.sort(row_hashes).tobytes())
+        digest.update(self.feature_version.encode())
+        return digest.hexdigest()[:24]
     
-    def create_prediction_features(self, daily_activity_df: pd.DataFrame) -> pd.DataFrame:
-        prediction_data = []
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.store_dir, f"{kind}_{key}")
+    
+    def save(self, kind: str, key: str, df: pd.DataFrame):
+        """Write df (index included) as the kind artefact for key; replaces an existing one"""
+        path = self._path(kind, key)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            index_columns = [name for name in df.index.names if name is not None]
+            frame = df.reset_index() if index_columns else df.reset_index(drop=True)
+            
+            os.makedirs(tmp_path)
+            for i, column in enumerate(frame.columns):
+                joblib.dump(frame[column], os.path.join(tmp_path, f"{i}.joblib"))
+            with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+                json.dump({
+                    'kind': kind,
+                    'key': key,
+                    'feature_version': self.feature_version,
+                    'columns': list(frame.columns),
+                    'index': index_columns,
+                    'rows': len(frame),
+                    'created': datetime.now().isoformat()
+                }, f, indent=2)
+            
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+            logger.info(f"✓ Stored {kind} features {key} ({len(frame)} rows)")
+            self._prune(kind)
+        except Exception as e:
+            logger.error(f"Error storing {kind} features: {e}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    
+    def load(self, kind: str, key: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        The kind artefact for key, or None if there is none
+        - columns: read only these (plus the index); default all
+        """
+        path = self._path(kind, key)
+        try:
+            with open(os.path.join(path, 'manifest.json'), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
         
-        for (user, project), group in daily_activity_df.groupby(['user_wallet', 'project']):
-            if len(group) >= 5:
-                user_data = group.sort_values('activity_date')
-                latest_date = user_data['activity_date'].max()
-                
-                features = {}
-                
-                last_7 = user_data[user_data['activity_date'] >= (latest_date - pd.Timedelta(days=7))]
-                features['active_days_last_7'] = last_7['activity_date'].nunique()
-                features['transactions_last_7'] = last_7.get('daily_transactions', pd.Series([0])).sum()
-                
-                features['total_active_days'] = user_data['activity_date'].nunique()
-                features['total_transactions'] = user_data.get('daily_transactions', pd.Series([0])).sum()
-                features['avg_transactions_per_day'] = (
-                    features['total_transactions'] / features['total_active_days']
-                    if features['total_active_days'] > 0 else 0
-                )
-                
-                # FIX: Handle timezone-aware/naive datetime comparison
-                latest_activity = user_data['activity_date'].max()
-                if latest_activity.tzinfo is None:
-                    current_time = datetime.now()
-                else:
-                    from datetime import timezone
-                    current_time = datetime.now(timezone.utc).replace(tzinfo=None)
-                    latest_activity = latest_activity.replace(tzinfo=None)
-                
-                features['days_since_last_activity'] = (
-                    current_time - latest_activity
-                ).days
-                
-                first_week = user_data.head(7)
-                last_week = user_data.tail(7)
-                features['week1_transactions'] = first_week.get('daily_transactions', pd.Series([0])).sum()
-                features['week_last_transactions'] = last_week.get('daily_transactions', pd.Series([0])).sum()
-                
-                if features['week1_transactions'] > 0:
-                    features['early_to_late_momentum'] = (
-                        features['week_last_transactions'] / features['week1_transactions']
-                    )
-                else:
-                    features['early_to_late_momentum'] = 0
-                
-                user_data_sorted = user_data.sort_values('activity_date')
-                user_data_sorted['days_gap'] = user_data_sorted['activity_date'].diff().dt.days
-                std_gap = user_data_sorted['days_gap'].std()
-                features['consistency_score'] = 1 / (std_gap + 1) if std_gap > 0 else 1
-                
-                features['user_wallet'] = user
-                features['project'] = project
-                prediction_data.append(features)
+        try:
+            wanted = set(manifest['columns'] if columns is None else list(columns) + manifest['index'])
+            frame = pd.DataFrame({
+                column: joblib.load(os.path.join(path, f"{i}.joblib"))
+                for i, column in enumerate(manifest['columns']) if column in wanted
+            })
+            if manifest['index']:
+                frame = frame.set_index(manifest['index'])
+            os.utime(path)  # most recently used survives pruning
+            return frame
+        except Exception as e:
+            logger.warning(f"Feature store read error for {kind} {key}: {e}")
+            return None
+    
+    def _prune(self, kind: str):
+        artefacts = [
+            os.path.join(self.store_dir, name) for name in os.listdir(self.store_dir)
+            if name.startswith(f"{kind}_") and '.tmp-' not in name
+        ]
+        artefacts.sort(key=os.path.getmtime, reverse=True)
+        for path in artefacts[max(1, config.feature_store_keep):]:
+            shutil.rmtree(path, ignore_errors=True)
+
+# ==================== SNAPSHOTS ====================
+
+class Snapshot:
+    """
+    One generation of refresh output: the scaler, the candidate models (best first)
+    and the predictions scored with them. Never modified once published, so a
+    reader holding one sees a consistent set however many refreshes publish meanwhile
+    - split: every (user_wallet, project) the models were fitted or scored on, with
+      'holdout' True for the pairs they were scored on and never fitted on
+    """
+    
+    def __init__(self, scaler: Optional[StandardScaler] = None, models: Optional[List[Dict]] = None,
+                 predictions: Optional[Dict[str, pd.DataFrame]] = None, metadata: Optional[Dict] = None,
+                 split: Optional[pd.DataFrame] = None):
+        self.generation: Optional[str] = None
+        self.scaler = scaler
+        self.all_models = models or []
+        self.champion = self.all_models[0] if self.all_models else None
+        self.top_3_ensemble = self.all_models[:3]
+        self.predictions = predictions or {}
+        self.metadata = metadata or {}
+        self.split = split
+        self._prediction_indexes: Dict[str, 'PredictionIndex'] = {}
+    
+    def prediction_index(self, method: str) -> 'PredictionIndex':
+        """Ranking index of the method's predictions, built on first use"""
+        index = self._prediction_indexes.get(method)
+        if index is None:
+            index = self._prediction_indexes[method] = PredictionIndex(self.predictions[method])
+        return index
+
+class SnapshotStore:
+    """
+    Refresh output published as numbered generations, swapped in by one atomic pointer write
+        CURRENT                      name of the published generation
+        gen-000042/manifest.json     model metrics/metadata and prediction files
+        gen-000042/models/           scaler.joblib, <model>.joblib
+        gen-000042/predictions_*     frames in the cache backend format (Arrow: memory-mapped)
+        gen-000042/split.*           holdout split of the models (same format)
+    A generation is written completely under a staging name and renamed into place
+    before CURRENT is replaced, so a crash at any point leaves the previous one
+    published. Requests pin() the generation they read; generations beyond
+    config.snapshot_keep are removed once nothing pins them. Nothing is read or
+    written until start() runs at app startup
+    """
+    
+    legacy_models_dir = "ml_models"
+    
+    def __init__(self):
+        self.root = config.snapshot_dir
+        self.pointer_file = os.path.join(self.root, "CURRENT")
         
-        df = pd.DataFrame(prediction_data)
-        logger.info(f"Created prediction dataset with {len(df)} samples")
-        return df
+        self.backend = make_cache_backend(config.cache_format)
+        self.fallback_backend = JoblibCacheBackend()
+        self.readers = {JoblibCacheBackend.extension: JoblibCacheBackend()}
+        if PYARROW_AVAILABLE:
+            self.readers[ArrowCacheBackend.extension] = ArrowCacheBackend()
+        
+        self._lock = threading.Lock()
+        self._pins: Dict[str, int] = {}
+        self.current = Snapshot()
+    
+    def start(self) -> Snapshot:
+        """
+        Load the published generation (migrating ml_models/ if there is none yet) and
+        make it current. Run once from the app lifespan - worker processes that import
+        this module never call it, so they cannot touch a publish in progress
+        """
+        os.makedirs(self.root, exist_ok=True)
+        
+        # Leftovers of a publish that was interrupted
+        for name in os.listdir(self.root):
+            if name.startswith('.staging-'):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            elif name.startswith('CURRENT.tmp-'):
+                os.remove(os.path.join(self.root, name))
+        
+        self.current = self._load_published() or self._migrate_legacy() or Snapshot()
+        return self.current
+    
+    def _generations(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if name.startswith('gen-'))
+    
+    def _load_published(self) -> Optional[Snapshot]:
+        """The generation CURRENT names, or the newest older one that loads"""
+        try:
+            with open(self.pointer_file, 'r') as f:
+                published = f.read().strip()
+        except OSError:
+            return None
+        
+        for generation in [published] + [g for g in reversed(self._generations()) if g < published]:
+            try:
+                snapshot = self.load(generation)
+            except Exception as e:
+                logger.error(f"✗ Cannot load snapshot {generation}: {e}")
+                continue
+            champion = snapshot.champion['name'] if snapshot.champion else None
+            logger.info(f"✓ Loaded snapshot {generation}. Champion: {champion}")
+            return snapshot
+        return None
+    
+    def load(self, generation: str) -> Snapshot:
+        path = os.path.join(self.root, generation)
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        
+        models_path = os.path.join(path, 'models')
+        scaler_path = os.path.join(models_path, 'scaler.joblib')
+        models = [
+            {**info, 'model': joblib.load(os.path.join(models_path, f"{info['name']}.joblib"))}
+            for info in manifest['models']
+        ]
+        predictions = {
+            method: self.readers[os.path.splitext(name)[1]].read(os.path.join(path, name))
+            for method, name in manifest['predictions'].items()
+        }
+        
+        split_file = manifest.get('split')
+        snapshot = Snapshot(
+            joblib.load(scaler_path) if os.path.exists(scaler_path) else None,
+            models, predictions, manifest['metadata'],
+            self.readers[os.path.splitext(split_file)[1]].read(os.path.join(path, split_file)) if split_file else None
+        )
+        snapshot.generation = generation
+        return snapshot
+    
+    def _migrate_legacy(self) -> Optional[Snapshot]:
+        """
+        Publish the layout before snapshots - ml_models/ (champion only) and the cached
+        predictions in raw_data_cache - as the first generation
+        """
+        try:
+            with open(os.path.join(self.legacy_models_dir, 'metadata.json'), 'r') as f:
+                metadata = json.load(f)
+            scaler = joblib.load(os.path.join(self.legacy_models_dir, 'scaler.joblib'))
+            champion_name = metadata['champion']
+            champion = {
+                'name': champion_name,
+                'model': joblib.load(os.path.join(self.legacy_models_dir, f"{champion_name}.joblib")),
+                'roc_auc': metadata.get('champion_roc_auc', 0)
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        
+        predictions = {}
+        for method in ['champion', 'ensemble']:
+            df = cache_manager.get_cached_data(f'predictions_{method}', max_stale=float('inf'))
+            if df is not None and not df.empty:
+                predictions[method] = df
+        
+        try:
+            snapshot = self.publish(Snapshot(scaler, [champion], predictions, metadata))
+        except Exception as e:
+            logger.error(f"✗ Could not migrate {self.legacy_models_dir}/ to a snapshot: {e}")
+            return None
+        logger.info(f"✓ Migrated {self.legacy_models_dir}/ to snapshot {snapshot.generation}. Champion: {champion_name}")
+        return snapshot
+    
+    def publish(self, snapshot: Snapshot) -> Snapshot:
+        """
+        Write snapshot as the next generation and make it the current one: on disk
+        (CURRENT) and for every request that starts from now on. Raises on failure,
+        leaving the previous generation published
+        """
+        staging = os.path.join(self.root, f".staging-{uuid.uuid4().hex[:8]}")
+        pointer_tmp = f"{self.pointer_file}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            models_path = os.path.join(staging, 'models')
+            os.makedirs(models_path)
+            if snapshot.scaler is not None:
+                joblib.dump(snapshot.scaler, os.path.join(models_path, 'scaler.joblib'))
+            for info in snapshot.all_models:
+                joblib.dump(info['model'], os.path.join(models_path, f"{info['name']}.joblib"))
+            
+            files = {}
+            for method, df in snapshot.predictions.items():
+                files[method] = self._write_frame(staging, f'predictions_{method}', df)
+            split_file = self._write_frame(staging, 'split', snapshot.split) if snapshot.split is not None else None
+            
+            with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+                json.dump({
+                    'created': datetime.now().isoformat(),
+                    'models': [{k: v for k, v in info.items() if k != 'model'} for info in snapshot.all_models],
+                    'predictions': files,
+                    'split': split_file,
+                    'metadata': snapshot.metadata
+                }, f, indent=2, default=lambda value: value.item() if isinstance(value, np.generic) else str(value))
+            
+            with self._lock:
+                generations = self._generations()
+                number = int(generations[-1][len('gen-'):]) + 1 if generations else 1
+                generation = f"gen-{number:06d}"
+                os.rename(staging, os.path.join(self.root, generation))
+                with open(pointer_tmp, 'w') as f:
+                    f.write(generation)
+                os.replace(pointer_tmp, self.pointer_file)
+                snapshot.generation = generation
+                self.current = snapshot
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            if os.path.exists(pointer_tmp):
+                os.remove(pointer_tmp)
+        
+        logger.info(f"✓ Published snapshot {generation} ({len(snapshot.all_models)} models, predictions: {', '.join(files) or 'none'})")
+        self._prune()
+        return snapshot
+    
+    def _write_frame(self, directory: str, name: str, df: pd.DataFrame) -> str:
+        """Write with the active backend, falling back to joblib for frames it cannot encode"""
+        try:
+            self.backend.write(os.path.join(directory, f"{name}{self.backend.extension}"), df)
+            return f"{name}{self.backend.extension}"
+        except (TypeError, ValueError, NotImplementedError) as e:
+            if self.backend.extension == self.fallback_backend.extension:
+                raise
+            logger.warning(f"⚠️ {name} not {self.backend.name}-encodable ({e}), stored as joblib")
+        self.fallback_backend.write(os.path.join(directory, f"{name}{self.fallback_backend.extension}"), df)
+        return f"{name}{self.fallback_backend.extension}"
+    
+    @contextmanager
+    def pin(self):
+        """The current snapshot, kept on disk until the block exits even if newer ones are published"""
+        snapshot = self.current
+        generation = snapshot.generation
+        with self._lock:
+            self._pins[generation] = self._pins.get(generation, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                self._pins[generation] -= 1
+                released = self._pins[generation] == 0
+                if released:
+                    del self._pins[generation]
+            if released and generation is not None and generation != self.current.generation:
+                self._prune()
+    
+    def _prune(self):
+        """Remove generations past config.snapshot_keep that are neither current nor pinned"""
+        with self._lock:
+            generations = self._generations()
+            keep = set(generations[-max(1, config.snapshot_keep):]) | set(self._pins) | {self.current.generation}
+            expired = [g for g in generations if g not in keep]
+        for generation in expired:
+            shutil.rmtree(os.path.join(self.root, generation), ignore_errors=True)
+    
+    def clear(self):
+        """Drop every generation and the legacy models (requests already holding one keep it in memory)"""
+        shutil.rmtree(self.legacy_models_dir, ignore_errors=True)
+        with self._lock:
+            for name in (os.listdir(self.root) if os.path.isdir(self.root) else []):
+                path = os.path.join(self.root, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            self.current = Snapshot()
 
 # ==================== ML MODEL MANAGER ====================
 
+def population_stability(reference: pd.Series, current: pd.Series, bins: int = 10) -> float:
+    """Population stability index of current against reference (decile bins of reference)"""
+    reference = reference.dropna().to_numpy(dtype=float)
+    current = current.dropna().to_numpy(dtype=float)
+    if len(reference) == 0 or len(current) == 0:
+        return 0.0
+    
+    edges = np.unique(np.quantile(reference, np.linspace(0, 1, bins + 1)))
+    if len(edges) < 2:
+        return 0.0 if np.all(current == edges[0]) else float('inf')
+    
+    ref_share = np.histogram(np.clip(reference, edges[0], edges[-1]), edges)[0] / len(reference)
+    cur_share = np.histogram(np.clip(current, edges[0], edges[-1]), edges)[0] / len(current)
+    ref_share = np.clip(ref_share, 1e-4, None)
+    cur_share = np.clip(cur_share, 1e-4, None)
+    return float(np.sum((cur_share - ref_share) * np.log(cur_share / ref_share)))
+
 class MLModelManager:
     def __init__(self):
-        self.models_dir = "ml_models"
-        os.makedirs(self.models_dir, exist_ok=True)
-        
         self.feature_columns = [
             'active_days_last_7', 'transactions_last_7', 'total_active_days',
             'total_transactions', 'avg_transactions_per_day', 'days_since_last_activity',
             'early_to_late_momentum', 'consistency_score', 'week1_transactions', 'week_last_transactions'
         ]
         
-        self.champion = None
-        self.top_3_ensemble = []
-        self.all_models = []
-        self.scaler = None
+        # Served models (scaler, champion, ensemble) live in snapshot_store.current;
+        # the history is restored from it at startup (load_history)
         self.model_history = []
+        self.incremental_updates = 0
+        
+        # Candidates that can use several cores (n_jobs); the rest fit on one
+        self.threaded_models = {'random_forest', 'xgboost', 'lightgbm'}
+        
+        # Candidates trained with early stopping when a validation split is available
+        self.early_stopping_models = {'xgboost', 'lightgbm'}
+        
+        # Incremental training: boosters get more trees fitted on the changed rows; forests are
+        # refitted on every non-holdout row (new trees fitted on the changed rows alone would learn
+        # another class balance than the class_weight='balanced' trees they are averaged with);
+        # the rest are carried over
+        self.warm_start_models = {'xgboost', 'lightgbm'}
+        self.refit_models = {'random_forest'}
+        
+        # Share of (user_wallet, project) pairs held out for scoring, on the full fit and
+        # among pairs first seen by an incremental update
+        self.holdout_fraction = 0.25
         
         self.model_configs = {
             'logistic_regression': {
@@ -627,15 +2109,12 @@ class MLModelManager:
                 'priority': 2
             },
             'gradient_boosting': {
-                'model': GradientBoostingClassifier(
-                    n_estimators=100, 
-                    max_depth=6, 
-                    learning_rate=0.1, 
-                    random_state=42
-                ),
+                'model': self.build_gradient_boosting(config.gradient_boosting_engine),
                 'priority': 2
             }
         }
+        if config.gradient_boosting_engine == 'hist':
+            self.threaded_models.add('gradient_boosting')  # OpenMP, capped by threadpoolctl
         
         if XGBOOST_AVAILABLE:
             self.model_configs['xgboost'] = {
@@ -663,20 +2142,294 @@ class MLModelManager:
                 'priority': 1
             }
         
-        self._load_models()
+        self._apply_tuned_params()
+    
+    # The live state is read from one published snapshot, so it always changes as a whole
+    @property
+    def scaler(self) -> Optional[StandardScaler]:
+        return snapshot_store.current.scaler
+    
+    @property
+    def champion(self) -> Optional[Dict]:
+        return snapshot_store.current.champion
+    
+    @property
+    def top_3_ensemble(self) -> List[Dict]:
+        return snapshot_store.current.top_3_ensemble
+    
+    @property
+    def all_models(self) -> List[Dict]:
+        return snapshot_store.current.all_models
+    
+    def load_history(self, metadata: Dict):
+        """Training history of a published snapshot (called once it is loaded at startup)"""
+        self.model_history = list(metadata.get('model_history', []))
+        self.incremental_updates = metadata.get('incremental_updates', 0)
+    
+    def _apply_tuned_params(self):
+        """
+        Override the default hyperparameters with the winners recorded by tune_models.py
+        (skips models whose estimator class changed since tuning, e.g. another engine)
+        """
+        if not os.path.exists(config.tuned_params_path):
+            return
+        try:
+            with open(config.tuned_params_path, 'r') as f:
+                tuned = json.load(f)
+            
+            applied = []
+            for name, entry in tuned.get('models', {}).items():
+                model_config = self.model_configs.get(name)
+                if model_config is None:
+                    continue
+                estimator = type(model_config['model']).__name__
+                if entry.get('estimator') != estimator:
+                    logger.warning(f"⚠️ Tuned params for {name} are for {entry.get('estimator')}, not {estimator}. Skipping...")
+                    continue
+                try:
+                    model_config['model'].set_params(**entry['params'])
+                except ValueError as e:
+                    logger.warning(f"⚠️ Invalid tuned params for {name} ({e}). Skipping...")
+                    continue
+                applied.append(name)
+            
+            logger.info(f"✓ Applied tuned params from {config.tuned_params_path}: {', '.join(applied) or 'none'}")
+        except Exception as e:
+            logger.error(f"Error applying tuned params: {e}")
+    
+    @staticmethod
+    def build_gradient_boosting(engine: str):
+        """
+        Gradient boosting candidate for the given engine
+        - hist: binned features, native early stopping on a 10% validation split, balanced class weights
+        - exact: the original exact-split GradientBoostingClassifier
+        """
+        if engine == 'exact':
+            return GradientBoostingClassifier(
+                n_estimators=100, 
+                max_depth=6, 
+                learning_rate=0.1, 
+                random_state=42
+            )
+        if engine != 'hist':
+            raise ValueError(f"Unknown gradient boosting engine '{engine}' (expected 'hist' or 'exact')")
+        return HistGradientBoostingClassifier(
+            max_iter=config.gradient_boosting_max_iter,
+            max_depth=6,
+            learning_rate=0.1,
+            early_stopping=True,
+            validation_fraction=0.1,
+            n_iter_no_change=10,
+            class_weight='balanced',  # Penalize minority class errors more
+            random_state=42
+        )
     
     def train_and_evaluate_all(self, training_df: pd.DataFrame) -> List[Dict]:
+        results, scaler, split = self.fit_candidates(training_df)
+        if results:
+            snapshot = snapshot_store.publish(self.snapshot_results(results, scaler, split=split))
+            self.record_published(snapshot)
+        return results
+    
+    def fit_candidates(self, training_df: pd.DataFrame) -> tuple:
+        """
+        Fit and score every candidate model without touching the live state
+        Returns (results sorted best first, fitted scaler, holdout split) - safe to run in
+        a worker process
+        """
         logger.info("=" * 60)
         logger.info("TRAINING MULTIPLE ML MODELS")
         logger.info("=" * 60)
         
+        (X_train_scaled, y_train_balanced, X_test_scaled, y_test, scaler,
+         X_val_scaled, y_val) = self.prepare_training_data(training_df)
+        
+        jobs = {}
+        budget = self.core_budget()
+        for name, model_config in self.model_configs.items():
+            model = model_config['model']
+            
+            if name in self.early_stopping_models:
+                model.set_params(n_estimators=config.boosting_max_rounds if X_val_scaled is not None else 100)
+            
+            # For XGBoost, set scale_pos_weight dynamically based on actual class distribution
+            if name == 'xgboost' and XGBOOST_AVAILABLE:
+                neg_count = len(y_train_balanced) - sum(y_train_balanced)
+                pos_count = sum(y_train_balanced)
+                if pos_count > 0:
+                    scale_weight = neg_count / pos_count
+                    model.set_params(scale_pos_weight=scale_weight)
+                    logger.info(f"   XGBoost scale_pos_weight: {scale_weight:.2f}")
+            
+            jobs[name] = (model, budget[name])
+        
+        start_time = time.time()
+        results = self._fit_all(jobs, (X_train_scaled, y_train_balanced, X_test_scaled, y_test, X_val_scaled, y_val))
+        logger.info(
+            f"✓ Trained {len(results)}/{len(jobs)} models in {time.time() - start_time:.1f}s "
+            f"(sum of fits {sum(r['training_time'] for r in results):.1f}s)"
+        )
+        
+        results.sort(key=lambda x: (x['roc_auc'], x['accuracy']), reverse=True)
+        return results, scaler, self.holdout_split(training_df)
+    
+    def update_candidates(self, delta_df: pd.DataFrame, training_df: pd.DataFrame, previous_results: List[Dict],
+                          scaler: StandardScaler, split: Optional[pd.DataFrame]) -> tuple:
+        """
+        Incremental training on the recomputed rows: the boosters get incremental_rounds
+        more trees fitted on delta_df, the forests are refitted on every non-holdout row
+        of training_df, the other models are carried over. Every model is then scored on
+        the holdout of split (the pairs the current models were scored on and never
+        fitted on), plus a holdout_fraction draw of the pairs first seen now - a pair
+        any model was ever fitted on never lands in the holdout. The previous scaler
+        is kept so the existing trees see the inputs they were fitted on
+        - split: Snapshot.split of the current models
+        Returns (results sorted best first, scaler, updated split); raises ValueError
+        without a split, or when the holdout or the changed rows left for fitting
+        have a single class
+        """
+        logger.info("=" * 60)
+        logger.info(f"INCREMENTAL TRAINING ON {len(delta_df)} CHANGED SAMPLES")
+        logger.info("=" * 60)
+        
+        if split is None or split.empty:
+            raise ValueError("no holdout split recorded with the current models")
+        keys = ['user_wallet', 'project']
+        known = pd.MultiIndex.from_frame(split[keys])
+        new_pairs = delta_df.loc[~pd.MultiIndex.from_frame(delta_df[keys]).isin(known), keys]
+        rng = np.random.default_rng(42)
+        split = pd.concat(
+            [split, new_pairs.assign(holdout=rng.random(len(new_pairs)) < self.holdout_fraction)],
+            ignore_index=True
+        )
+        holdout_pairs = pd.MultiIndex.from_frame(split.loc[split['holdout'], keys])
+        
+        in_holdout = pd.MultiIndex.from_frame(training_df[keys]).isin(holdout_pairs)
+        holdout = training_df[in_holdout]
+        pool = training_df[~in_holdout]
+        fit_df = delta_df[~pd.MultiIndex.from_frame(delta_df[keys]).isin(holdout_pairs)]
+        for name, part in [('holdout', holdout), ('changed rows outside the holdout', fit_df)]:
+            if part['will_churn'].nunique() < 2:
+                raise ValueError(f"{len(part)} {name}, not both classes")
+        logger.info(
+            f"📊 Holdout: {len(holdout)} pairs ({int(new_pairs.shape[0])} first seen, "
+            f"{int(split['holdout'].iloc[len(split) - len(new_pairs):].sum())} of them held out)"
+        )
+        
+        X_test_scaled = scaler.transform(holdout[self.feature_columns].fillna(0))
+        y_test = holdout['will_churn']
+        
+        warm_jobs, refit_jobs = {}, {}
+        results = []
+        budget = self.core_budget()
+        for previous in previous_results:
+            name = previous['name']
+            if name in self.warm_start_models:
+                # Copy: the live model keeps serving predictions while this one grows
+                warm_jobs[name] = (copy.deepcopy(previous['model']), budget.get(name, 1))
+            elif name in self.refit_models and name in self.model_configs:
+                refit_jobs[name] = (clone(self.model_configs[name]['model']), budget.get(name, 1))
+            else:
+                results.append(self._log_fit(_rescore_candidate(previous, X_test_scaled, y_test)))
+        
+        carried = len(results)
+        start_time = time.time()
+        if warm_jobs:
+            X_delta, y_delta = self._balance(fit_df[self.feature_columns].fillna(0), fit_df['will_churn'])
+            results += self._fit_all(
+                warm_jobs, (scaler.transform(X_delta), y_delta, X_test_scaled, y_test), warm_start=True
+            )
+        if refit_jobs:
+            X_pool, y_pool = self._balance(pool[self.feature_columns].fillna(0), pool['will_churn'])
+            results += self._fit_all(refit_jobs, (scaler.transform(X_pool), y_pool, X_test_scaled, y_test))
+        logger.info(
+            f"✓ Warm-started {len(warm_jobs)}, refitted {len(refit_jobs)}, carried over {carried} "
+            f"models in {time.time() - start_time:.1f}s"
+        )
+        
+        results.sort(key=lambda x: (x['roc_auc'], x['accuracy']), reverse=True)
+        return results, scaler, split
+    
+    def full_retrain_reason(self, reference_df: Optional[pd.DataFrame], training_df: pd.DataFrame, delta_df: pd.DataFrame) -> Optional[str]:
+        """
+        Why the models must be retrained from scratch, or None when warm-starting
+        them on delta_df is enough
+        - reference_df: training set the current models were fitted on
+        """
+        if not any(m['name'] in self.warm_start_models | self.refit_models for m in self.all_models) or self.scaler is None:
+            return "no trained models in memory"
+        if snapshot_store.current.split is None:
+            return "no holdout split recorded with the current models"
+        if reference_df is None or reference_df.empty:
+            return "no cached training features"
+        if self.incremental_updates >= config.incremental_max_updates:
+            return f"{self.incremental_updates} incremental updates since the last full retrain"
+        
+        delta_fraction = len(delta_df) / max(1, len(training_df))
+        if delta_fraction > config.incremental_max_delta:
+            return f"{delta_fraction:.0%} of the training rows changed"
+        
+        psi, column = max(
+            (population_stability(reference_df[column], training_df[column]), column)
+            for column in self.feature_columns
+        )
+        if psi > config.incremental_drift_psi:
+            return f"feature drift on {column} (PSI {psi:.3f})"
+        return None
+    
+    def prepare_training_data(self, training_df: pd.DataFrame) -> tuple:
+        """
+        Split, balance (SMOTE when churners < 15%) and scale the training set
+        - with boosting_validation_fraction > 0 a stratified validation split is carved
+          from the training split before SMOTE, for early stopping
+        Returns (X_train_scaled, y_train_balanced, X_test_scaled, y_test, fitted scaler,
+        X_val_scaled, y_val) - the validation pair is None without a validation split
+        """
         X = training_df[self.feature_columns].fillna(0)
         y = training_df['will_churn']
         
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.25, random_state=42, stratify=y
-        )
+        train_positions, test_positions = self.holdout_positions(training_df)
+        X_train, X_test = X.iloc[train_positions], X.iloc[test_positions]
+        y_train, y_test = y.iloc[train_positions], y.iloc[test_positions]
+        
+        X_val, y_val = None, None
+        if config.boosting_validation_fraction > 0:
+            try:
+                X_train, X_val, y_train, y_val = train_test_split(
+                    X_train, y_train, test_size=config.boosting_validation_fraction,
+                    random_state=42, stratify=y_train
+                )
+                logger.info(f"📊 Validation split for early stopping: {len(y_val)} rows")
+            except ValueError as e:
+                logger.warning(f"⚠️ No validation split ({e}). Boosting models train a fixed 100 rounds...")
+        
+        X_train_balanced, y_train_balanced = self._balance(X_train, y_train)
         
+        # Scale features AFTER balancing
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train_balanced)
+        X_test_scaled = scaler.transform(X_test)
+        X_val_scaled = scaler.transform(X_val) if X_val is not None else None
+        
+        return X_train_scaled, y_train_balanced, X_test_scaled, y_test, scaler, X_val_scaled, y_val
+    
+    def holdout_positions(self, training_df: pd.DataFrame) -> tuple:
+        """(train, test) row positions of the stratified holdout a full fit is scored on"""
+        return train_test_split(
+            np.arange(len(training_df)), test_size=self.holdout_fraction, random_state=42,
+            stratify=training_df['will_churn']
+        )
+    
+    def holdout_split(self, training_df: pd.DataFrame) -> pd.DataFrame:
+        """The pairs of training_df with the side of the full-fit split each falls on (see Snapshot.split)"""
+        _, test_positions = self.holdout_positions(training_df)
+        split = training_df[['user_wallet', 'project']].reset_index(drop=True)
+        split['holdout'] = False
+        split.loc[test_positions, 'holdout'] = True
+        return split
+    
+    def _balance(self, X_train: pd.DataFrame, y_train: pd.Series) -> tuple:
+        """Oversample churners with SMOTE when they are under 15% of the training split"""
         # Check class distribution
         churn_rate = sum(y_train) / len(y_train)
         logger.info(f"📊 Original training set:")
@@ -710,96 +2463,140 @@ class MLModelManager:
             X_train_balanced = X_train
             y_train_balanced = y_train
         
-        # Scale features AFTER balancing
-        self.scaler = StandardScaler()
-        X_train_scaled = self.scaler.fit_transform(X_train_balanced)
-        X_test_scaled = self.scaler.transform(X_test)
+        return X_train_balanced, y_train_balanced
+    
+    def core_budget(self) -> Dict[str, int]:
+        """
+        Cores each candidate may use while they train side by side: single-threaded
+        models get one, the multi-threaded ones split the rest of training_cores
+        """
+        threaded = [name for name in self.model_configs if name in self.threaded_models]
+        single = [name for name in self.model_configs if name not in self.threaded_models]
         
+        budget = {name: 1 for name in single}
+        spare = max(len(threaded), config.training_cores - len(single))
+        for name in threaded:
+            budget[name] = max(1, spare // len(threaded))
+        return budget
+    
+    def _fit_all(self, jobs: Dict[str, tuple], data: tuple, warm_start: bool = False) -> List[Dict]:
+        """
+        Fit every (model, cores) job, concurrently in a process pool unless
+        training_workers is 1. Each fit gets a fresh process so its peak memory
+        is its own; falls back to in-process fits if the pool cannot run
+        - warm_start: extend the already fitted models instead of refitting them
+        """
+        workers = config.training_workers or min(len(jobs), config.training_cores)
         results = []
+        pending = dict(jobs)
         
-        for name, config in self.model_configs.items():
+        if workers > 1 and len(jobs) > 1:
             try:
-                logger.info(f"Training {name}...")
-                start_time = time.time()
-                
-                model = config['model']
-                
-                # For XGBoost, set scale_pos_weight dynamically based on actual class distribution
-                if name == 'xgboost' and XGBOOST_AVAILABLE:
-                    neg_count = len(y_train_balanced) - sum(y_train_balanced)
-                    pos_count = sum(y_train_balanced)
-                    if pos_count > 0:
-                        scale_weight = neg_count / pos_count
-                        model.set_params(scale_pos_weight=scale_weight)
-                        logger.info(f"   XGBoost scale_pos_weight: {scale_weight:.2f}")
-                
-                model.fit(X_train_scaled, y_train_balanced)
-                training_time = time.time() - start_time
-                
-                y_pred_proba = model.predict_proba(X_test_scaled)[:, 1]
-                y_pred = model.predict(X_test_scaled)
-                
-                metrics = {
-                    'name': name,
-                    'model': model,
-                    'roc_auc': roc_auc_score(y_test, y_pred_proba),
-                    'accuracy': accuracy_score(y_test, y_pred),
-                    'precision': precision_score(y_test, y_pred, zero_division=0),
-                    'recall': recall_score(y_test, y_pred, zero_division=0),
-                    'training_time': training_time,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                results.append(metrics)
-                logger.info(f"  ✓ {name}: ROC-AUC={metrics['roc_auc']:.4f}, Accuracy={metrics['accuracy']:.4f}")
-                
+                with ProcessPoolExecutor(
+                    max_workers=min(workers, len(jobs)),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    max_tasks_per_child=1
+                ) as pool:
+                    futures = {
+                        pool.submit(_fit_candidate, name, model, cores, *data, warm_start=warm_start): name
+                        for name, (model, cores) in jobs.items()
+                    }
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        try:
+                            results.append(self._log_fit(future.result()))
+                            pending.pop(name)
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            logger.error(f"  ✗ Failed to train {name}: {e}")
+                            pending.pop(name)
+            except (BrokenProcessPool, OSError) as e:
+                logger.warning(f"⚠️ Training pool unavailable ({e}). Fitting remaining models in-process...")
+        
+        for name, (model, cores) in pending.items():
+            try:
+                results.append(self._log_fit(_fit_candidate(name, model, cores, *data, warm_start=warm_start)))
             except Exception as e:
                 logger.error(f"  ✗ Failed to train {name}: {e}")
+        return results
+    
+    def _log_fit(self, metrics: Dict) -> Dict:
+        rounds = f", {metrics['rounds']} rounds" if metrics.get('rounds') is not None else ""
+        logger.info(
+            f"  ✓ {metrics['name']}: ROC-AUC={metrics['roc_auc']:.4f}, Accuracy={metrics['accuracy']:.4f} "
+            f"({metrics['training_time']:.1f}s, {metrics['cpu_seconds']:.1f} CPU-s on {metrics['cores']} cores, "
+            f"peak +{metrics['peak_memory_mb']:.0f} MB{rounds})"
+        )
+        return metrics
+    
+    def snapshot_results(self, results: List[Dict], scaler: StandardScaler, mode: str = 'full',
+                         split: Optional[pd.DataFrame] = None) -> Snapshot:
+        """
+        Return the models of a training run as a snapshot to publish (with the
+        predictions scored by them). Nothing changes here: the live models change on
+        publish, the history and update count once record_published is called for it
+        - mode: 'full' or 'incremental' (counts updates since the last full retrain)
+        - split: holdout split of the run (Snapshot.split)
+        """
+        incremental_updates = self.incremental_updates + 1 if mode == 'incremental' else 0
+        champion = results[0]
         
-        results.sort(key=lambda x: (x['roc_auc'], x['accuracy']), reverse=True)
+        logger.info("=" * 60)
+        logger.info(f"CHAMPION MODEL: {champion['name'].upper()}")
+        logger.info(f"ROC-AUC: {champion['roc_auc']:.4f}")
+        logger.info(f"Top 3: {', '.join([m['name'] for m in results[:3]])}")
+        logger.info("=" * 60)
         
-        if results:
-            self.champion = results[0]
-            self.top_3_ensemble = results[:min(3, len(results))]
-            self.all_models = results
-            
-            logger.info("=" * 60)
-            logger.info(f"CHAMPION MODEL: {self.champion['name'].upper()}")
-            logger.info(f"ROC-AUC: {self.champion['roc_auc']:.4f}")
-            logger.info(f"Top 3: {', '.join([m['name'] for m in self.top_3_ensemble])}")
-            logger.info("=" * 60)
-            
-            self._save_models()
-            
-            self.model_history.append({
-                'timestamp': datetime.now().isoformat(),
-                'champion': self.champion['name'],
-                'roc_auc': self.champion['roc_auc']
-            })
+        model_history = self.model_history + [{
+            'timestamp': datetime.now().isoformat(),
+            'champion': champion['name'],
+            'roc_auc': champion['roc_auc'],
+            'mode': mode
+        }]
         
-        return results
+        return Snapshot(scaler, results, metadata={
+            'champion': champion['name'],
+            'champion_roc_auc': champion['roc_auc'],
+            'top_3': [m['name'] for m in results[:3]],
+            'incremental_updates': incremental_updates,
+            'boosting_rounds': {
+                m['name']: m['rounds'] for m in results if m.get('rounds') is not None
+            },
+            'last_trained': datetime.now().isoformat(),
+            'model_history': model_history[-10:]
+        }, split=split)
     
-    def predict_champion(self, prediction_df: pd.DataFrame) -> np.ndarray:
-        if not self.champion or not self.scaler:
+    def record_published(self, snapshot: Snapshot):
+        """Add the training run of a snapshot from snapshot_results to the history, once it is published"""
+        self.model_history.append(snapshot.metadata['model_history'][-1])
+        self.incremental_updates = snapshot.metadata['incremental_updates']
+    
+    def predict_champion(self, prediction_df: pd.DataFrame, snapshot: Optional[Snapshot] = None) -> np.ndarray:
+        """Churn probabilities from the champion of snapshot (default: the published one)"""
+        snapshot = snapshot or snapshot_store.current
+        if not snapshot.champion or not snapshot.scaler:
             raise ValueError("Models not trained yet")
         
         X = prediction_df[self.feature_columns].fillna(0)
-        X_scaled = self.scaler.transform(X)
+        X_scaled = snapshot.scaler.transform(X)
         # CRITICAL FIX: Model predicts class 1 = churn, so use [:, 1] directly
-        churn_proba = self.champion['model'].predict_proba(X_scaled)[:, 1]
+        churn_proba = snapshot.champion['model'].predict_proba(X_scaled)[:, 1]
         return churn_proba
     
-    def predict_ensemble(self, prediction_df: pd.DataFrame) -> np.ndarray:
-        if not self.top_3_ensemble or not self.scaler:
+    def predict_ensemble(self, prediction_df: pd.DataFrame, snapshot: Optional[Snapshot] = None) -> np.ndarray:
+        """ROC-AUC weighted average of the top 3 models of snapshot (default: the published one)"""
+        snapshot = snapshot or snapshot_store.current
+        if not snapshot.top_3_ensemble or not snapshot.scaler:
             raise ValueError("Models not trained yet")
         
         X = prediction_df[self.feature_columns].fillna(0)
-        X_scaled = self.scaler.transform(X)
+        X_scaled = snapshot.scaler.transform(X)
         
         predictions = []
         weights = []
         
-        for model_info in self.top_3_ensemble:
+        for model_info in snapshot.top_3_ensemble:
             # CRITICAL FIX: Use [:, 1] directly for churn probability
             pred = model_info['model'].predict_proba(X_scaled)[:, 1]
             predictions.append(pred)
@@ -807,63 +2604,307 @@ class MLModelManager:
         
         ensemble_pred = np.average(predictions, axis=0, weights=weights)
         return ensemble_pred
+
+class PeakMemory:
+    """
+    Context manager measuring how far this process's resident memory rose above
+    its starting point while the block ran. Samples /proc/self/statm from a
+    thread; without /proc falls back to the growth of ru_maxrss
+    """
     
-    def _save_models(self):
-        try:
-            joblib.dump(self.scaler, os.path.join(self.models_dir, 'scaler.joblib'))
-            
-            for model_info in self.all_models:
-                model_path = os.path.join(self.models_dir, f"{model_info['name']}.joblib")
-                joblib.dump(model_info['model'], model_path)
-            
-            metadata = {
-                'champion': self.champion['name'] if self.champion else None,
-                'champion_roc_auc': self.champion['roc_auc'] if self.champion else 0,
-                'top_3': [m['name'] for m in self.top_3_ensemble],
-                'last_trained': datetime.now().isoformat(),
-                'model_history': self.model_history[-10:]
-            }
-            
-            with open(os.path.join(self.models_dir, 'metadata.json'), 'w') as f:
-                json.dump(metadata, f, indent=2)
-            
-            logger.info("Models saved successfully")
-        except Exception as e:
-            logger.error(f"Error saving models: {e}")
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
     
-    def _load_models(self):
+    @staticmethod
+    def _rss_bytes() -> Optional[int]:
         try:
-            metadata_path = os.path.join(self.models_dir, 'metadata.json')
-            if not os.path.exists(metadata_path):
-                return
-            
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            
-            scaler_path = os.path.join(self.models_dir, 'scaler.joblib')
-            if os.path.exists(scaler_path):
-                self.scaler = joblib.load(scaler_path)
-            
-            champion_name = metadata.get('champion')
-            if champion_name:
-                model_path = os.path.join(self.models_dir, f"{champion_name}.joblib")
-                if os.path.exists(model_path):
-                    model = joblib.load(model_path)
-                    self.champion = {
-                        'name': champion_name,
-                        'model': model,
-                        'roc_auc': metadata.get('champion_roc_auc', 0)
-                    }
-            
-            logger.info(f"Loaded existing models. Champion: {champion_name}")
-        except Exception as e:
-            logger.error(f"Error loading models: {e}")
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            return None
+    
+    @staticmethod
+    def _maxrss_bytes() -> int:
+        # ru_maxrss is in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if RESOURCE_AVAILABLE else 0
+    
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self._rss_bytes() or 0)
+    
+    def __enter__(self):
+        self._start = self._rss_bytes()
+        if self._start is None:
+            self._start = self._maxrss_bytes()
+        else:
+            self._peak = self._start
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            peak = max(self._peak, self._rss_bytes() or 0)
+        else:
+            peak = self._maxrss_bytes()
+        self.peak_mb = max(0, peak - self._start) / (1024 * 1024)
+        return False
+
+def _early_stopping_kwargs(model: Any, X_val, y_val) -> Dict:
+    """fit() arguments that stop XGBoost/LightGBM on the validation split (none without one)"""
+    # Stop on ROC-AUC (the selection metric): log loss on the unbalanced validation
+    # split keeps improving long after ranking quality has peaked for SMOTE/weighted fits
+    rounds = config.boosting_early_stopping_rounds
+    if XGBOOST_AVAILABLE and isinstance(model, XGBClassifier):
+        # early_stopping_rounds is a constructor param in xgboost 2.x and needs an eval_set
+        if X_val is None:
+            model.set_params(early_stopping_rounds=None, eval_metric='logloss')
+            return {}
+        model.set_params(early_stopping_rounds=rounds, eval_metric='auc')
+        return {'eval_set': [(X_val, y_val)], 'verbose': False}
+    if LIGHTGBM_AVAILABLE and isinstance(model, LGBMClassifier) and X_val is not None:
+        model.set_params(metric='auc')
+        return {'eval_set': [(X_val, y_val)], 'callbacks': [lgb_early_stopping(rounds, verbose=False)]}
+    return {}
+
+def _warm_start_kwargs(model: Any) -> Dict:
+    """
+    Prepare a fitted booster so fit() adds incremental_rounds trees to it,
+    continuing from the trees inference uses (best iteration)
+    """
+    rounds = config.incremental_rounds
+    if XGBOOST_AVAILABLE and isinstance(model, XGBClassifier):
+        booster = model.get_booster()
+        booster = booster[:_boosting_rounds(model)]
+        model.set_params(n_estimators=rounds, early_stopping_rounds=None)
+        return {'xgb_model': booster}
+    if LIGHTGBM_AVAILABLE and isinstance(model, LGBMClassifier):
+        booster = LGBMBooster(model_str=model.booster_.model_to_string(num_iteration=_boosting_rounds(model)))
+        model.set_params(n_estimators=rounds)
+        return {'init_model': booster}
+    raise ValueError(f"{type(model).__name__} cannot be warm-started")
+
+def _boosting_rounds(model: Any) -> Optional[int]:
+    """
+    Trees a fitted boosting model uses at inference (the best iteration when
+    early stopping ran - predict_proba stops there too); None for other models
+    """
+    if XGBOOST_AVAILABLE and isinstance(model, XGBClassifier):
+        best = getattr(model, 'best_iteration', None)
+        return int(best) + 1 if best is not None else int(model.get_booster().num_boosted_rounds())
+    if LIGHTGBM_AVAILABLE and isinstance(model, LGBMClassifier):
+        return int(model.best_iteration_ or model.booster_.current_iteration())
+    if isinstance(model, HistGradientBoostingClassifier):
+        return int(model.n_iter_)
+    if isinstance(model, GradientBoostingClassifier):
+        return int(model.n_estimators_)
+    return None
+
+def _test_metrics(model: Any, X_test, y_test) -> Dict:
+    y_pred_proba = model.predict_proba(X_test)[:, 1]
+    y_pred = model.predict(X_test)
+    return {
+        'roc_auc': roc_auc_score(y_test, y_pred_proba),
+        'accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred, zero_division=0),
+        'recall': recall_score(y_test, y_pred, zero_division=0)
+    }
+
+def _rescore_candidate(result: Dict, X_test, y_test) -> Dict:
+    """Carry a fitted candidate over unchanged, scored on a new test split"""
+    return {
+        **result,
+        **_test_metrics(result['model'], X_test, y_test),
+        'training_time': 0.0,
+        'cpu_seconds': 0.0,
+        'peak_memory_mb': 0.0,
+        'training': 'carried_over'
+    }
+
+def _fit_candidate(name: str, model: Any, cores: int, X_train, y_train, X_test, y_test,
+                   X_val=None, y_val=None, warm_start: bool = False) -> Dict:
+    """
+    Fit and score one candidate within its core budget (module level so it pickles
+    for the training pool). Records wall time, CPU seconds across all threads,
+    peak memory growth during the fit and the boosting rounds kept
+    - warm_start: add trees to an already fitted ensemble (see _warm_start_kwargs)
+    """
+    from threadpoolctl import threadpool_limits
+    
+    logger.info(f"Training {name} on {cores} core(s)...")
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=cores)
+    
+    cpu_start = time.process_time()
+    start_time = time.time()
+    
+    fit_kwargs = _warm_start_kwargs(model) if warm_start else _early_stopping_kwargs(model, X_val, y_val)
+    
+    with threadpool_limits(limits=cores), PeakMemory() as memory:
+        model.fit(X_train, y_train, **fit_kwargs)
+        training_time = time.time() - start_time
+        metrics = _test_metrics(model, X_test, y_test)
+    
+    cpu_seconds = time.process_time() - cpu_start
+    
+    return {
+        'name': name,
+        'model': model,
+        **metrics,
+        'training_time': training_time,
+        'cpu_seconds': cpu_seconds,
+        'peak_memory_mb': memory.peak_mb,
+        'cores': cores,
+        'rounds': _boosting_rounds(model),
+        'training': 'warm_start' if warm_start else 'full',
+        'timestamp': datetime.now().isoformat()
+    }
 
 # Global instances
 cache_manager = CacheManager()
 feature_service = FeatureService()
+feature_store = FeatureStore()
+snapshot_store = SnapshotStore()
 ml_manager = MLModelManager()
 
+# ==================== REFRESH JOBS ====================
+
+# Worker entry points for the refresh process pool (module level so they pickle)
+def _build_training_dataset(daily_activity: pd.DataFrame, feature_cache: Optional[pd.DataFrame] = None) -> tuple:
+    return feature_service.update_training_dataset(daily_activity, feature_cache)
+
+def _build_prediction_features(daily_activity: pd.DataFrame) -> pd.DataFrame:
+    return feature_service.create_prediction_features(daily_activity)
+
+def _fit_candidate_models(training_df: pd.DataFrame) -> tuple:
+    return ml_manager.fit_candidates(training_df)
+
+def _update_candidate_models(delta_df: pd.DataFrame, training_df: pd.DataFrame, previous_results: List[Dict],
+                             scaler: StandardScaler, split: Optional[pd.DataFrame]) -> tuple:
+    return ml_manager.update_candidates(delta_df, training_df, previous_results, scaler, split)
+
+class RefreshJobManager:
+    """Runs /api/cache/refresh as a background job and tracks per-stage progress"""
+    
+    stages = [
+        'fetch_sources', 'fetch_user_activity', 'prepare_data',
+        'feature_engineering', 'training', 'predictions', 'publish'
+    ]
+    
+    def __init__(self, max_jobs_kept: int = 20):
+        self.jobs: Dict[str, Dict] = {}
+        self.active_job_id: Optional[str] = None
+        self.max_jobs_kept = max_jobs_kept
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stage_started: Dict[str, float] = {}
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # spawn: the event loop process has live threads, forking it is unsafe
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=max(1, config.refresh_process_workers),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._process_pool
+    
+    async def run_cpu(self, func, *args):
+        """Run a CPU-heavy stage in the process pool without blocking the event loop"""
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self._get_process_pool(), func, *args)
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool - start a fresh one next time
+            self._process_pool = None
+            raise
+    
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        return self.jobs.get(job_id)
+    
+    def start(self, full_retrain: bool = False) -> tuple:
+        """Start a refresh job, or return the one already running. Returns (job, created)"""
+        if self.active_job_id:
+            return self.jobs[self.active_job_id], False
+        
+        job_id = uuid.uuid4().hex[:12]
+        self.jobs[job_id] = {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'current_stage': None,
+            'full_retrain': full_retrain,
+            'stages': {name: {'status': 'pending'} for name in self.stages},
+            'result': None,
+            'error': None
+        }
+        self.active_job_id = job_id
+        self._trim_history()
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, full_retrain))
+        return self.jobs[job_id], True
+    
+    async def wait(self, job_id: str):
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+    
+    def enter_stage(self, job_id: str, stage: str):
+        job = self.jobs[job_id]
+        self._finish_stage(job, 'completed')
+        job['current_stage'] = stage
+        job['stages'][stage] = {'status': 'running', 'started_at': datetime.now().isoformat()}
+        self._stage_started[job_id] = time.time()
+        logger.info(f"🔄 Refresh job {job_id}: {stage}")
+    
+    def _finish_stage(self, job: Dict, status: str):
+        stage = job['current_stage']
+        if stage is None:
+            return
+        info = job['stages'][stage]
+        info['status'] = status
+        info['finished_at'] = datetime.now().isoformat()
+        info['seconds'] = round(time.time() - self._stage_started.pop(job['job_id'], time.time()), 2)
+        job['current_stage'] = None
+    
+    async def _run(self, job_id: str, full_retrain: bool = False):
+        job = self.jobs[job_id]
+        job['status'] = 'running'
+        job['started_at'] = datetime.now().isoformat()
+        try:
+            job['result'] = await run_refresh_pipeline(job_id, full_retrain)
+            self._finish_stage(job, 'completed')
+            job['status'] = 'completed'
+        except Exception as e:
+            logger.error(f"Error in refresh job {job_id}: {e}", exc_info=True)
+            self._finish_stage(job, 'failed')
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            for info in job['stages'].values():
+                if info['status'] == 'pending':
+                    info['status'] = 'skipped'
+            job['finished_at'] = datetime.now().isoformat()
+            self.active_job_id = None
+            self._tasks.pop(job_id, None)
+    
+    def _trim_history(self):
+        finished = [job_id for job_id in self.jobs if job_id != self.active_job_id]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs_kept)]:
+            del self.jobs[job_id]
+    
+    def shutdown(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+refresh_jobs = RefreshJobManager()
+
 # ==================== FASTAPI APP ====================
 
 @asynccontextmanager
@@ -872,7 +2913,11 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Solana Games ML Analytics API v1.0")
     logger.info(f"XGBoost: {XGBOOST_AVAILABLE} | LightGBM: {LIGHTGBM_AVAILABLE}")
     logger.info("=" * 60)
+    cache_manager.migrate_cache_files()
+    ml_manager.load_history(snapshot_store.start().metadata)
     yield
+    await scoring_batcher.stop()
+    refresh_jobs.shutdown()
     logger.info("Shutting down API")
 
 app = FastAPI(
@@ -918,6 +2963,11 @@ async def root():
                 "churn_predictions": "/api/ml/predictions/churn",
                 "churn_by_game": "/api/ml/predictions/churn/by-game",
                 "high_risk_users": "/api/ml/predictions/high-risk-users",
+                "wallet_rank": "/api/ml/predictions/rank/{wallet}",
+                "wallet_prediction": "/api/ml/predictions/wallet/{address}",
+                "wallet_predictions_batch": "/api/ml/predictions/wallets",
+                "score": "/api/ml/score",
+                "score_stats": "/api/ml/score/stats",
                 "model_leaderboard": "/api/ml/models/leaderboard",
                 "model_info": "/api/ml/models/info"
             },
@@ -929,6 +2979,7 @@ async def root():
                 "cache_status": "/api/cache/status",
                 "clear_cache": "/api/cache/clear",
                 "force_refresh": "/api/cache/refresh",
+                "refresh_status": "/api/cache/refresh/{job_id}",
                 "health": "/api/health"
             }
         },
@@ -940,153 +2991,478 @@ async def root():
 
 # ==================== ANALYTICS ENDPOINTS ====================
 
-@app.get("/api/analytics/gamer-activation")
-async def get_gamer_activation():
-    df = await cache_manager.fetch_dune_raw('gamer_activation')
-    df = clean_dataframe_for_json(df)
-    metadata = cache_manager.get_metadata_for_key(
-        'gamer_activation',
+response_cache = ResponseCache()
+
+def _analytics_cache_keys(query_key: str) -> List[str]:
+    if query_key == 'user_daily_activity':
+        return [f'user_activity_{page}' for page in config.user_activity_pages]
+    return [query_key]
+
+async def _render_analytics(query_key: str) -> tuple:
+    """
+    Return (metadata, rendered entry) for an analytics source
+    The records are cleaned and serialised only when the cache generation changes;
+    stale entries keep being served (and rendered once) while they revalidate
+    """
+    cache_keys = _analytics_cache_keys(query_key)
+    cache_manager.revalidate_stale(cache_keys)
+    entry = response_cache.get(query_key, cache_manager.get_generation(cache_keys, config.cache_max_stale))
+    
+    if entry is None:
+        if query_key == 'user_daily_activity':
+            # Fetch from paginated queries instead of single query
+            df = await cache_manager.get_user_daily_activity()
+        else:
+            df = await cache_manager.fetch_dune_raw(query_key)
+        df = clean_dataframe_for_json(df)
+        entry = response_cache.put(
+            query_key,
+            cache_manager.get_generation(cache_keys, config.cache_max_stale),
+            dumps_json(df.to_dict('records')),
+            len(df),
+            cache_manager.last_modified(cache_keys)
+        )
+    
+    return _analytics_metadata(query_key, entry['row_count']), entry
+
+def _analytics_metadata(query_key: str, row_count: int) -> DataMetadata:
+    if query_key == 'user_daily_activity':
+        # Merged result of the paginated queries (multiple query ids), as fresh as its oldest page
+        metadata = cache_manager.get_metadata_for_keys(_analytics_cache_keys(query_key), 'Dune Analytics (Paginated)')
+        metadata.row_count = row_count
+        return metadata
+    return cache_manager.get_metadata_for_key(
+        query_key,
         'Dune Analytics',
-        config.dune_queries['gamer_activation']
+        config.dune_queries[query_key]
     )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
 
-@app.get("/api/analytics/gamer-retention")
-async def get_gamer_retention():
-    df = await cache_manager.fetch_dune_raw('gamer_retention')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'gamer_retention',
-        'Dune Analytics',
-        config.dune_queries['gamer_retention']
+async def _analytics_body(query_key: str) -> tuple:
+    """Return (JSON body bytes, rendered entry) for an analytics endpoint"""
+    metadata, entry = await _render_analytics(query_key)
+    body = b'{"metadata":' + dumps_json(metadata.dict()) + b',"data":' + entry['data'] + b'}'
+    return body, entry
+
+def _is_not_modified(request: Request, entry: Dict) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or entry['etag'] in tags or entry['etag'][2:] in tags
+    
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and entry['last_modified']:
+        try:
+            return parsedate_to_datetime(entry['last_modified']) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+class KeyIndex:
+    """
+    Hash index from the values of one column to the row positions holding them
+    Rows are grouped by value once, so a lookup is one hash probe plus a slice
+    """
+    
+    def __init__(self, values: pd.Series):
+        codes, uniques = pd.factorize(values.astype(str), use_na_sentinel=False)
+        self.keys = pd.Index(uniques)
+        self.order = np.argsort(codes, kind='stable')
+        self.bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+    
+    def positions(self, key: str) -> np.ndarray:
+        try:
+            code = self.keys.get_loc(key)
+        except KeyError:
+            return self.order[:0]
+        return self.order[self.bounds[code]:self.bounds[code + 1]]
+
+class DatasetIndex:
+    """
+    Sorted position indexes over one cached analytics frame, built lazily and
+    kept on the frame's memory cache entry. A (group column, sort column)
+    order lets a project filter resolve to one contiguous slice by binary search
+    """
+    
+    group_columns = ['project', 'game', 'game_project']
+    
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.group_column = next((c for c in self.group_columns if c in df.columns), None)
+        self._orders: Dict[tuple, tuple] = {}
+        self._key_indexes: Dict[str, KeyIndex] = {}
+    
+    def lookup(self, column: str, value: str) -> np.ndarray:
+        """Positions of rows whose column equals value (hash index built on first use)"""
+        if column not in self._key_indexes:
+            self._key_indexes[column] = KeyIndex(self.df[column])
+        return self._key_indexes[column].positions(value)
+    
+    def _order(self, group_column: Optional[str], sort_column: Optional[str], descending: bool) -> tuple:
+        """Return (positions, sorted group keys or None) for the requested ordering"""
+        order_key = (group_column, sort_column, descending)
+        if order_key not in self._orders:
+            frame = self.df.reset_index(drop=True)
+            by, ascending = [], []
+            if group_column:
+                frame = frame.assign(_group_key=frame[group_column].astype(str))
+                by.append('_group_key')
+                ascending.append(True)
+            if sort_column:
+                by.append(sort_column)
+                ascending.append(not descending)
+            
+            positions = frame.sort_values(by, ascending=ascending, kind='mergesort', na_position='last').index.to_numpy()
+            group_keys = frame['_group_key'].to_numpy()[positions] if group_column else None
+            self._orders[order_key] = (positions, group_keys)
+        return self._orders[order_key]
+    
+    def select(self, group_value: Optional[str], sort_column: Optional[str], descending: bool) -> np.ndarray:
+        """Positions of matching rows in the requested order"""
+        if group_value is None and sort_column is None:
+            return np.arange(len(self.df))
+        
+        group_column = self.group_column if group_value is not None else None
+        positions, group_keys = self._order(group_column, sort_column, descending)
+        if group_column is None:
+            return positions
+        
+        lo = np.searchsorted(group_keys, group_value, side='left')
+        hi = np.searchsorted(group_keys, group_value, side='right')
+        return positions[lo:hi]
+
+async def _get_indexed_dataset(query_key: str) -> tuple:
+    """
+    Return (frame, DatasetIndex, generation) for an analytics source. The index is
+    kept on the frame's memory cache entry, so it lives exactly as long as the frame
+    """
+    if query_key == 'user_daily_activity':
+        df, memory_key = await cache_manager.get_user_daily_activity(), 'user_activity_merged'
+    else:
+        df, memory_key = await cache_manager.fetch_dune_raw(query_key), query_key
+    
+    generation = cache_manager.get_generation(_analytics_cache_keys(query_key), config.cache_max_stale)
+    index = cache_manager.memory_cache.derived(memory_key, df, 'dataset_index', DatasetIndex)
+    return df, index, generation
+
+def analytics_query_params(
+    limit: Optional[int] = Query(default=None, ge=1, le=50000, description="Maximum rows to return"),
+    offset: int = Query(default=0, ge=0, description="Rows to skip"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from a previous page"),
+    project: Optional[str] = Query(default=None, description="Only rows for this project/game"),
+    columns: Optional[str] = Query(default=None, description="Comma-separated columns to return"),
+    sort: Optional[str] = Query(default=None, description="Column to sort by, prefix with '-' for descending")
+) -> Dict:
+    return {
+        'limit': limit, 'offset': offset, 'cursor': cursor,
+        'project': project, 'columns': columns, 'sort': sort
+    }
+
+def _is_plain_query(query: Optional[Dict]) -> bool:
+    return not query or (
+        query['offset'] == 0 and
+        all(query[name] is None for name in ['limit', 'cursor', 'project', 'columns', 'sort'])
     )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+
+def _encode_cursor(generation: Optional[str], query: Dict, offset: int) -> str:
+    state = {'g': generation, 'p': query['project'], 's': query['sort'], 'o': offset}
+    return base64.urlsafe_b64encode(dumps_json(state)).decode()
+
+def _decode_cursor(cursor: str, generation: Optional[str], query: Dict) -> int:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(state['o'])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if state.get('g') != generation:
+        raise HTTPException(status_code=410, detail="Cursor expired: the data was refreshed. Restart from the first page.")
+    if state.get('p') != query['project'] or state.get('s') != query['sort']:
+        raise HTTPException(status_code=400, detail="Cursor does not match the project/sort of this query")
+    return offset
+
+async def _select_analytics_rows(query_key: str, query: Dict) -> tuple:
+    """
+    Apply project filter, sort, pagination and column projection through the
+    dataset index. Returns (selected frame, pagination info)
+    """
+    df, index, generation = await _get_indexed_dataset(query_key)
+    
+    if query['project'] is not None and index.group_column is None:
+        raise HTTPException(status_code=400, detail=f"'{query_key}' has no project/game column to filter on")
+    
+    sort_column, descending = None, False
+    if query['sort']:
+        sort_column = query['sort'].lstrip('-')
+        descending = query['sort'].startswith('-')
+        if sort_column not in df.columns:
+            raise HTTPException(status_code=400, detail=f"Unknown sort column '{sort_column}'")
+    
+    selected_columns = list(df.columns)
+    if query['columns']:
+        selected_columns = [c.strip() for c in query['columns'].split(',') if c.strip()]
+        unknown = [c for c in selected_columns if c not in df.columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {unknown}")
+    
+    try:
+        positions = index.select(query['project'], sort_column, descending)
+    except TypeError:
+        raise HTTPException(status_code=400, detail=f"Column '{sort_column}' has mixed types and cannot be sorted")
+    
+    offset = _decode_cursor(query['cursor'], generation, query) if query['cursor'] else query['offset']
+    end = len(positions) if query['limit'] is None else min(len(positions), offset + query['limit'])
+    page_positions = positions[offset:end]
+    
+    pagination = {
+        'total': len(positions),
+        'offset': offset,
+        'limit': query['limit'],
+        'returned': len(page_positions),
+        'next_cursor': _encode_cursor(generation, query, end) if end < len(positions) else None
+    }
+    return df.iloc[page_positions][selected_columns], pagination
+
+async def analytics_response(request: Request, query_key: str, query: Optional[Dict] = None) -> Response:
+    """
+    Serve an analytics payload
+    - plain requests: pre-rendered body with ETag/Last-Modified and 304 handling
+    - filter/sort/pagination/projection requests: rows selected through the dataset index
+    """
+    if not _is_plain_query(query):
+        page, pagination = await _select_analytics_rows(query_key, query)
+        page = clean_dataframe_for_json(page)
+        body = (
+            b'{"metadata":' + dumps_json(_analytics_metadata(query_key, pagination['total']).dict()) +
+            b',"data":' + dumps_json(page.to_dict('records')) +
+            b',"pagination":' + dumps_json(pagination) + b'}'
+        )
+        return Response(content=body, media_type='application/json')
+    
+    body, entry = await _analytics_body(query_key)
+    
+    headers = {}
+    if entry['etag']:
+        headers = {
+            'ETag': entry['etag'],
+            'Last-Modified': entry['last_modified'],
+            'Cache-Control': 'no-cache'
+        }
+        if _is_not_modified(request, entry):
+            return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type='application/json', headers=headers)
+
+@app.get("/api/analytics/gamer-activation")
+async def get_gamer_activation(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'gamer_activation', query)
+
+@app.get("/api/analytics/gamer-retention")
+async def get_gamer_retention(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'gamer_retention', query)
 
 @app.get("/api/analytics/gamer-reactivation")
-async def get_gamer_reactivation():
-    df = await cache_manager.fetch_dune_raw('gamer_reactivation')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'gamer_reactivation',
-        'Dune Analytics',
-        config.dune_queries['gamer_reactivation']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_gamer_reactivation(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'gamer_reactivation', query)
 
 @app.get("/api/analytics/gamer-deactivation")
-async def get_gamer_deactivation():
-    df = await cache_manager.fetch_dune_raw('gamer_deactivation')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'gamer_deactivation',
-        'Dune Analytics',
-        config.dune_queries['gamer_deactivation']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_gamer_deactivation(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'gamer_deactivation', query)
 
 @app.get("/api/analytics/high-retention-users")
-async def get_high_retention_users():
-    df = await cache_manager.fetch_dune_raw('high_retention_users')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'high_retention_users',
-        'Dune Analytics',
-        config.dune_queries['high_retention_users']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_high_retention_users(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'high_retention_users', query)
 
 @app.get("/api/analytics/high-retention-summary")
-async def get_high_retention_summary():
-    df = await cache_manager.fetch_dune_raw('high_retention_summary')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'high_retention_summary',
-        'Dune Analytics',
-        config.dune_queries['high_retention_summary']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_high_retention_summary(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'high_retention_summary', query)
 
 @app.get("/api/analytics/gamers-by-games-played")
-async def get_gamers_by_games_played():
-    df = await cache_manager.fetch_dune_raw('gamers_by_games_played')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'gamers_by_games_played',
-        'Dune Analytics',
-        config.dune_queries['gamers_by_games_played']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_gamers_by_games_played(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'gamers_by_games_played', query)
 
 @app.get("/api/analytics/cross-game-gamers")
-async def get_cross_game_gamers():
-    df = await cache_manager.fetch_dune_raw('cross_game_gamers')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'cross_game_gamers',
-        'Dune Analytics',
-        config.dune_queries['cross_game_gamers']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_cross_game_gamers(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'cross_game_gamers', query)
 
 @app.get("/api/analytics/gaming-activity-total")
-async def get_gaming_activity_total():
-    df = await cache_manager.fetch_dune_raw('gaming_activity_total')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'gaming_activity_total',
-        'Dune Analytics',
-        config.dune_queries['gaming_activity_total']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_gaming_activity_total(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'gaming_activity_total', query)
 
 @app.get("/api/analytics/daily-gaming-activity")
-async def get_daily_gaming_activity():
-    df = await cache_manager.fetch_dune_raw('daily_gaming_activity')
-    df = clean_dataframe_for_json(df)  
-    metadata = cache_manager.get_metadata_for_key(
-        'daily_gaming_activity',
-        'Dune Analytics',
-        config.dune_queries['daily_gaming_activity']
-    )
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+async def get_daily_gaming_activity(request: Request, query: Dict = Depends(analytics_query_params)):
+    return await analytics_response(request, 'daily_gaming_activity', query)
 
 @app.get("/api/analytics/user-daily-activity")
-async def get_user_daily_activity():
-    # Fetch from paginated queries instead of single query
-    df = await cache_manager.fetch_user_daily_activity_paginated()
-    df = clean_dataframe_for_json(df)
-    
-    # Create metadata for the merged result
-    metadata = DataMetadata(
-        source='Dune Analytics (Paginated)',
-        query_id=None,  # Multiple queries
-        last_updated=datetime.now().isoformat(),
-        cache_age_hours=0,
-        is_fresh=True,
-        next_refresh=(datetime.now() + timedelta(hours=168)).isoformat(),
-        row_count=len(df)
-    )
+async def get_user_daily_activity(
+    request: Request,
+    output_format: str = Query(default="json", alias="format", pattern="^(json|ndjson|json-stream)$"),
+    query: Dict = Depends(analytics_query_params)
+):
+    """
+    Get per-user daily activity (merged paginated queries)
+    - format: 'json' (single cached document), 'ndjson' (one record per line)
+      or 'json-stream' (same document as 'json', streamed in batches)
+    Filter/sort/pagination/projection parameters apply to every format
+    """
+    if output_format == 'json':
+        return await analytics_response(request, 'user_daily_activity', query)
+    
+    if _is_plain_query(query):
+        df = await cache_manager.get_user_daily_activity()
+    else:
+        df, _ = await _select_analytics_rows('user_daily_activity', query)
+    metadata = _analytics_metadata('user_daily_activity', len(df))
     
-    return {"metadata": metadata.dict(), "data": df.to_dict('records')}
+    if output_format == 'ndjson':
+        return StreamingResponse(
+            _iter_json_batches(df, ndjson=True),
+            media_type='application/x-ndjson',
+            headers={'X-Total-Count': str(len(df))}
+        )
+    
+    def iter_document():
+        yield b'{"metadata":' + dumps_json(metadata.dict()) + b',"data":['
+        yield from _iter_json_batches(df, ndjson=False)
+        yield b']}'
+    
+    return StreamingResponse(iter_document(), media_type='application/json')
+
+def _datetime_precision(col: pd.Series) -> Optional[str]:
+    """
+    The fixed layout astype(str) picks for a whole tz-naive datetime column: 'date'
+    when every value is a midnight, otherwise seconds plus the finest sub-second
+    unit present ('s', 'ms', 'us', 'ns'). None for tz-aware columns, which astype(str)
+    formats value by value anyway
+    """
+    if col.dt.tz is not None:
+        return None
+    nanos = col.to_numpy(dtype='datetime64[ns]').view('i8')
+    nanos = nanos[nanos != np.iinfo(np.int64).min]  # NaT
+    if not (nanos % 86_400_000_000_000).any():
+        return 'date'
+    for unit, step in [('ns', 1_000), ('us', 1_000_000), ('ms', 1_000_000_000)]:
+        if (nanos % step).any():
+            return unit
+    return 's'
+
+def _format_datetime_batch(col: pd.Series, precision: Optional[str]) -> pd.Series:
+    """astype(str) of a slice of a datetime column, laid out as for the whole column"""
+    if precision is None:
+        return _format_datetime_column(col)
+    if precision == 'date':
+        text = col.dt.strftime('%Y-%m-%d')
+    elif precision == 's':
+        text = col.dt.strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        text = col.dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+        if precision == 'ms':
+            text = text.str[:-3]
+        elif precision == 'ns':
+            nanos = pd.Series(col.to_numpy(dtype='datetime64[ns]').view('i8') % 1000, index=col.index)
+            text = text + nanos.astype(str).str.zfill(3)
+    return text.astype(object).where(col.notna(), 'NaT')
+
+def _iter_json_batches(df: pd.DataFrame, ndjson: bool):
+    """
+    Yield the frame as JSON in batches of config.stream_batch_rows rows, so only
+    one batch is cleaned and encoded at a time
+    - ndjson: one record per line, otherwise comma-separated array items
+    """
+    # Datetimes are formatted per batch, in the layout astype(str) picks for the whole column
+    precisions = {
+        i: _datetime_precision(df.iloc[:, i])
+        for i in range(df.shape[1])
+        if pd.api.types.is_datetime64_any_dtype(df.iloc[:, i].dtype)
+    }
+    
+    batch_size = max(1, config.stream_batch_rows)
+    separator = b'\n' if ndjson else b','
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        if precisions:
+            batch = batch.copy(deep=False)
+            for i, precision in precisions.items():
+                batch.isetitem(i, _format_datetime_batch(batch.iloc[:, i], precision))
+        batch = clean_dataframe_for_json(batch)
+        chunk = separator.join(dumps_json(record) for record in batch.to_dict('records'))
+        if ndjson:
+            yield chunk + b'\n'
+        else:
+            yield chunk if start == 0 else b',' + chunk
 
 # ==================== ML PREDICTION ENDPOINTS ====================
 
+class PredictionIndex:
+    """
+    Rankings over one cached predictions frame, by descending churn probability
+    - ranking / high_ranking: row positions of all users / High risk users
+    - project_rankings / project_high_rankings: the same per project
+    - rank / project_rank: 1-based rank of every row, overall and within its project
+    - wallets: hash index from wallet to its rows
+    """
+    
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        n = len(df)
+        probabilities = pd.to_numeric(df['churn_probability'], errors='coerce').fillna(-np.inf).to_numpy()
+        is_high = (df['churn_risk'] == 'High').to_numpy()
+        
+        self.ranking = np.argsort(-probabilities, kind='stable')
+        self.high_ranking = self.ranking[is_high[self.ranking]]
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.ranking] = np.arange(1, n + 1)
+        
+        # Stable sort of the global ranking by project keeps probability order within each project
+        codes, projects = pd.factorize(df['project'].astype(str).to_numpy()[self.ranking])
+        by_project = self.ranking[np.argsort(codes, kind='stable')]
+        counts = np.bincount(codes, minlength=len(projects))
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        
+        self.project_rankings = {}
+        self.project_high_rankings = {}
+        self.project_rank = np.empty(n, dtype=np.int64)
+        for code, project in enumerate(projects):
+            positions = by_project[bounds[code]:bounds[code + 1]]
+            self.project_rankings[project] = positions
+            self.project_high_rankings[project] = positions[is_high[positions]]
+            self.project_rank[positions] = np.arange(1, len(positions) + 1)
+        
+        self.wallets = KeyIndex(df['user_wallet'])
+    
+    def top_high_risk(self, limit: int, project: Optional[str] = None) -> tuple:
+        """Return (positions of the top `limit` High risk rows, total High risk rows)"""
+        ranking = self.high_ranking if project is None else self.project_high_rankings.get(project, np.empty(0, dtype=np.int64))
+        return ranking[:limit], len(ranking)
+    
+    def wallet_positions(self, wallet: str) -> np.ndarray:
+        return self.wallets.positions(wallet)
+
+async def pinned_snapshot():
+    """Request dependency: the published snapshot, pinned until the request is done"""
+    with snapshot_store.pin() as snapshot:
+        yield snapshot
+
 @app.get("/api/ml/predictions/churn")
-async def predict_churn(method: str = Query(default="ensemble", pattern="^(champion|ensemble)$")):
+async def predict_churn(
+    method: str = Query(default="ensemble", pattern="^(champion|ensemble)$"),
+    limit: int = Query(default=100, ge=1, le=10000),
+    cursor: Optional[str] = Query(default=None),
+    snapshot: Snapshot = Depends(pinned_snapshot)
+):
     """
     Get churn predictions for all users
     Parameters:
     - method: 'champion' (best single model) or 'ensemble' (top 3 weighted average)
+    - limit: predictions per page
+    - cursor: next_cursor from a previous page, to page through every user
     """
     try:
-        if not ml_manager.champion:
+        if not snapshot.champion:
             raise HTTPException(
                 status_code=503,
                 detail="ML models not trained yet. Trigger /api/cache/refresh first."
             )
         
-        pred_key = f'predictions_{method}'
-        cached_predictions = cache_manager.get_cached_data(pred_key)
+        cached_predictions = snapshot.predictions.get(method)
         
         if cached_predictions is None or cached_predictions.empty:
             raise HTTPException(
@@ -1094,29 +3470,34 @@ async def predict_churn(method: str = Query(default="ensemble", pattern="^(champ
                 detail="No predictions available. Trigger /api/cache/refresh to generate predictions."
             )
         
-        predictions = cached_predictions.to_dict('records')
+        summary = _prediction_aggregates(cached_predictions)['summary']
         
-        summary = {
-            'total_users': len(predictions),
-            'high_risk': sum(1 for p in predictions if p.get('churn_risk') == 'High'),
-            'medium_risk': sum(1 for p in predictions if p.get('churn_risk') == 'Medium'),
-            'low_risk': sum(1 for p in predictions if p.get('churn_risk') == 'Low'),
-            'avg_churn_probability': np.mean([p.get('churn_probability', 0) for p in predictions])
-        }
+        # Cursors are tied to the snapshot they were issued for
+        generation = snapshot.generation
+        cursor_scope = {'project': None, 'sort': method}
+        offset = _decode_cursor(cursor, generation, cursor_scope) if cursor else 0
+        end = min(len(cached_predictions), offset + limit)
+        predictions = clean_dataframe_for_json(cached_predictions.iloc[offset:end]).to_dict('records')
         
         return {
             "prediction_type": "churn_risk_14_days",
             "method": method,
             "total_users": summary['total_users'],
-            "predictions_count": len(predictions),
+            "predictions_count": summary['total_users'],
             "summary": summary,
-            "predictions": predictions[:100],
+            "predictions": predictions,
+            "pagination": {
+                "offset": offset,
+                "limit": limit,
+                "returned": len(predictions),
+                "next_cursor": _encode_cursor(generation, cursor_scope, end) if end < len(cached_predictions) else None
+            },
             "model_info": {
-                "champion": ml_manager.champion['name'],
-                "roc_auc": safe_float(ml_manager.champion['roc_auc']),
-                "ensemble_models": [m['name'] for m in ml_manager.top_3_ensemble] if method == 'ensemble' else None
+                "champion": snapshot.champion['name'],
+                "roc_auc": safe_float(snapshot.champion['roc_auc']),
+                "ensemble_models": [m['name'] for m in snapshot.top_3_ensemble] if method == 'ensemble' else None
             },
-            "note": "Showing first 100 predictions. Use /api/ml/predictions/churn/by-game for game-specific results."
+            "note": "Page through all predictions with next_cursor. Use /api/ml/predictions/churn/by-game for game-specific results."
         }
         
     except HTTPException:
@@ -1126,37 +3507,29 @@ async def predict_churn(method: str = Query(default="ensemble", pattern="^(champ
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/ml/predictions/churn/by-game")
-async def predict_churn_by_game(method: str = Query(default="ensemble", pattern="^(champion|ensemble)$")):
+async def predict_churn_by_game(
+    method: str = Query(default="ensemble", pattern="^(champion|ensemble)$"),
+    snapshot: Snapshot = Depends(pinned_snapshot)
+):
     """Get churn predictions aggregated by game"""
     try:
-        if not ml_manager.champion:
+        if not snapshot.champion:
             raise HTTPException(status_code=503, detail="ML models not trained yet")
         
-        pred_key = f'predictions_{method}'
-        cached_predictions = cache_manager.get_cached_data(pred_key)
+        cached_predictions = snapshot.predictions.get(method)
         
         if cached_predictions is None or cached_predictions.empty:
             raise HTTPException(status_code=503, detail="No predictions available")
         
-        by_game = cached_predictions.groupby('project').agg({
-            'user_wallet': 'count',
-            'churn_probability': 'mean'
-        }).reset_index()
-        
-        by_game.columns = ['project', 'total_users', 'avg_churn_probability']
-        
-        risk_counts = cached_predictions.groupby(['project', 'churn_risk']).size().unstack(fill_value=0)
-        by_game = by_game.merge(risk_counts, left_on='project', right_index=True, how='left')
-        
-        data = by_game.to_dict('records')
+        data = _prediction_aggregates(cached_predictions)['by_game']
         
         return {
             "prediction_type": "churn_by_game",
             "method": method,
             "data": data,
             "model_info": {
-                "champion": ml_manager.champion['name'],
-                "roc_auc": safe_float(ml_manager.champion['roc_auc'])
+                "champion": snapshot.champion['name'],
+                "roc_auc": safe_float(snapshot.champion['roc_auc'])
             }
         }
         
@@ -1167,31 +3540,40 @@ async def predict_churn_by_game(method: str = Query(default="ensemble", pattern=
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/ml/predictions/high-risk-users")
-async def get_high_risk_users(limit: int = Query(default=100, ge=1, le=1000)):
-    """Get list of high-risk users most likely to churn"""
+async def get_high_risk_users(
+    limit: int = Query(default=100, ge=1, le=1000),
+    method: str = Query(default="ensemble", pattern="^(champion|ensemble)$"),
+    project: Optional[str] = Query(default=None),
+    snapshot: Snapshot = Depends(pinned_snapshot)
+):
+    """
+    Get list of high-risk users most likely to churn
+    - method: 'champion' or 'ensemble' predictions
+    - project: only users of this game, ranked within it
+    """
     try:
-        if not ml_manager.champion:
+        if not snapshot.champion:
             raise HTTPException(status_code=503, detail="ML models not trained yet")
         
-        pred_key = 'predictions_ensemble'
-        cached_predictions = cache_manager.get_cached_data(pred_key)
+        cached_predictions = snapshot.predictions.get(method)
         
         if cached_predictions is None or cached_predictions.empty:
             raise HTTPException(status_code=503, detail="No predictions available")
         
-        high_risk = cached_predictions[cached_predictions['churn_risk'] == 'High'].copy()
-        high_risk = high_risk.sort_values('churn_probability', ascending=False)
-        
-        data = high_risk.head(limit).to_dict('records')
+        index = snapshot.prediction_index(method)
+        top_positions, total_high_risk = index.top_high_risk(limit, project)
+        data = cached_predictions.iloc[top_positions].to_dict('records')
         
         return {
             "prediction_type": "high_risk_users",
-            "total_high_risk": len(high_risk),
+            "method": method,
+            "project": project,
+            "total_high_risk": total_high_risk,
             "showing": len(data),
             "users": data,
             "model_info": {
-                "champion": ml_manager.champion['name'],
-                "roc_auc": safe_float(ml_manager.champion['roc_auc'])
+                "champion": snapshot.champion['name'],
+                "roc_auc": safe_float(snapshot.champion['roc_auc'])
             }
         }
         
@@ -1201,11 +3583,424 @@ async def get_high_risk_users(limit: int = Query(default=100, ge=1, le=1000)):
         logger.error(f"Error in high risk users endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/ml/predictions/rank/{wallet}")
+async def get_wallet_rank(
+    wallet: str,
+    method: str = Query(default="ensemble", pattern="^(champion|ensemble)$"),
+    snapshot: Snapshot = Depends(pinned_snapshot)
+):
+    """Get a wallet's churn risk rank, overall and within each game it plays"""
+    try:
+        if not snapshot.champion:
+            raise HTTPException(status_code=503, detail="ML models not trained yet")
+        
+        cached_predictions = snapshot.predictions.get(method)
+        
+        if cached_predictions is None or cached_predictions.empty:
+            raise HTTPException(status_code=503, detail="No predictions available")
+        
+        index = snapshot.prediction_index(method)
+        positions = index.wallet_positions(wallet)
+        if len(positions) == 0:
+            raise HTTPException(status_code=404, detail=f"No predictions for wallet {wallet}")
+        
+        rows = cached_predictions.iloc[positions]
+        total_users = len(cached_predictions)
+        ranks = []
+        for position, project, probability, risk in zip(positions, rows['project'], rows['churn_probability'], rows['churn_risk']):
+            ranks.append({
+                'project': project,
+                'churn_probability': safe_float(probability),
+                'churn_risk': risk,
+                'rank': int(index.rank[position]),
+                'project_rank': int(index.project_rank[position]),
+                'project_users': len(index.project_rankings[str(project)]),
+                'percentile': round(100.0 * (1 - (index.rank[position] - 1) / total_users), 2)
+            })
+        
+        return {
+            "prediction_type": "wallet_rank",
+            "method": method,
+            "wallet": wallet,
+            "total_users": total_users,
+            "ranks": ranks
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in wallet rank endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _lookup_wallets(wallets: List[str], snapshot: Snapshot) -> Dict[str, Dict]:
+    """
+    Collect per-project features and champion/ensemble scores plus high-retention
+    rows for each wallet, through the hash indexes of each cached frame
+    """
+    results = {wallet: {'wallet': wallet, 'projects': {}, 'retention': []} for wallet in wallets}
+    
+    def gather(index_lookup) -> tuple:
+        owners, positions = [], []
+        for wallet in wallets:
+            found = index_lookup(wallet)
+            owners.extend([wallet] * len(found))
+            positions.append(found)
+        return owners, np.concatenate(positions)
+    
+    for method in ['ensemble', 'champion']:
+        cached_predictions = snapshot.predictions.get(method)
+        if cached_predictions is None or cached_predictions.empty:
+            continue
+        
+        index = snapshot.prediction_index(method)
+        owners, positions = gather(index.wallet_positions)
+        rows = records_for_json(cached_predictions.iloc[positions])
+        for wallet, position, row in zip(owners, positions, rows):
+            row.pop('user_wallet', None)
+            project = row.pop('project')
+            score = {
+                'churn_probability': row.pop('churn_probability'),
+                'churn_risk': row.pop('churn_risk'),
+                'rank': int(index.rank[position]),
+                'project_rank': int(index.project_rank[position])
+            }
+            entry = results[wallet]['projects'].setdefault(project, {'project': project, 'features': row, 'scores': {}})
+            entry['scores'][method] = score
+    
+    retention_df, retention_index, _ = await _get_indexed_dataset('high_retention_users')
+    if 'user' in retention_df.columns:
+        owners, positions = gather(lambda wallet: retention_index.lookup('user', wallet))
+        rows = records_for_json(retention_df.iloc[positions])
+        for wallet, row in zip(owners, rows):
+            results[wallet]['retention'].append(row)
+    
+    for result in results.values():
+        result['projects'] = list(result['projects'].values())
+        result['found'] = bool(result['projects'] or result['retention'])
+    return results
+
+@app.get("/api/ml/predictions/wallet/{address}")
+async def get_wallet_prediction(address: str, snapshot: Snapshot = Depends(pinned_snapshot)):
+    """Get one wallet's per-game churn scores, features and retention status"""
+    try:
+        if not snapshot.champion:
+            raise HTTPException(status_code=503, detail="ML models not trained yet")
+        
+        result = (await _lookup_wallets([address], snapshot))[address]
+        if not result['found']:
+            raise HTTPException(status_code=404, detail=f"No predictions or retention data for wallet {address}")
+        
+        return {
+            "prediction_type": "wallet_churn",
+            **result,
+            "model_info": {
+                "champion": snapshot.champion['name'],
+                "roc_auc": safe_float(snapshot.champion['roc_auc'])
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in wallet prediction endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/ml/predictions/wallets")
+async def get_wallet_predictions(request: WalletBatchRequest, snapshot: Snapshot = Depends(pinned_snapshot)):
+    """Batch variant of /api/ml/predictions/wallet/{address} for up to 1000 wallets"""
+    try:
+        if not snapshot.champion:
+            raise HTTPException(status_code=503, detail="ML models not trained yet")
+        
+        wallets = list(dict.fromkeys(request.wallets))
+        results = await _lookup_wallets(wallets, snapshot)
+        
+        return {
+            "prediction_type": "wallet_churn_batch",
+            "requested": len(wallets),
+            "found": sum(1 for result in results.values() if result['found']),
+            "wallets": [results[wallet] for wallet in wallets],
+            "model_info": {
+                "champion": snapshot.champion['name'],
+                "roc_auc": safe_float(snapshot.champion['roc_auc'])
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in wallet batch prediction endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ScoringBatcher:
+    """
+    Coalesces concurrent /api/ml/score requests into one feature-kernel pass and
+    one model call per method. A single worker task drains the queue, waiting at
+    most score_batch_wait_ms for more requests (or until score_batch_max_rows),
+    scores the batch in a thread and hands each caller its slice
+    """
+    
+    def __init__(self):
+        self.latencies_ms = deque(maxlen=5000)
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+    
+    async def score(self, kind: str, payload: Any, as_of: Optional[pd.Timestamp], rows: int, method: str) -> tuple:
+        """
+        Queue one request (see _parse_score_request) and wait for its
+        (wallets, projects, probabilities)
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        
+        future = loop.create_future()
+        await self._queue.put((kind, payload, as_of, rows, method, future))
+        return await future
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        max_wait = config.score_batch_wait_ms / 1000
+        while True:
+            batch = [await self._queue.get()]
+            rows = batch[0][3]
+            deadline = loop.time() + max_wait
+            
+            while rows < config.score_batch_max_rows:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                batch.append(item)
+                rows += item[3]
+            
+            await self._score_batch(batch)
+    
+    async def _score_batch(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        self.batches += 1
+        
+        for method in {item[4] for item in batch}:
+            items = [item for item in batch if item[4] == method and not item[5].done()]
+            if not items:
+                continue
+            
+            try:
+                results = await loop.run_in_executor(None, _score_items, items, method)
+            except Exception as e:
+                for item in items:
+                    if not item[5].done():
+                        item[5].set_exception(e)
+                continue
+            
+            for item, result in zip(items, results):
+                self.rows += len(result[2])
+                if not item[5].done():
+                    item[5].set_result(result)
+    
+    def record(self, latency_ms: float):
+        self.requests += 1
+        self.latencies_ms.append(latency_ms)
+    
+    def stats(self) -> Dict:
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else None
+        p50 = float(np.percentile(latencies, 50)) if latencies is not None else None
+        p99 = float(np.percentile(latencies, 99)) if latencies is not None else None
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'rows_scored': self.rows,
+            'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else None,
+            'p50_ms': p50,
+            'p99_ms': p99,
+            'p50_target_ms': config.score_p50_target_ms,
+            'p99_target_ms': config.score_p99_target_ms,
+            'within_targets': (
+                p50 <= config.score_p50_target_ms and p99 <= config.score_p99_target_ms
+                if latencies is not None else None
+            ),
+            'max_batch_rows': config.score_batch_max_rows,
+            'max_wait_ms': config.score_batch_wait_ms
+        }
+    
+    async def stop(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+
+scoring_batcher = ScoringBatcher()
+
+def _score_items(items: List[tuple], method: str) -> List[tuple]:
+    """
+    Score every queued request in one feature-kernel pass and one model call
+    Returns (wallets, projects, probabilities) per request, in queue order
+    """
+    wallets, projects, matrices, owners = [], [], [], []
+    
+    activity = [(i, item[1], item[2]) for i, item in enumerate(items) if item[0] == 'activity']
+    if activity:
+        columns = {'user_wallet': [], 'project': [], 'day': [], 'daily_transactions': []}
+        request_ids = []
+        for i, rows, _ in activity:
+            for name in columns:
+                columns[name].extend(rows[name])
+            request_ids.extend([i] * len(rows['day']))
+        combined = pd.DataFrame(columns)
+        combined['score_request'] = request_ids
+        
+        # Parse each distinct day string once; every date is normalised to UTC so
+        # requests sent with and without a timezone share one kernel pass
+        codes, unique_days = pd.factorize(combined['day'])
+        parsed = pd.to_datetime(pd.Series(unique_days), utc=True, format='mixed', errors='coerce')
+        combined['activity_date'] = parsed.array.take(codes)
+        combined = combined[combined['activity_date'].notna()]
+        
+        as_of = pd.Series({i: ts for i, _, ts in activity if ts is not None}, dtype='datetime64[ns, UTC]')
+        features = feature_service.create_prediction_features_batch(combined, 'score_request', as_of)
+        wallets.extend(features['user_wallet'])
+        projects.extend(features['project'])
+        matrices.append(features[ml_manager.feature_columns].to_numpy(dtype=float))
+        owners.append(features['score_request'].to_numpy())
+    
+    for i, item in enumerate(items):
+        if item[0] == 'features':
+            item_wallets, item_projects, matrix = item[1]
+            wallets.extend(item_wallets)
+            projects.extend(item_projects)
+            matrices.append(matrix)
+            owners.append(np.full(len(matrix), i))
+    
+    owners = np.concatenate(owners) if owners else np.empty(0, dtype=int)
+    probabilities = np.empty(0)
+    if len(owners):
+        X = pd.DataFrame(np.vstack(matrices), columns=ml_manager.feature_columns)
+        predict = ml_manager.predict_ensemble if method == 'ensemble' else ml_manager.predict_champion
+        probabilities = predict(X)
+    
+    # Split back per request with one stable sort instead of per-request frames
+    order = np.argsort(owners, kind='stable')
+    bounds = np.searchsorted(owners[order], np.arange(len(items) + 1))
+    wallets = np.asarray(wallets, dtype=object)[order]
+    projects = np.asarray(projects, dtype=object)[order]
+    probabilities = probabilities[order]
+    return [
+        (wallets[lo:hi].tolist(), projects[lo:hi].tolist(), probabilities[lo:hi])
+        for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+
+def _parse_score_request(request: ScoreRequest) -> tuple:
+    """
+    Validate a score request into (kind, payload, as_of, row count) for the batcher
+    - activity payload: column lists; dates are parsed once per batch
+    - features payload: (wallets, projects, feature matrix)
+    """
+    if bool(request.activity) == bool(request.features):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'activity' or 'features'")
+    
+    if request.features:
+        matrix = []
+        for row in request.features:
+            missing = [c for c in ml_manager.feature_columns if c not in row.features]
+            if missing:
+                raise HTTPException(status_code=400, detail=f"Missing features for {row.user_wallet}/{row.project}: {missing}")
+            matrix.append([row.features[c] for c in ml_manager.feature_columns])
+        payload = (
+            [row.user_wallet for row in request.features],
+            [row.project for row in request.features],
+            np.array(matrix, dtype=float)
+        )
+        return 'features', payload, None, len(matrix)
+    
+    as_of = None
+    if request.as_of:
+        try:
+            as_of = pd.Timestamp(request.as_of)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid as_of: {e}")
+        as_of = as_of.tz_localize('UTC') if as_of.tzinfo is None else as_of.tz_convert('UTC')
+    
+    payload = {
+        'user_wallet': [row.user_wallet for row in request.activity],
+        'project': [row.project for row in request.activity],
+        'day': [row.day for row in request.activity],
+        'daily_transactions': [row.number_of_transactions for row in request.activity]
+    }
+    return 'activity', payload, as_of, len(request.activity)
+
+@app.post("/api/ml/score")
+async def score_activity(request: ScoreRequest):
+    """
+    Score caller-supplied activity with the live models
+    - activity: raw daily rows (user_wallet, project, day, number_of_transactions);
+      pairs with fewer than 5 dated rows cannot be scored and are listed in 'unscored'
+    - features: precomputed feature vectors (all of ml_manager.feature_columns)
+    - as_of: reference date for activity features (defaults to the latest day sent)
+    Concurrent requests are micro-batched into one model call
+    """
+    start = time.perf_counter()
+    try:
+        if not ml_manager.champion or not ml_manager.scaler:
+            raise HTTPException(status_code=503, detail="ML models not trained yet")
+        if request.method == 'ensemble' and not ml_manager.top_3_ensemble:
+            raise HTTPException(status_code=503, detail="Ensemble not available until the next training run. Use method 'champion'.")
+        
+        kind, payload, as_of, rows = _parse_score_request(request)
+        wallets, projects, probabilities = await scoring_batcher.score(kind, payload, as_of, rows, request.method)
+        
+        scores = [
+            {'user_wallet': wallet, 'project': project, 'churn_probability': safe_float(probability)}
+            for wallet, project, probability in zip(wallets, projects, probabilities)
+        ]
+        unscored = []
+        if kind == 'activity':
+            scored = set(zip(wallets, projects))
+            unscored = [
+                {'user_wallet': wallet, 'project': project}
+                for wallet, project in dict.fromkeys(zip(payload['user_wallet'], payload['project']))
+                if (wallet, project) not in scored
+            ]
+        
+        latency_ms = (time.perf_counter() - start) * 1000
+        scoring_batcher.record(latency_ms)
+        return {
+            "prediction_type": "churn_risk_14_days",
+            "method": request.method,
+            "scores": scores,
+            "unscored": unscored,
+            "latency_ms": round(latency_ms, 2),
+            "model_info": {
+                "champion": ml_manager.champion['name'],
+                "ensemble_models": [m['name'] for m in ml_manager.top_3_ensemble] if request.method == 'ensemble' else None
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in scoring endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/ml/score/stats")
+async def get_scoring_stats():
+    """Micro-batching and latency statistics of /api/ml/score against the p50/p99 targets"""
+    return scoring_batcher.stats()
+
 @app.get("/api/ml/models/leaderboard")
-async def get_model_leaderboard():
+async def get_model_leaderboard(snapshot: Snapshot = Depends(pinned_snapshot)):
     """Get current model rankings"""
     try:
-        if not ml_manager.all_models:
+        if not snapshot.all_models:
             return {
                 "message": "No models trained yet",
                 "leaderboard": []
@@ -1220,10 +4015,15 @@ async def get_model_leaderboard():
                 "precision": safe_float(m['precision']),
                 "recall": safe_float(m['recall']),
                 "training_time_seconds": round(m['training_time'], 2),
+                "cpu_seconds": round(m['cpu_seconds'], 2) if 'cpu_seconds' in m else None,
+                "peak_memory_mb": round(m['peak_memory_mb'], 1) if 'peak_memory_mb' in m else None,
+                "cores": m.get('cores'),
+                "rounds": m.get('rounds'),
+                "training": m.get('training', 'full'),
                 "is_champion": (i == 0),
                 "in_ensemble": (i < 3)
             }
-            for i, m in enumerate(ml_manager.all_models)
+            for i, m in enumerate(snapshot.all_models)
         ]
         
         return {
@@ -1238,10 +4038,10 @@ async def get_model_leaderboard():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/ml/models/info")
-async def get_model_info():
+async def get_model_info(snapshot: Snapshot = Depends(pinned_snapshot)):
     """Get detailed information about current ML models"""
     try:
-        if not ml_manager.champion:
+        if not snapshot.champion:
             return {
                 "status": "not_trained",
                 "message": "Models not trained yet. Trigger /api/cache/refresh to train models."
@@ -1250,14 +4050,15 @@ async def get_model_info():
         return {
             "status": "trained",
             "champion": {
-                "name": ml_manager.champion['name'],
-                "roc_auc": safe_float(ml_manager.champion['roc_auc']),
-                "accuracy": safe_float(ml_manager.champion.get('accuracy', 0)),
-                "trained_at": ml_manager.champion.get('timestamp', 'Unknown')
+                "name": snapshot.champion['name'],
+                "roc_auc": safe_float(snapshot.champion['roc_auc']),
+                "accuracy": safe_float(snapshot.champion.get('accuracy', 0)),
+                "trained_at": snapshot.champion.get('timestamp', 'Unknown')
             },
+            "snapshot": snapshot.generation,
             "ensemble": {
-                "models": [m['name'] for m in ml_manager.top_3_ensemble],
-                "size": len(ml_manager.top_3_ensemble)
+                "models": [m['name'] for m in snapshot.top_3_ensemble],
+                "size": len(snapshot.top_3_ensemble)
             },
             "features": ml_manager.feature_columns,
             "prediction_window_days": config.prediction_window_days
@@ -1276,18 +4077,25 @@ async def get_cache_status():
         status = {
             "cache_directory": cache_manager.cache_dir,
             "cache_duration_hours": config.cache_duration / 3600,
+            "max_stale_hours": config.cache_max_stale / 3600,
+            "stale_if_error_hours": config.cache_stale_if_error / 3600,
             "total_sources": len(config.dune_queries),
+            "memory_cache": cache_manager.memory_cache.stats(),
             "sources": {}
         }
         
         for query_key in config.dune_queries.keys():
             age = cache_manager._get_cache_age(query_key)
+            ttl_hours = cache_manager.ttl_for(query_key) / 3600
             status['sources'][query_key] = {
                 "type": "Dune Analytics",
                 "query_id": config.dune_queries[query_key],
+                "ttl_hours": ttl_hours,
                 "cache_age_hours": round(age, 2) if age != float('inf') else None,
                 "is_cached": age != float('inf'),
-                "is_fresh": age < (config.cache_duration / 3600) if age != float('inf') else False,
+                "is_fresh": age < ttl_hours,
+                "is_stale": age != float('inf') and age >= ttl_hours,
+                "revalidating": query_key in cache_manager._in_flight,
                 "last_updated": cache_manager.metadata.get(query_key, {}).get('last_updated', 'Never'),
                 "row_count": cache_manager.metadata.get(query_key, {}).get('row_count', 0)
             }
@@ -1315,21 +4123,19 @@ async def clear_cache(request: Request):
             os.makedirs(cache_manager.cache_dir)
             logger.info("✓ Cleared data cache")
         
-        # Clear ML models
-        if os.path.exists(ml_manager.models_dir):
-            shutil.rmtree(ml_manager.models_dir)
-            os.makedirs(ml_manager.models_dir)
-            logger.info("✓ Cleared ML models")
+        # Clear ML models and predictions (every snapshot generation)
+        snapshot_store.clear()
+        logger.info("✓ Cleared ML models")
         
         # Reset metadata
+        cache_manager.memory_cache.clear()
+        response_cache.clear()
         cache_manager.metadata = {}
         cache_manager._save_metadata()
         
         # Reset ML manager state
-        ml_manager.champion = None
-        ml_manager.top_3_ensemble = []
-        ml_manager.all_models = []
-        ml_manager.scaler = None
+        ml_manager.model_history = []
+        ml_manager.incremental_updates = 0
         
         logger.info("=" * 60)
         logger.info("CACHE AND MODELS CLEARED SUCCESSFULLY")
@@ -1350,86 +4156,85 @@ async def clear_cache(request: Request):
         logger.error(f"Error clearing cache: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/cache/refresh")
-async def force_refresh_and_train(request: Request):
+async def run_refresh_pipeline(job_id: str, full_retrain: bool = False) -> Dict:
     """
-    Force refresh all data and retrain ML models
-    Called by GitHub Actions after Dune queries are refreshed
+    Refresh all data and retrain ML models (runs as a background job)
+    Feature engineering and training run in the refresh process pool, so the
+    event loop keeps serving the previous snapshot until the new one is written
     """
-    if config.api_secret:
-        provided_secret = request.headers.get("X-API-Secret")
-        if provided_secret != config.api_secret:
-            raise HTTPException(status_code=401, detail="Unauthorized")
-
-    try:
-        logger.info("=" * 60)
-        logger.info("FORCE REFRESH TRIGGERED")
-        logger.info("=" * 60)
-        
-        # ROTATE API KEY BEFORE FETCHING DATA
-        cache_manager._rotate_api_key()
-        
-        start_time = time.time()
-        
-        # Step 1: Fetch all data
-        logger.info("Step 1: Fetching data from Dune...")
-        query_results = {}
-        
-        for query_name in config.dune_queries.keys():
-            try:
-                df = await cache_manager.fetch_dune_raw(query_name)
-                query_results[query_name] = df
-                logger.info(f"  ✓ {query_name}: {len(df)} rows")
-            except Exception as e:
-                logger.error(f"  ✗ {query_name}: {e}")
-                query_results[query_name] = pd.DataFrame()
-        
-        successful_queries = sum(1 for df in query_results.values() if not df.empty)
-
-        logger.info("=" * 60)
-        logger.info("DEBUG: Checking user_daily_activity data structure")
-        if 'user_daily_activity' in query_results:
-            uda = query_results['user_daily_activity']
-            logger.info(f"📊 Data fetched: {len(uda)} rows")
-            logger.info(f"📊 Columns received: {list(uda.columns)}")
-            logger.info(f"📊 Data types: {uda.dtypes.to_dict()}")
-            if len(uda) > 0:
-                logger.info(f"📊 First 3 rows sample:")
-                logger.info(f"{uda.head(3).to_string()}")
+    logger.info("=" * 60)
+    logger.info(f"FORCE REFRESH TRIGGERED (job {job_id})")
+    logger.info("=" * 60)
+    
+    # ROTATE API KEY BEFORE FETCHING DATA
+    cache_manager._rotate_api_key()
+    
+    start_time = time.time()
+    
+    # Step 1: Fetch all data (concurrently, spread across API keys)
+    logger.info("Step 1: Fetching data from Dune...")
+    refresh_jobs.enter_stage(job_id, 'fetch_sources')
+    query_results, source_timings = await cache_manager.fetch_all_sources(list(config.dune_queries.keys()), block_on_stale=True)
+    
+    for query_name, timing in source_timings.items():
+        if timing['status'] == 'failed':
+            logger.error(f"  ✗ {query_name}: {timing.get('error')}")
         else:
-            logger.warning("❌ user_daily_activity NOT in query_results!")
-        logger.info("=" * 60)
-        
-        # Step 2: Prepare ML data
-        logger.info("Step 2: Preparing ML training data...")
+            logger.info(f"  ✓ {query_name}: {timing['rows']} rows in {timing['seconds']}s")
+    
+    successful_queries = sum(1 for df in query_results.values() if not df.empty)
+
+    logger.info("=" * 60)
+    logger.info("DEBUG: Checking user_daily_activity data structure")
+    if 'user_daily_activity' in query_results:
+        uda = query_results['user_daily_activity']
+        logger.info(f"📊 Data fetched: {len(uda)} rows")
+        logger.info(f"📊 Columns received: {list(uda.columns)}")
+        logger.info(f"📊 Data types: {uda.dtypes.to_dict()}")
+        if len(uda) > 0:
+            logger.info(f"📊 First 3 rows sample:")
+            logger.info(f"{uda.head(3).to_string()}")
+    else:
+        logger.warning("❌ user_daily_activity NOT in query_results!")
+    logger.info("=" * 60)
+    
+    # Step 2: Prepare ML data
+    logger.info("Step 2: Preparing ML training data...")
 
-        # Fetch paginated user activity data
-        logger.info("Fetching paginated user daily activity...")
-        daily_activity = await cache_manager.fetch_user_daily_activity_paginated()
+    # Fetch paginated user activity data
+    logger.info("Fetching paginated user daily activity...")
+    refresh_jobs.enter_stage(job_id, 'fetch_user_activity')
+    daily_activity = await cache_manager.fetch_user_daily_activity_paginated(compact=True, block_on_stale=True)
 
-        # Fallback to old queries if paginated fetch fails
+    # Fallback to old queries if paginated fetch fails
+    if daily_activity is None or daily_activity.empty:
+        logger.warning("Paginated fetch failed, trying fallback queries...")
+        daily_activity = query_results.get('user_daily_activity')
         if daily_activity is None or daily_activity.empty:
-            logger.warning("Paginated fetch failed, trying fallback queries...")
-            daily_activity = query_results.get('user_daily_activity')
-            if daily_activity is None or daily_activity.empty:
-                daily_activity = query_results.get('daily_gaming_activity')
+            daily_activity = query_results.get('daily_gaming_activity')
+        if daily_activity is not None:
+            # Cached frames are shared with the memory cache - normalise a copy
+            daily_activity = daily_activity.copy()
 
-        if daily_activity is None or daily_activity.empty:
-            return {
-                "status": "partial_success",
-                "message": "Data refreshed but ML training skipped - no user activity data available",
-                "data_refreshed": successful_queries,
-                "models_trained": 0
-            }
+    if daily_activity is None or daily_activity.empty:
+        return {
+            "status": "partial_success",
+            "message": "Data refreshed but ML training skipped - no user activity data available",
+            "data_refreshed": successful_queries,
+            "models_trained": 0
+        }
 
+    refresh_jobs.enter_stage(job_id, 'prepare_data')
+    if ActivityEncoder.is_compact(daily_activity):
+        logger.info(
+            f"📊 Compact activity: {len(daily_activity):,} rows, "
+            f"{daily_activity.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB"
+        )
+    else:
         logger.info(f"📊 Raw data columns: {list(daily_activity.columns)}")
 
-        # Clean data - Handle date column first
-        if 'day' in daily_activity.columns:
-            daily_activity['activity_date'] = pd.to_datetime(daily_activity['day'])
-        elif 'activity_date' in daily_activity.columns:
-            daily_activity['activity_date'] = pd.to_datetime(daily_activity['activity_date'])
-        else:
+        # Clean data - Handle date column first (parsed by ActivityEncoder)
+        if 'day' not in daily_activity.columns and 'activity_date' not in daily_activity.columns:
             logger.error(f"No date column found. Available: {list(daily_activity.columns)}")
             return {
                 "status": "error",
@@ -1466,7 +4271,7 @@ async def force_refresh_and_train(request: Request):
                 daily_activity['daily_transactions'] = 1
 
         # Ensure required columns exist after normalization
-        required_columns = ['activity_date', 'user_wallet', 'project', 'daily_transactions']
+        required_columns = ['user_wallet', 'project', 'daily_transactions']
         missing_columns = [col for col in required_columns if col not in daily_activity.columns]
 
         if missing_columns:
@@ -1478,95 +4283,245 @@ async def force_refresh_and_train(request: Request):
 
         logger.info(f"✓ Normalized columns: {list(daily_activity.columns)}")
 
-        # Type conversions
-        daily_activity['user_wallet'] = daily_activity['user_wallet'].astype(str)
-        daily_activity['project'] = daily_activity['project'].astype(str)
-        daily_activity['daily_transactions'] = pd.to_numeric(daily_activity['daily_transactions'], errors='coerce').fillna(1)
-        
-        # Create training dataset
-        training_df = feature_service.create_training_dataset(daily_activity)
-        
-        if len(training_df) < config.min_training_samples:
-            return {
-                "status": "partial_success",
-                "message": f"Insufficient training samples ({len(training_df)} < {config.min_training_samples})",
-                "data_refreshed": successful_queries,
-                "models_trained": 0
-            }
-        
-        # Step 3: Train models
-        logger.info("Step 3: Training ML models...")
-        ml_results = ml_manager.train_and_evaluate_all(training_df)
-        
-        # Step 4: Generate predictions
-        logger.info("Step 4: Generating predictions...")
-        prediction_df = feature_service.create_prediction_features(daily_activity)
-        
-        if not prediction_df.empty:
-            # Champion predictions with DYNAMIC thresholds
-            champion_pred = ml_manager.predict_champion(prediction_df)
-            prediction_df_champion = prediction_df.copy()
-            prediction_df_champion['churn_probability'] = champion_pred
+        # Same compact schema as the paginated fetch: category codes, day numbers, downcast counts
+        daily_activity = ActivityEncoder().compact(daily_activity)
+    
+    # Create training dataset: reloaded from the feature store when this exact activity was
+    # seen before, otherwise built (only users with new activity in incremental mode) and stored
+    refresh_jobs.enter_stage(job_id, 'feature_engineering')
+    loop = asyncio.get_event_loop()
+    incremental = config.training_mode == 'incremental' and not full_retrain
+    reference_df = feature_service.training_cache if incremental else None
+    activity_key = await loop.run_in_executor(None, feature_store.activity_key, daily_activity)
+    feature_cache = await loop.run_in_executor(None, feature_store.load, 'training', activity_key)
+    features_reused = feature_cache is not None
+    
+    if features_reused:
+        logger.info(f"✓ Activity unchanged ({activity_key}) - reusing stored training features")
+        training_df = feature_service.training_frame(feature_cache)
+        delta_df = feature_service.changed_training_rows(feature_cache, reference_df)
+    else:
+        training_df, feature_cache, delta_df = await refresh_jobs.run_cpu(
+            _build_training_dataset, daily_activity, reference_df
+        )
+        await loop.run_in_executor(None, feature_store.save, 'training', activity_key, feature_cache)
+    
+    if len(training_df) < config.min_training_samples:
+        return {
+            "status": "partial_success",
+            "message": f"Insufficient training samples ({len(training_df)} < {config.min_training_samples})",
+            "data_refreshed": successful_queries,
+            "models_trained": 0
+        }
+    
+    # Step 3: Train models
+    logger.info("Step 3: Training ML models...")
+    refresh_jobs.enter_stage(job_id, 'training')
+    reason = (
+        ml_manager.full_retrain_reason(reference_df, training_df, delta_df)
+        if incremental else "full retrain requested"
+    )
+    training_mode = 'full'
+    if reason is None and len(delta_df) < config.min_training_samples:
+        training_mode = 'unchanged'
+        ml_results = ml_manager.all_models
+        logger.info(f"✓ Only {len(delta_df)} changed samples - keeping the current models")
+    elif reason is None:
+        try:
+            ml_results, scaler, split = await refresh_jobs.run_cpu(
+                _update_candidate_models, delta_df, training_df, ml_manager.all_models, ml_manager.scaler,
+                snapshot_store.current.split
+            )
+            training_mode = 'incremental'
+        except ValueError as e:
+            reason = f"incremental update failed ({e})"
+    if training_mode == 'full':
+        logger.info(f"🔄 Full retrain: {reason}")
+        ml_results, scaler, split = await refresh_jobs.run_cpu(_fit_candidate_models, training_df)
+    if training_mode == 'unchanged':
+        current = snapshot_store.current
+        snapshot = Snapshot(current.scaler, current.all_models, metadata=current.metadata, split=current.split)
+    else:
+        snapshot = ml_manager.snapshot_results(ml_results, scaler, training_mode, split)
+    
+    # Step 4: Generate predictions
+    logger.info("Step 4: Generating predictions...")
+    refresh_jobs.enter_stage(job_id, 'predictions')
+    prediction_df = await loop.run_in_executor(
+        None, feature_store.load, 'prediction', activity_key,
+        ml_manager.feature_columns + ['user_wallet', 'project']
+    )
+    if prediction_df is None:
+        prediction_df = await refresh_jobs.run_cpu(_build_prediction_features, daily_activity)
+        await loop.run_in_executor(None, feature_store.save, 'prediction', activity_key, prediction_df)
+    
+    # Models and the predictions scored with them go live together, in one generation
+    refresh_jobs.enter_stage(job_id, 'publish')
+    if not prediction_df.empty:
+        snapshot.predictions = await loop.run_in_executor(None, _score_predictions, prediction_df, snapshot)
+        # Rankings are built before the swap, so no reader waits for them
+        for method in snapshot.predictions:
+            await loop.run_in_executor(None, snapshot.prediction_index, method)
+    snapshot = await loop.run_in_executor(None, snapshot_store.publish, snapshot)
+    # The models now live were fitted on these features: the next incremental refresh diffs against them
+    feature_service.training_cache = feature_cache
+    if training_mode != 'unchanged':
+        ml_manager.record_published(snapshot)
+    
+    elapsed_time = time.time() - start_time
+    
+    logger.info("=" * 60)
+    logger.info(f"REFRESH COMPLETE in {elapsed_time:.1f}s")
+    logger.info(f"Champion: {ml_manager.champion['name']}")
+    logger.info(f"ROC-AUC: {ml_manager.champion['roc_auc']:.4f}")
+    logger.info("=" * 60)
+    
+    return {
+        "status": "success",
+        "message": "Data refreshed and ML models trained successfully",
+        "timestamp": datetime.now().isoformat(),
+        "elapsed_time_seconds": round(elapsed_time, 2),
+        "data_refreshed": successful_queries,
+        "total_queries": len(config.dune_queries),
+        "models_trained": len(ml_results) if training_mode != 'unchanged' else 0,
+        "champion_model": ml_manager.champion['name'],
+        "champion_roc_auc": safe_float(ml_manager.champion['roc_auc']),
+        "champion_accuracy": safe_float(ml_manager.champion.get('accuracy', 0)),
+        "top_3_ensemble": [m['name'] for m in ml_manager.top_3_ensemble],
+        "training_samples": len(training_df),
+        "training_mode": training_mode,
+        "full_retrain_reason": reason if training_mode == 'full' else None,
+        "changed_samples": len(delta_df),
+        "feature_artefact": activity_key,
+        "features_reused": features_reused,
+        "predictions_generated": len(prediction_df) if not prediction_df.empty else 0,
+        "snapshot": snapshot.generation,
+        "source_timings": source_timings,
+        "user_activity_pages": cache_manager.last_page_fetch_report,
+        "warning": "ROC-AUC is null because training data has only 1 class" if ml_manager.champion and np.isnan(ml_manager.champion['roc_auc']) else None
+    }
 
-            # Calculate percentile-based thresholds (ensures meaningful distribution)
-            p85 = np.percentile(champion_pred, 85)  # Top 15% = High risk
-            p50 = np.percentile(champion_pred, 50)  # Middle = Medium risk
-            high_threshold = max(0.5, min(0.8, p85))
-            medium_threshold = max(0.2, min(0.5, p50))
+def _score_predictions(prediction_df: pd.DataFrame, snapshot: Snapshot) -> Dict[str, pd.DataFrame]:
+    """Score prediction features with the models of snapshot into champion/ensemble frames"""
+    # Champion predictions with DYNAMIC thresholds
+    champion_pred = ml_manager.predict_champion(prediction_df, snapshot)
+    prediction_df_champion = prediction_df.copy()
+    prediction_df_champion['churn_probability'] = champion_pred
 
-            logger.info(f"📊 Champion Thresholds: High>{high_threshold:.2f}, Medium>{medium_threshold:.2f}")
+    # Calculate percentile-based thresholds (ensures meaningful distribution)
+    p85 = np.percentile(champion_pred, 85)  # Top 15% = High risk
+    p50 = np.percentile(champion_pred, 50)  # Middle = Medium risk
+    high_threshold = max(0.5, min(0.8, p85))
+    medium_threshold = max(0.2, min(0.5, p50))
 
-            prediction_df_champion['churn_risk'] = prediction_df_champion['churn_probability'].apply(
-                lambda x: 'High' if x > high_threshold else ('Medium' if x > medium_threshold else 'Low')
-            )
-            cache_manager.cache_data('predictions_champion', prediction_df_champion)
+    logger.info(f"📊 Champion Thresholds: High>{high_threshold:.2f}, Medium>{medium_threshold:.2f}")
+
+    prediction_df_champion['churn_risk'] = prediction_df_champion['churn_probability'].apply(
+        lambda x: 'High' if x > high_threshold else ('Medium' if x > medium_threshold else 'Low')
+    )
+    prediction_df_champion.attrs['aggregates'] = dumps_json(summarize_predictions(prediction_df_champion))
 
-            # Ensemble predictions with DYNAMIC thresholds
-            ensemble_pred = ml_manager.predict_ensemble(prediction_df)
-            prediction_df_ensemble = prediction_df.copy()
-            prediction_df_ensemble['churn_probability'] = ensemble_pred
+    # Ensemble predictions with DYNAMIC thresholds
+    ensemble_pred = ml_manager.predict_ensemble(prediction_df, snapshot)
+    prediction_df_ensemble = prediction_df.copy()
+    prediction_df_ensemble['churn_probability'] = ensemble_pred
 
-            # Calculate percentile-based thresholds for ensemble too
-            p85_ens = np.percentile(ensemble_pred, 85)
-            p50_ens = np.percentile(ensemble_pred, 50)
-            high_threshold_ens = max(0.5, min(0.8, p85_ens))
-            medium_threshold_ens = max(0.2, min(0.5, p50_ens))
+    # Calculate percentile-based thresholds for ensemble too
+    p85_ens = np.percentile(ensemble_pred, 85)
+    p50_ens = np.percentile(ensemble_pred, 50)
+    high_threshold_ens = max(0.5, min(0.8, p85_ens))
+    medium_threshold_ens = max(0.2, min(0.5, p50_ens))
 
-            logger.info(f"📊 Ensemble Thresholds: High>{high_threshold_ens:.2f}, Medium>{medium_threshold_ens:.2f}")
+    logger.info(f"📊 Ensemble Thresholds: High>{high_threshold_ens:.2f}, Medium>{medium_threshold_ens:.2f}")
 
-            prediction_df_ensemble['churn_risk'] = prediction_df_ensemble['churn_probability'].apply(
-                lambda x: 'High' if x > high_threshold_ens else ('Medium' if x > medium_threshold_ens else 'Low')
-            )
-            cache_manager.cache_data('predictions_ensemble', prediction_df_ensemble)
-        
-        elapsed_time = time.time() - start_time
-        
-        logger.info("=" * 60)
-        logger.info(f"REFRESH COMPLETE in {elapsed_time:.1f}s")
-        logger.info(f"Champion: {ml_manager.champion['name']}")
-        logger.info(f"ROC-AUC: {ml_manager.champion['roc_auc']:.4f}")
-        logger.info("=" * 60)
-        
-        return {
-            "status": "success",
-            "message": "Data refreshed and ML models trained successfully",
-            "timestamp": datetime.now().isoformat(),
-            "elapsed_time_seconds": round(elapsed_time, 2),
-            "data_refreshed": successful_queries,
-            "total_queries": len(config.dune_queries),
-            "models_trained": len(ml_results),
-            "champion_model": ml_manager.champion['name'],
-            "champion_roc_auc": safe_float(ml_manager.champion['roc_auc']),
-            "champion_accuracy": safe_float(ml_manager.champion.get('accuracy', 0)),
-            "top_3_ensemble": [m['name'] for m in ml_manager.top_3_ensemble],
-            "training_samples": len(training_df),
-            "predictions_generated": len(prediction_df) if not prediction_df.empty else 0,
-            "warning": "ROC-AUC is null because training data has only 1 class" if ml_manager.champion and np.isnan(ml_manager.champion['roc_auc']) else None
-        }
-        
-    except Exception as e:
-        logger.error(f"Error in force refresh: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+    prediction_df_ensemble['churn_risk'] = prediction_df_ensemble['churn_probability'].apply(
+        lambda x: 'High' if x > high_threshold_ens else ('Medium' if x > medium_threshold_ens else 'Low')
+    )
+    prediction_df_ensemble.attrs['aggregates'] = dumps_json(summarize_predictions(prediction_df_ensemble))
+    return {'champion': prediction_df_champion, 'ensemble': prediction_df_ensemble}
+
+def summarize_predictions(predictions: pd.DataFrame) -> Dict:
+    """
+    Aggregates served by the prediction endpoints, computed once per write and
+    stored as JSON bytes in the cached frame's attrs
+    - summary: totals, per-risk counts and mean probability
+    - by_game: per-project counts, mean probability and risk counts
+    pandas deep copies attrs into every derived frame, so they hold immutable
+    bytes and rankings live in PredictionIndex instead
+    """
+    risk_counts = predictions['churn_risk'].value_counts()
+    summary = {
+        'total_users': len(predictions),
+        'high_risk': int(risk_counts.get('High', 0)),
+        'medium_risk': int(risk_counts.get('Medium', 0)),
+        'low_risk': int(risk_counts.get('Low', 0)),
+        'avg_churn_probability': float(predictions['churn_probability'].mean()) if len(predictions) else 0.0
+    }
+    
+    by_game = predictions.groupby('project').agg({
+        'user_wallet': 'count',
+        'churn_probability': 'mean'
+    }).reset_index()
+    by_game.columns = ['project', 'total_users', 'avg_churn_probability']
+    game_risk_counts = predictions.groupby(['project', 'churn_risk']).size().unstack(fill_value=0)
+    by_game = by_game.merge(game_risk_counts, left_on='project', right_index=True, how='left')
+    
+    return {
+        'summary': summary,
+        'by_game': by_game.to_dict('records')
+    }
+
+def _prediction_aggregates(predictions: pd.DataFrame) -> Dict:
+    """Precomputed aggregates of a cached predictions frame (computed here for frames cached before they existed)"""
+    if 'aggregates' in predictions.attrs:
+        return json.loads(predictions.attrs['aggregates'])
+    return summarize_predictions(predictions)
+
+@app.post("/api/cache/refresh")
+async def force_refresh_and_train(
+    request: Request,
+    wait: bool = Query(default=False),
+    full_retrain: bool = Query(default=False)
+):
+    """
+    Start a background refresh of all data and ML retraining
+    Called by GitHub Actions after Dune queries are refreshed
+    Returns a job id immediately; poll /api/cache/refresh/{job_id} for progress
+    - wait: block until the job finishes and return its result
+    - full_retrain: retrain every model from scratch even in incremental training mode
+    """
+    if config.api_secret:
+        provided_secret = request.headers.get("X-API-Secret")
+        if provided_secret != config.api_secret:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    job, created = refresh_jobs.start(full_retrain)
+    job_id = job['job_id']
+    
+    if wait:
+        await refresh_jobs.wait(job_id)
+        job = refresh_jobs.get_job(job_id)
+        if job['status'] == 'failed':
+            raise HTTPException(status_code=500, detail=job['error'])
+        return job['result']
+    
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder({
+            "status": "accepted" if created else "already_running",
+            "job_id": job_id,
+            "status_url": f"/api/cache/refresh/{job_id}",
+            "job": job
+        })
+    )
+
+@app.get("/api/cache/refresh/{job_id}")
+async def get_refresh_job(job_id: str):
+    """Get progress of a background refresh job"""
+    job = refresh_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown refresh job: {job_id}")
+    return job
 
 @app.get("/api/health")
 async def health_check():
@@ -1589,41 +4544,28 @@ async def health_check():
 async def get_all_analytics():
     """Get all analytics data at once"""
     try:
-        result = {
-            "timestamp": datetime.now().isoformat(),
-            "data": {}
-        }
-        
-        analytics_endpoints = {
-            'gamer_activation': get_gamer_activation,
-            'gamer_retention': get_gamer_retention,
-            'gamer_reactivation': get_gamer_reactivation,
-            'gamer_deactivation': get_gamer_deactivation,
-            'high_retention_users': get_high_retention_users,
-            'high_retention_summary': get_high_retention_summary,
-            'gamers_by_games_played': get_gamers_by_games_played,
-            'cross_game_gamers': get_cross_game_gamers,
-            'gaming_activity_total': get_gaming_activity_total,
-            'daily_gaming_activity': get_daily_gaming_activity,
-            'user_daily_activity': get_user_daily_activity
-        }
-        
-        for query_key, endpoint_func in analytics_endpoints.items():
+        # Splice the pre-rendered per-source bodies instead of re-encoding them
+        parts = []
+        for query_key in config.dune_queries.keys():
             try:
-                response = await endpoint_func()
-                result['data'][query_key] = response
+                body, _ = await _analytics_body(query_key)
             except Exception as e:
                 logger.error(f"Error fetching {query_key}: {e}")
-                result['data'][query_key] = {"error": str(e)}
+                body = dumps_json({"error": str(e)})
+            parts.append(dumps_json(query_key) + b':' + body)
         
-        return result
+        content = (
+            b'{"timestamp":' + dumps_json(datetime.now().isoformat()) +
+            b',"data":{' + b','.join(parts) + b'}}'
+        )
+        return Response(content=content, media_type='application/json')
         
     except Exception as e:
         logger.error(f"Error in bulk analytics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/bulk/predictions")
-async def get_all_predictions():
+async def get_all_predictions(snapshot: Snapshot = Depends(pinned_snapshot)):
     """Get all ML predictions at once"""
     try:
         result = {
@@ -1631,23 +4573,24 @@ async def get_all_predictions():
             "predictions": {}
         }
         
+        # Every part comes from the same snapshot
         try:
-            result['predictions']['churn'] = await predict_churn(method='ensemble')
+            result['predictions']['churn'] = await predict_churn(method='ensemble', limit=100, cursor=None, snapshot=snapshot)
         except:
             result['predictions']['churn'] = {"error": "Not available"}
         
         try:
-            result['predictions']['churn_by_game'] = await predict_churn_by_game(method='ensemble')
+            result['predictions']['churn_by_game'] = await predict_churn_by_game(method='ensemble', snapshot=snapshot)
         except:
             result['predictions']['churn_by_game'] = {"error": "Not available"}
         
         try:
-            result['predictions']['high_risk_users'] = await get_high_risk_users(limit=50)
+            result['predictions']['high_risk_users'] = await get_high_risk_users(limit=50, method='ensemble', project=None, snapshot=snapshot)
         except:
             result['predictions']['high_risk_users'] = {"error": "Not available"}
         
         try:
-            result['model_info'] = await get_model_info()
+            result['model_info'] = await get_model_info(snapshot=snapshot)
         except:
             result['model_info'] = {"error": "Not available"}
         
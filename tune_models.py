@@ -0,0 +1,250 @@
+"""
+Offline hyperparameter search for the candidate models in MLModelManager
+
+Runs successive halving for every candidate in parallel (one process per model,
+cores split as in training): --configs random configurations per model are fitted
+on a small share of the training rows, the best 1/--eta move on to eta times
+more rows, until one configuration has been fitted on all of them. Scores are
+ROC-AUC on the validation split that early stopping uses, never on the test split.
+
+The winners are written to TUNED_PARAMS_PATH (tuned_params.json), which
+MLModelManager applies over its defaults at startup.
+
+Training data (first found):
+    --training FILE     training dataset (.csv or .joblib) as built by create_training_dataset
+    raw_data_cache      the cached user activity pages of a running deployment (training
+                        features come from / go to the feature store, like a refresh)
+
+Reproducible: sampling, subsets and models are seeded from --seed. --budget
+(wall-clock seconds) stops a search at the first fit past the deadline and keeps
+the winner of its last completed rung, so a run that finishes its whole schedule
+gives the same result on every machine.
+
+Usage:
+    python tune_models.py --budget 600
+    python tune_models.py --training training.joblib --models xgboost lightgbm --configs 27 --eta 3
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+import main
+
+# Discrete choices per estimator class (keeps sampling reproducible and the output JSON-safe).
+# n_estimators of XGBoost/LightGBM is left to early stopping and scale_pos_weight to training
+SEARCH_SPACES = {
+    'LogisticRegression': {
+        'C': [0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0],
+        'class_weight': ['balanced', None]
+    },
+    'RandomForestClassifier': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [4, 6, 8, 12, None],
+        'min_samples_split': [2, 5, 10, 20],
+        'min_samples_leaf': [1, 2, 5, 10],
+        'max_features': ['sqrt', 0.5, None]
+    },
+    'HistGradientBoostingClassifier': {
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_depth': [3, 4, 6, 8, None],
+        'max_leaf_nodes': [15, 31, 63],
+        'min_samples_leaf': [10, 20, 50, 100],
+        'l2_regularization': [0.0, 0.1, 1.0, 10.0]
+    },
+    'GradientBoostingClassifier': {
+        'n_estimators': [100, 200, 300],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_depth': [3, 4, 6],
+        'subsample': [0.6, 0.8, 1.0],
+        'min_samples_leaf': [1, 5, 20]
+    },
+    'XGBClassifier': {
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_depth': [3, 4, 6, 8],
+        'min_child_weight': [1, 3, 5, 10],
+        'subsample': [0.6, 0.8, 1.0],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_lambda': [0.1, 1.0, 10.0]
+    },
+    'LGBMClassifier': {
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_depth': [3, 4, 6, 8, -1],
+        'num_leaves': [15, 31, 63],
+        'min_child_samples': [10, 20, 50],
+        'subsample': [0.6, 0.8, 1.0],
+        'subsample_freq': [1],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+        'reg_lambda': [0.0, 1.0, 10.0]
+    }
+}
+
+
+def load_training_data(path: str = None) -> pd.DataFrame:
+    if path:
+        return joblib.load(path) if path.endswith('.joblib') else pd.read_csv(path)
+
+    pages = [main.cache_manager.get_cached_data(f'user_activity_{page}') for page in main.config.user_activity_pages]
+    pages = [page for page in pages if page is not None and not page.empty]
+    if not pages:
+        raise SystemExit("✗ No --training file and no cached user activity pages")
+
+    # Same compact, deduplicated frame as the refresh, so the artefact keys match
+    encoder = main.ActivityEncoder()
+    encoded = [encoder.encode(page) for page in pages]
+    activity = encoder.finish([page[encoder.new_rows(page)] for page in encoded])
+
+    # Same artefacts as the refresh: reuse its training features for this exact activity
+    key = main.feature_store.activity_key(activity)
+    feature_cache = main.feature_store.load('training', key)
+    if feature_cache is None:
+        _, feature_cache, _ = main.feature_service.update_training_dataset(activity)
+        main.feature_store.save('training', key, feature_cache)
+    return main.feature_service.training_frame(feature_cache)
+
+
+def sample_configs(space: dict, count: int, rng: np.random.Generator) -> list:
+    """Up to `count` distinct random configurations (fewer if the space is smaller)"""
+    names = sorted(space)
+    total = math.prod(len(space[name]) for name in names)
+    seen, configs = set(), []
+    while len(configs) < min(count, total):
+        choice = tuple(int(rng.integers(len(space[name]))) for name in names)
+        if choice not in seen:
+            seen.add(choice)
+            configs.append({name: space[name][i] for name, i in zip(names, choice)})
+    return configs
+
+
+def successive_halving(name: str, model, cores: int, data: tuple, configs: int, eta: int,
+                       seed: int, deadline: float) -> dict:
+    """
+    Search one model's space. Rung r fits configs / eta**r configurations on
+    n_rows / eta**(rungs - r) rows; stops early (between fits) at the deadline and
+    returns the best configuration of the last completed rung
+    """
+    X_train, y_train, X_val, y_val = data
+    space = SEARCH_SPACES[type(model).__name__]
+    rng = np.random.default_rng(seed)
+
+    # Same training-time settings as fit_candidates: boosters early-stop from boosting_max_rounds
+    fixed = {}
+    if name in main.ml_manager.early_stopping_models:
+        fixed['n_estimators'] = main.config.boosting_max_rounds
+    if name == 'xgboost':
+        fixed['scale_pos_weight'] = (len(y_train) - y_train.sum()) / max(1, y_train.sum())
+
+    # Current defaults compete too, so tuning never returns something worse on the largest rung
+    defaults = {param: model.get_params()[param] for param in space}
+    candidates = [defaults] + [c for c in sample_configs(space, configs, rng) if c != defaults][:configs - 1]
+
+    rungs = max(0, math.floor(math.log(len(candidates), eta)))
+    order = rng.permutation(len(X_train))
+    best, history = None, []
+
+    for rung in range(rungs + 1):
+        rows = order[:max(200, len(order) // eta ** (rungs - rung))]
+        scores = []
+        for params in candidates:
+            if time.time() > deadline:
+                return {'best': best, 'history': history, 'completed': False}
+            metrics = main._fit_candidate(
+                name, clone(model).set_params(**params, **fixed), cores,
+                X_train[rows], y_train[rows], X_val, y_val, X_val, y_val
+            )
+            scores.append(metrics['roc_auc'])
+
+        ranked = np.argsort(-np.nan_to_num(np.asarray(scores), nan=-1), kind='stable')
+        best = {'params': candidates[ranked[0]], 'validation_roc_auc': float(scores[ranked[0]]), 'rows': len(rows)}
+        history.append({'rung': rung, 'rows': len(rows), 'configs': len(candidates), 'best_roc_auc': best['validation_roc_auc']})
+        candidates = [candidates[i] for i in ranked[:max(1, len(candidates) // eta)]]
+
+    return {'best': best, 'history': history, 'completed': True}
+
+
+def tune(name: str, model, cores: int, data: tuple, args, deadline: float) -> dict:
+    started = time.time()
+    seed = args.seed + sorted(main.ml_manager.model_configs).index(name)
+    result = successive_halving(name, model, cores, data, args.configs, args.eta, seed, deadline)
+    result['seconds'] = round(time.time() - started, 1)
+    return result
+
+
+def to_json(value):
+    """numpy scalars in params/metrics -> plain Python"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter search for the ML candidates")
+    parser.add_argument('--training', help="training dataset (.csv or .joblib)")
+    parser.add_argument('--models', nargs='+', help="candidates to tune (default: all)")
+    parser.add_argument('--budget', type=float, default=600, help="wall-clock seconds for the whole search")
+    parser.add_argument('--configs', type=int, default=27, help="random configurations per model")
+    parser.add_argument('--eta', type=int, default=3, help="keep 1/eta of the configurations per rung")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=main.config.tuned_params_path)
+    args = parser.parse_args()
+
+    training_df = load_training_data(args.training)
+    X_train, y_train, _, _, _, X_val, y_val = main.ml_manager.prepare_training_data(training_df)
+    if X_val is None:
+        raise SystemExit("✗ No validation split - set BOOSTING_VALIDATION_FRACTION > 0")
+    data = (X_train, np.asarray(y_train), X_val, np.asarray(y_val))
+
+    names = args.models or list(main.ml_manager.model_configs)
+    budget = main.ml_manager.core_budget()
+    deadline = time.time() + args.budget
+    workers = min(len(names), main.config.training_cores)
+
+    print(f"Tuning {', '.join(names)} on {len(X_train)} rows for up to {args.budget:.0f}s ({workers} processes)")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {
+            name: pool.submit(
+                tune, name, main.ml_manager.model_configs[name]['model'], budget[name],
+                data, args, deadline
+            )
+            for name in names
+        }
+        results = {name: future.result() for name, future in futures.items()}
+
+    tuned = {
+        'created': datetime.now().isoformat(),
+        'seed': args.seed,
+        'configs': args.configs,
+        'eta': args.eta,
+        'budget_seconds': args.budget,
+        'training_samples': len(training_df),
+        'models': {}
+    }
+    print("=" * 60)
+    for name, result in results.items():
+        best = result['best']
+        status = "complete" if result['completed'] else "stopped at budget"
+        if best is None:
+            print(f"✗ {name}: no rung finished within the budget ({result['seconds']}s)")
+            continue
+        tuned['models'][name] = {
+            'estimator': type(main.ml_manager.model_configs[name]['model']).__name__,
+            'params': {k: to_json(v) for k, v in best['params'].items()},
+            'validation_roc_auc': round(best['validation_roc_auc'], 4),
+            'rows': best['rows'],
+            'completed': result['completed'],
+            'rungs': result['history']
+        }
+        print(f"✓ {name}: ROC-AUC={best['validation_roc_auc']:.4f} on {best['rows']} rows ({status}, {result['seconds']}s)")
+        print(f"    {tuned['models'][name]['params']}")
+    print("=" * 60)
+
+    with open(args.output, 'w') as f:
+        json.dump(tuned, f, indent=2)
+    print(f"✓ Wrote {args.output}")